@@ -1,52 +1,936 @@
-from flask import Flask, Response, request
+from flask import Flask, Response, g, jsonify, request, send_file
+import base64
+import math
+import os
+from contextlib import contextmanager, nullcontext
+import uuid
+import re
 import simpy
 import struct
-import random
-from modules import Parser, VehicleSpawner
-from entities import Calendar
+import threading
+from modules import (
+    Parser,
+    VehicleSpawner,
+    TimeSteppedEngine,
+    ParallelSimulation,
+    Checkpoint,
+    SessionStore,
+    EventFormatV2,
+    RoadnetFormatV2,
+    EventLog,
+    TileIndex,
+    TrafficAggregate,
+    MapRegistry,
+    LiveSimulationStore,
+    JobQueue,
+    ResultCache,
+    CachedResult,
+)
+from entities import (
+    Calendar,
+    DiskCalendar,
+    NotificationStats,
+    SimulationContext,
+    CAR_EVENT_DTYPE,
+)
+from utils import HighwayClass
+from utils.globals import (
+    STREAM_SLICE,
+    STREAM_MAX_COUNT,
+    AGGREGATE_BUCKET,
+    JOB_PROGRESS_SLICE,
+    DEFAULT_MAP,
+    ENGINES,
+    LIVE_SLICE,
+    LIVE_WINDOW,
+    LIVE_KEEPALIVE,
+)
 
 app = Flask(__name__)
 
+CHECKPOINT_DIR = "data/checkpoints"
+
+# event logs of the simulations spilled to the disk
+EVENT_LOG_DIR = "data/event_logs"
+
+# media types of the event formats, negotiated by the Accept header or the format parameter
+EVENT_FORMATS = {
+    "1": "application/octet-stream",
+    "2": "application/vnd.traffic-simulator.v2",
+}
+
+# response header: node, way, crossroad, car event and crossroad event counts
+HEADER_STRUCT = struct.Struct("!IIIII")
+
+# media type of the traffic aggregated by way and time bucket
+AGGREGATE_MEDIA_TYPE = "application/vnd.traffic-simulator.aggregate"
+
+# how long the clients may reuse a roadnet without revalidating it (s)
+ROADNET_MAX_AGE = 3600
+
+# results of the simulation jobs
+JOB_DIR = "data/jobs"
+
+# cached results of the identical simulations
+RESULT_DIR = "data/results"
+
+# the runs with these parameters write or read files, they are never cached
+UNCACHED_PARAMS = ("spill", "checkpoint", "resume")
+
+sessions = SessionStore()
+maps = MapRegistry()
+live_simulations = LiveSimulationStore()
+# a slot is held until the stream is closed
+stream_slots = threading.BoundedSemaphore(STREAM_MAX_COUNT)
+results = ResultCache(
+    RESULT_DIR,
+    ResultCache.get_code_version(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ),
+)
+
 
 @app.route("/")
 def simulation():
+    """Serves the simulation from the result cache, identical requests are run only once"""
+    map_name = request.args.get("map", default=DEFAULT_MAP, type=str)
+    is_uncached = any(name in request.args for name in UNCACHED_PARAMS)
+    if map_name not in maps or is_uncached:
+        return _simulate()
+
+    params = {
+        **request.args.to_dict(),
+        "map": maps.get(map_name).version,
+        "vehicle_count": request.args.get("vehicle_count", default=100, type=int),
+        "time_span": request.args.get("time_span", default=100, type=int),
+        "seed": request.args.get("seed", default=0, type=int),
+        "format": request.args.get("format") or _negotiate_event_format(),
+    }
+
+    responses = []
+
+    def compute() -> CachedResult | None:
+        responses.append(_simulate())
+        return _get_cached_result(responses[0])
+
+    result, hit = results.get_or_compute(results.get_key(params), compute)
+    if result is None:
+        return responses[0]
+
+    response = Response(result.body, headers=result.headers)
+    response.headers["X-Cache"] = "HIT" if hit else "MISS"
+    response.headers["Access-Control-Expose-Headers"] = ", ".join(
+        filter(None, (result.headers.get("Access-Control-Expose-Headers"), "X-Cache"))
+    )
+
+    return response
+
+
+def _simulate():
     vehicle_count = request.args.get("vehicle_count", default=100, type=int)
     time_span = request.args.get("time_span", default=100, type=int)
     simulation_seed = request.args.get("seed", default=0, type=int)
+    engine = request.args.get("engine", default="event", type=str)
+    mesoscopic_classes = request.args.get("mesoscopic", default="", type=str)
+    partitions = request.args.get("partitions", default=1, type=int)
+    checkpoint_name = request.args.get("checkpoint", default=None, type=str)
+    resume_name = request.args.get("resume", default=None, type=str)
+    record_from = request.args.get("record_from", default=0, type=float)
+    event_format = request.args.get("format", default=None, type=str)
+    roadnet_format = request.args.get("roadnet_format", default="1", type=str)
+    spill = request.args.get("spill", default=0, type=int)
+    bbox = request.args.get("bbox", default=None, type=str)
+    tiles = request.args.get("tiles", default=None, type=str)
+    mode = request.args.get("mode", default="events", type=str)
+    bucket = request.args.get("bucket", default=AGGREGATE_BUCKET, type=float)
+    include_roadnet = request.args.get("roadnet", default=1, type=int)
+    map_name = request.args.get("map", default=DEFAULT_MAP, type=str)
 
-    random.seed(simulation_seed)
-    env = simpy.Environment()
-    calendar = Calendar(env)
+    if map_name not in maps:
+        return Response(f"Unknown map '{map_name}'", status=400)
+
+    if event_format is None:
+        event_format = _negotiate_event_format()
+
+    if event_format not in EVENT_FORMATS:
+        return Response(f"Unknown event format '{event_format}'", status=400)
+
+    if roadnet_format not in ("1", "2"):
+        return Response(f"Unknown roadnet format '{roadnet_format}'", status=400)
+
+    if engine not in ENGINES:
+        return Response(f"Unknown engine '{engine}'", status=400)
+
+    if record_from < 0:
+        return Response("Recording can't start before the simulation", status=400)
+
+    if partitions < 1:
+        return Response("Partition count must be positive", status=400)
+
+    if partitions > 1 and engine != "event":
+        return Response("Only the event engine can be partitioned", status=400)
+
+    if spill and (event_format != "1" or partitions > 1):
+        return Response(
+            "Only unpartitioned simulations in the format 1 can be spilled", status=400
+        )
+
+    try:
+        viewport = _parse_viewport(bbox, tiles)
+    except ValueError:
+        return Response(
+            "The bbox must be south,west,north,east and the tiles z/x/y", status=400
+        )
+
+    if mode not in ("events", "aggregate"):
+        return Response(f"Unknown mode '{mode}'", status=400)
+
+    if bucket <= 0:
+        return Response("Bucket length must be positive", status=400)
+
+    if spill and mode == "aggregate":
+        return Response("A spilled simulation can't be aggregated", status=400)
+
+    if spill and viewport is not None:
+        return Response(
+            "A spilled simulation can't be filtered by a viewport", status=400
+        )
+
+    for name in (checkpoint_name, resume_name):
+        if name is not None and not re.fullmatch(r"[\w-]+", name):
+            return Response(f"Invalid checkpoint name '{name}'", status=400)
+
+    if (checkpoint_name or resume_name) and (engine != "event" or partitions > 1):
+        return Response("Only the event engine can use checkpoints", status=400)
+
+    checkpoint = None
+    if resume_name is not None:
+        checkpoint_path = os.path.join(CHECKPOINT_DIR, f"{resume_name}.pickle")
+        if not os.path.exists(checkpoint_path):
+            return Response(f"Unknown checkpoint '{resume_name}'", status=400)
+
+        checkpoint = Checkpoint.load(checkpoint_path)
+
+    try:
+        mesoscopic_classes = _parse_highway_classes(mesoscopic_classes)
+    except KeyError as e:
+        return Response(f"Unknown highway class {e}", status=400)
+
+    if mesoscopic_classes and engine == "timestep":
+        return Response("Only the event engine can use the mesoscopic model", status=400)
+
+    loaded_map = maps.get(map_name)
+
+    if checkpoint:
+        # the resumed simulation keeps the model of the saved one unless given
+        if "mesoscopic" not in request.args:
+            mesoscopic_classes = checkpoint.mesoscopic_classes
+
+        try:
+            checkpoint.validate(loaded_map.version, mesoscopic_classes)
+        except ValueError as e:
+            return Response(str(e), status=400)
+
+    start_time = checkpoint.time if checkpoint else 0
+    env = simpy.Environment(initial_time=start_time)
+
+    if spill:
+        os.makedirs(EVENT_LOG_DIR, exist_ok=True)
+        EventLog.evict(EVENT_LOG_DIR)
+        event_log_name = uuid.uuid4().hex
+        calendar = DiskCalendar(
+            env, os.path.join(EVENT_LOG_DIR, f"{event_log_name}.bin"), record_from
+        )
+    else:
+        calendar = Calendar(env, record_from)
+
+    # the ids and the random sequence of this simulation only
+    context = SimulationContext(simulation_seed, env, calendar)
+    spill_guard = _discard_unless_indexed(calendar) if spill else nullcontext()
+    # only the per-car processes of the event engine use the notifiers
+    notification_stats = None
+
+    with context, spill_guard:
+        parser = Parser(env, calendar)
+
+        parser.parse(loaded_map.path)
+        parser.use_mesoscopic_model(mesoscopic_classes)
+
+        print("Roadnet parsed.")
+
+        ways = crossroads = None
+        if viewport is not None:
+            # the ids of the loaded map match the ones of the simulation
+            tile_index = loaded_map.tile_index
+            visible_lanes = (
+                tile_index.get_lanes(viewport[0])
+                if viewport[0] is not None
+                else tile_index.get_tile_lanes(viewport[1])
+            )
+            ways, crossroads = tile_index.get_elements(visible_lanes)
+
+        # the clients having the roadnet from /roadnet check it by the version
+        roadnet = loaded_map.get_roadnet(roadnet_format)
+
+        if not include_roadnet:
+            roadnet_data = (b"", (0, 0, 0))
+        elif viewport is not None:
+            roadnet_data = (
+                RoadnetFormatV2.pack(loaded_map.parser, ways, crossroads)
+                if roadnet_format == "2"
+                else loaded_map.parser.pack(ways, crossroads)
+            )
+        else:
+            roadnet_data = (roadnet.data, roadnet.counts)
+
+        if spill:
+            # the header is rewritten with the event counts once the simulation finishes
+            calendar.write_preamble(bytes(HEADER_STRUCT.size) + roadnet_data[0])
+
+        if engine == "timestep":
+            simulation = TimeSteppedEngine(
+                env, calendar, parser.ways, parser.crossroads
+            )
+
+            print("Spawning vehicles...")
+            simulation.spawn_multiple(vehicle_count)
+
+            print("Simulating...")
+            _run_in_slices(
+                lambda until: simulation.run(until=until), 0, time_span, calendar
+            )
+            simulation.finish()
+
+            print("Simulation finished.")
+        elif partitions > 1:
+            simulation = ParallelSimulation(parser, partitions, simulation_seed)
+
+            print(f"Simulating {partitions} regions, lookahead {simulation.lookahead:.3f} s...")
+            simulation.run(vehicle_count, time_span)
+            # the regions run in their own processes and report nothing until they merge
+            _report_progress(time_span, 0, time_span, calendar)
+
+            print("Simulation finished.")
+            print(f"Windows: {simulation.windows}, transfers: {simulation.transfers}")
+        else:
+            spawner = VehicleSpawner(env, calendar, parser.ways)
+            notification_stats = spawner.notification_stats
+
+            if checkpoint:
+                print(f"Resuming from {start_time} s...")
+                try:
+                    checkpoint.restore(parser, spawner)
+                except ValueError as e:
+                    return Response(str(e), status=400)
+            else:
+                print("Spawning vehicles...")
+                spawner.spawn_multiple(vehicle_count)
+
+            if record_from > env.now:
+                env.process(
+                    calendar.snapshot_process(spawner.vehicles, parser.crossroads)
+                )
+
+            print("Simulating...")
+
+            _run_in_slices(
+                lambda until: env.run(until=until),
+                start_time,
+                start_time + time_span,
+                calendar,
+            )
+
+            if checkpoint_name is not None:
+                os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+                Checkpoint.capture(
+                    parser, spawner, loaded_map.version, mesoscopic_classes
+                ).save(os.path.join(CHECKPOINT_DIR, f"{checkpoint_name}.pickle"))
+                print(f"Checkpoint '{checkpoint_name}' saved.")
+
+            for vehicle in spawner.vehicles:
+                vehicle.calendar_car_update()
+
+            print("Simulation finished.")
+
+        if spill:
+            event_counts = calendar.close()
+            with open(calendar.path, "r+b") as f:
+                f.write(_pack_header(roadnet_data[1], event_counts))
+            EventLog.write_index(calendar, parser)
+
+            print(f"Event log '{event_log_name}' written.")
+
+    if spill:
+        response = send_file(
+            os.path.abspath(calendar.path), mimetype=EVENT_FORMATS["1"]
+        )
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        response.headers["X-Event-Log"] = event_log_name
+        response.headers["X-Roadnet-Version"] = roadnet.version
+        response.headers["Access-Control-Expose-Headers"] = (
+            "X-Event-Log, X-Roadnet-Version"
+        )
+        _set_notification_stats(response, notification_stats)
+
+        return response
+
+    if mode == "aggregate":
+        # the cars leaving the viewport end their intervals only in the unfiltered events
+        aggregate = TrafficAggregate.from_calendar(
+            calendar,
+            ways if ways is not None else parser.ways,
+            start_time + time_span,
+            bucket,
+        )
+        response = _pack_response(roadnet_data, ([aggregate.pack()], (0, 0)))
+        response.headers["Content-Type"] = AGGREGATE_MEDIA_TYPE
+        response.headers["X-Roadnet-Version"] = roadnet.version
+        response.headers["Access-Control-Expose-Headers"] = "X-Roadnet-Version"
+        _set_notification_stats(response, notification_stats)
+
+        return response
+
+    if viewport is not None:
+        calendar = calendar.filter(
+            {crossroad.id for crossroad in crossroads},
+            {lane.id for lane in visible_lanes},
+        )
+
+    if event_format == "2":
+        event_data = (
+            [EventFormatV2.pack(calendar, parser.crossroads)],
+            (len(calendar.car_events), len(calendar.crossroad_events)),
+        )
+    else:
+        # the calendar is not used any more, its events are sent as they are
+        event_data = calendar.pack_chunks()
+
+    response = _pack_response(roadnet_data, event_data)
+    response.headers["Content-Type"] = EVENT_FORMATS[event_format]
+    response.headers["Vary"] = "Accept"
+    response.headers["X-Roadnet-Version"] = roadnet.version
+    response.headers["Access-Control-Expose-Headers"] = "X-Roadnet-Version"
+    _set_notification_stats(response, notification_stats)
+
+    return response
+
+
+@app.route("/cache")
+def cache_stats():
+    """Returns the hits, misses and size of the result cache"""
+    response = jsonify(results.get_stats())
+    response.headers["Access-Control-Allow-Origin"] = "*"
+
+    return response
+
+
+@app.route("/maps")
+def list_maps():
+    """Returns the names of the maps and whether they are loaded"""
+    response = jsonify(maps.get_state())
+    response.headers["Access-Control-Allow-Origin"] = "*"
+
+    return response
+
+
+@app.route("/roadnet")
+def roadnet_endpoint():
+    """
+    Sends the roadnet alone, with the response header of the simulation and no events.
+    Its ETag is the roadnet version returned by the simulation, so it is downloaded only once.
+    """
+    roadnet_format = request.args.get("format", default="1", type=str)
+    map_name = request.args.get("map", default=DEFAULT_MAP, type=str)
+
+    if roadnet_format not in ("1", "2"):
+        return Response(f"Unknown roadnet format '{roadnet_format}'", status=400)
+
+    if map_name not in maps:
+        return Response(f"Unknown map '{map_name}'", status=400)
+
+    roadnet = maps.get(map_name).get_roadnet(roadnet_format)
+    is_gzipped = request.accept_encodings.quality("gzip") > 0
+
+    response = Response(
+        roadnet.gzipped_body if is_gzipped else roadnet.body,
+        mimetype=EVENT_FORMATS["1"],
+    )
+    # every encoding is a different representation with its own strong tag
+    response.set_etag(f"{roadnet.version}-gzip" if is_gzipped else roadnet.version)
+    response.headers["Cache-Control"] = f"public, max-age={ROADNET_MAX_AGE}"
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    response.headers["Access-Control-Expose-Headers"] = "ETag"
+    if is_gzipped:
+        response.headers["Content-Encoding"] = "gzip"
+
+    return response.make_conditional(request)
+
+
+@app.route("/event_logs/<name>")
+def event_log(name: str):
+    """Sends again the response of a spilled simulation"""
+    path = _get_event_log_path(name)
+    if path is None:
+        return Response(f"Unknown event log '{name}'", status=404)
+
+    response = send_file(
+        os.path.abspath(path), mimetype=EVENT_FORMATS["1"], conditional=True
+    )
+    response.headers["Access-Control-Allow-Origin"] = "*"
+
+    return response
+
+
+@app.route("/event_logs/<name>/roadnet")
+def event_log_roadnet(name: str):
+    """Sends the header and the roadnet of a spilled simulation, without its events"""
+    path = _get_event_log_path(name)
+    if path is None:
+        return Response(f"Unknown event log '{name}'", status=404)
+
+    response = Response(EventLog(path).get_roadnet(), mimetype=EVENT_FORMATS["1"])
+    response.headers["Access-Control-Allow-Origin"] = "*"
+
+    return response
+
+
+@app.route("/event_logs/<name>/window")
+def event_log_window(name: str):
+    """
+    Sends the events of a spilled simulation in the [t0, t1) window,
+    preceded by the latest event of every car and crossroad before t0.
+    """
+    t0 = request.args.get("t0", default=0, type=float)
+    t1 = request.args.get("t1", default=None, type=float)
+
+    path = _get_event_log_path(name)
+    if path is None:
+        return Response(f"Unknown event log '{name}'", status=404)
+
+    if not math.isfinite(t0) or (t1 is not None and not math.isfinite(t1)):
+        return Response("The window must have finite bounds", status=400)
+
+    if t1 is None or t1 <= t0:
+        return Response("The window must end after it starts", status=400)
+
+    response = Response(EventLog(path).get_window(t0, t1), mimetype=EVENT_FORMATS["1"])
+    response.headers["Access-Control-Allow-Origin"] = "*"
+
+    return response
+
+
+@app.route("/event_logs/<name>/trajectories")
+def event_log_trajectories(name: str):
+    """
+    Returns the trajectories of the selected cars of a spilled simulation,
+    as their events or as [time, lat, lng] points resampled to the time step.
+    """
+    car_ids = request.args.get("cars", default="", type=str)
+    mode = request.args.get("mode", default="events", type=str)
+    step = request.args.get("step", default=1, type=float)
+
+    path = _get_event_log_path(name)
+    if path is None:
+        return Response(f"Unknown event log '{name}'", status=404)
+
+    try:
+        car_ids = [int(car_id) for car_id in car_ids.split(",") if car_id]
+    except ValueError:
+        return Response(f"Invalid car ids '{car_ids}'", status=400)
+
+    if mode not in ("events", "polyline"):
+        return Response(f"Unknown trajectory mode '{mode}'", status=400)
+
+    if step <= 0:
+        return Response("Time step must be positive", status=400)
+
+    log = EventLog(path)
+    if mode == "events":
+        trajectories = {
+            car_id: [
+                dict(zip(CAR_EVENT_DTYPE.names, event.tolist()))
+                for event in log.get_trajectory(car_id)
+            ]
+            for car_id in car_ids
+        }
+    else:
+        trajectories = {
+            car_id: log.get_polyline(car_id, step).tolist() for car_id in car_ids
+        }
+
+    response = jsonify({str(car_id): points for car_id, points in trajectories.items()})
+    response.headers["Access-Control-Allow-Origin"] = "*"
+
+    return response
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    """
+    Queues the simulation with the parameters of the simulation endpoint.
+    Returns the job id, its progress is polled and its result downloaded once done.
+    """
+    job = jobs.submit(request.query_string.decode())
+    if job is None:
+        return Response("The job queue is full", status=503)
+
+    print(f"Job {job.id} submitted.")
+
+    response = jsonify(job.get_state())
+    response.status_code = 202
+    response.headers["Location"] = f"/jobs/{job.id}"
+    response.headers["Access-Control-Allow-Origin"] = "*"
 
-    parser = Parser(env, calendar)
+    return response
+
+
+@app.route("/jobs/<job_id>", methods=["GET", "DELETE"])
+def job_state(job_id: str):
+    """Returns the status and progress of the job, DELETE cancels it"""
+    job = jobs.get(job_id)
+    if job is None:
+        return Response(f"Unknown job '{job_id}'", status=404)
+
+    if request.method == "DELETE":
+        if not jobs.cancel(job_id):
+            return Response(f"The job is already {job.status}", status=409)
+        print(f"Job {job.id} cancelled.")
+
+    response = jsonify(job.get_state())
+    response.headers["Access-Control-Allow-Origin"] = "*"
+
+    return response
+
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id: str):
+    """Sends the response of the finished simulation"""
+    job = jobs.get(job_id)
+    if job is None:
+        return Response(f"Unknown job '{job_id}'", status=404)
+
+    if job.status != "done":
+        return Response(f"The job is {job.status}", status=409)
+
+    response = send_file(os.path.abspath(job.result_path), conditional=True)
+    response.headers.update(job.headers)
+
+    return response
+
+
+@app.route("/sessions", methods=["POST"])
+def create_session():
+    """Runs a simulation kept on the server, it can be continued with the returned session id"""
+    vehicle_count = request.args.get("vehicle_count", default=100, type=int)
+    time_span = request.args.get("time_span", default=100, type=int)
+    simulation_seed = request.args.get("seed", default=0, type=int)
+    mesoscopic_classes = request.args.get("mesoscopic", default="", type=str)
+    map_name = request.args.get("map", default=DEFAULT_MAP, type=str)
+
+    if map_name not in maps:
+        return Response(f"Unknown map '{map_name}'", status=400)
+
+    try:
+        mesoscopic_classes = _parse_highway_classes(mesoscopic_classes)
+    except KeyError as e:
+        return Response(f"Unknown highway class {e}", status=400)
+
+    if sessions.is_full():
+        return Response("Too many sessions are kept", status=503)
+
+    session = sessions.create(
+        maps.paths[map_name], vehicle_count, simulation_seed, mesoscopic_classes
+    )
+    if session is None:
+        return Response("Too many sessions are kept", status=503)
+
+    print(f"Session {session.id} created.")
+
+    with session.lock:
+        event_bytes, event_counts = session.advance(time_span)
+
+    response = _pack_response(session.parser.pack(), ([event_bytes], event_counts))
+    response.headers["X-Session-Id"] = session.id
+    response.headers["Access-Control-Expose-Headers"] = "X-Session-Id"
+
+    return response
+
+
+@app.route("/sessions/<session_id>/continue", methods=["POST"])
+def continue_session(session_id: str):
+    """Advances the session to the given time and returns only the new events"""
+    until = request.args.get("until", default=None, type=float)
+
+    session = sessions.get(session_id)
+    if session is None:
+        return Response(f"Unknown session '{session_id}'", status=404)
+
+    with session.lock:
+        if until is None or until <= session.now:
+            return Response(f"The session is already at {session.now} s", status=400)
+
+        event_bytes, event_counts = session.advance(until)
+
+    # the roadnet was sent when the session was created
+    return _pack_response((b"", (0, 0, 0)), ([event_bytes], event_counts))
+
+
+@app.route("/stream")
+def stream_simulation():
+    """
+    Streams the simulation as length prefixed frames while it runs.
+    The first frame holds the roadnet, every next one the events of one time slice.
+    """
+    vehicle_count = request.args.get("vehicle_count", default=100, type=int)
+    time_span = request.args.get("time_span", default=100, type=int)
+    simulation_seed = request.args.get("seed", default=0, type=int)
+    engine = request.args.get("engine", default="event", type=str)
+    mesoscopic_classes = request.args.get("mesoscopic", default="", type=str)
+    record_from = request.args.get("record_from", default=0, type=float)
+    slice_length = request.args.get("slice", default=STREAM_SLICE, type=float)
+    map_name = request.args.get("map", default=DEFAULT_MAP, type=str)
+
+    if map_name not in maps:
+        return Response(f"Unknown map '{map_name}'", status=400)
+
+    if engine not in ENGINES:
+        return Response(f"Unknown engine '{engine}'", status=400)
+
+    if slice_length <= 0:
+        return Response("Slice length must be positive", status=400)
+
+    try:
+        mesoscopic_classes = _parse_highway_classes(mesoscopic_classes)
+    except KeyError as e:
+        return Response(f"Unknown highway class {e}", status=400)
+
+    if mesoscopic_classes and engine == "timestep":
+        return Response("Only the event engine can use the mesoscopic model", status=400)
+
+    if not stream_slots.acquire(blocking=False):
+        return Response("Too many simulations are streamed", status=503)
+
+    try:
+        context, parser, advance, finish = _prepare_simulation(
+            map_name,
+            vehicle_count,
+            simulation_seed,
+            engine,
+            mesoscopic_classes,
+            record_from,
+        )
+    except BaseException:
+        stream_slots.release()
+        raise
+
+    env = context.env
+    calendar = context.calendar
+    # the parsed roadnet of the map is the same as the one of the simulation
+    roadnet = maps.get(map_name).get_roadnet("1")
+
+    def frames():
+        yield _pack_frame(struct.pack("!III", *roadnet.counts) + roadnet.data)
+
+        now = env.now
+        while now < time_span:
+            now = min(now + slice_length, time_span)
+            # the frames are generated after the request handler returned
+            with context:
+                advance(now)
+                if now == time_span:
+                    finish()
+
+            # only the events of one slice are kept
+            event_bytes, event_counts = calendar.pack()
+            calendar.clear()
+            yield _pack_frame(struct.pack("!fII", now, *event_counts) + event_bytes)
+
+    response = Response(frames(), mimetype="application/octet-stream")
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    # called once the stream ends or the client disconnects
+    response.call_on_close(stream_slots.release)
+
+    return response
+
+
+@app.route("/live", methods=["POST"])
+def create_live_simulation():
+    """
+    Starts a simulation running in the background at the given speed
+    (simulated seconds per wall second), its slices are pushed to the clients
+    connected to /live/<id>/events.
+    """
+    vehicle_count = request.args.get("vehicle_count", default=100, type=int)
+    time_span = request.args.get("time_span", default=3600, type=int)
+    simulation_seed = request.args.get("seed", default=0, type=int)
+    engine = request.args.get("engine", default="event", type=str)
+    mesoscopic_classes = request.args.get("mesoscopic", default="", type=str)
+    slice_length = request.args.get("slice", default=LIVE_SLICE, type=float)
+    speed = request.args.get("speed", default=1, type=float)
+    window = request.args.get("window", default=LIVE_WINDOW, type=float)
+    map_name = request.args.get("map", default=DEFAULT_MAP, type=str)
+
+    if map_name not in maps:
+        return Response(f"Unknown map '{map_name}'", status=400)
+
+    if engine not in ENGINES:
+        return Response(f"Unknown engine '{engine}'", status=400)
+
+    if slice_length <= 0 or speed <= 0 or window <= 0:
+        return Response("Slice length, speed and window must be positive", status=400)
+
+    try:
+        mesoscopic_classes = _parse_highway_classes(mesoscopic_classes)
+    except KeyError as e:
+        return Response(f"Unknown highway class {e}", status=400)
+
+    if mesoscopic_classes and engine == "timestep":
+        return Response("Only the event engine can use the mesoscopic model", status=400)
+
+    if live_simulations.is_full():
+        return Response("Too many live simulations are running", status=503)
+
+    context, _, advance, finish = _prepare_simulation(
+        map_name, vehicle_count, simulation_seed, engine, mesoscopic_classes, 0
+    )
+    simulation = live_simulations.create(
+        context, advance, finish, time_span, slice_length, speed, window
+    )
+    if simulation is None:
+        return Response("Too many live simulations are running", status=503)
+
+    print(f"Live simulation {simulation.id} started.")
+
+    response = jsonify(simulation.get_state())
+    response.status_code = 201
+    response.headers["Location"] = f"/live/{simulation.id}"
+    response.headers["Access-Control-Allow-Origin"] = "*"
+
+    return response
+
+
+@app.route("/live/<live_id>", methods=["GET", "DELETE"])
+def live_simulation_state(live_id: str):
+    """Returns the state of the live simulation, DELETE stops it"""
+    simulation = live_simulations.get(live_id)
+    if simulation is None:
+        return Response(f"Unknown live simulation '{live_id}'", status=404)
+
+    if request.method == "DELETE":
+        simulation.stop()
+        print(f"Live simulation {simulation.id} stopped.")
+
+    response = jsonify(simulation.get_state())
+    response.headers["Access-Control-Allow-Origin"] = "*"
+
+    return response
+
+
+@app.route("/live/<live_id>/events")
+def live_simulation_events(live_id: str):
+    """
+    Pushes the slices of the live simulation as server-sent events,
+    each one holds the base64 encoded slice frame of /stream and its index as the id.
+    A client connecting or reconnecting with the Last-Event-ID header after the window
+    moved on first gets a keyframe event, a frame with the latest event of every car
+    and crossroad up to the window, followed by the slices of the window.
+    """
+    simulation = live_simulations.get(live_id)
+    if simulation is None:
+        return Response(f"Unknown live simulation '{live_id}'", status=404)
+
+    last_event_id = request.headers.get("Last-Event-ID", default=-1, type=int)
+
+    def events():
+        for live_slice in simulation.iter_slices(last_event_id, LIVE_KEEPALIVE):
+            if live_slice is None:
+                yield ": keep-alive\n\n"
+                continue
+
+            event = "keyframe" if live_slice.is_keyframe else "slice"
+            data = base64.b64encode(live_slice.data).decode()
+            yield f"id: {live_slice.index}\nevent: {event}\ndata: {data}\n\n"
+
+        yield f"event: end\ndata: {simulation.now}\n\n"
+
+    response = Response(events(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.headers["Access-Control-Allow-Origin"] = "*"
+
+    return response
+
+
+def _negotiate_event_format() -> str:
+    """Returns v2 if the client lists it explicitly, wildcards keep the v1 clients working"""
+    for mimetype, quality in request.accept_mimetypes:
+        if mimetype == EVENT_FORMATS["2"] and quality > 0:
+            return "2"
+
+    return "1"
+
+
+def _get_event_log_path(name: str) -> str | None:
+    """Returns the path of the indexed event log or None if there is no such log"""
+    if not re.fullmatch(r"[0-9a-f]+", name):
+        return None
+
+    path = os.path.join(EVENT_LOG_DIR, f"{name}.bin")
+    if not os.path.exists(EventLog.get_index_path(path)):
+        return None
+
+    return path
+
+
+def _parse_viewport(bbox: str | None, tiles: str | None) -> tuple | None:
+    """Returns the (bbox, tiles) to filter the response by or None to send everything"""
+    if bbox is None and tiles is None:
+        return None
+
+    if bbox is not None:
+        bounds = tuple(float(value) for value in bbox.split(","))
+        if len(bounds) != 4:
+            raise ValueError(bbox)
+
+        return bounds, None
 
-    parser.parse("data/brno.osm")
+    tile_list = [
+        tuple(int(value) for value in tile.split("/")) for tile in tiles.split(",")
+    ]
+    if any(len(tile) != 3 for tile in tile_list):
+        raise ValueError(tiles)
 
-    print("Roadnet parsed.")
-    spawner = VehicleSpawner(env, calendar, parser.ways)
+    return None, tile_list
 
-    print("Spawning vehicles...")
-    spawner.spawn_multiple(vehicle_count)
 
-    print("Simulating...")
+def _parse_highway_classes(highway_classes: str) -> list[HighwayClass]:
+    return [
+        HighwayClass[highway_class]
+        for highway_class in highway_classes.split(",")
+        if highway_class
+    ]
 
-    env.run(until=time_span)
 
-    for vehicle in spawner.vehicles:
-        vehicle.calendar_car_update()
+@contextmanager
+def _discard_unless_indexed(calendar: DiskCalendar):
+    """Removes the spilled events if the run ends before their index is written"""
+    try:
+        yield
+    finally:
+        if not os.path.exists(EventLog.get_index_path(calendar.path)):
+            calendar.discard()
 
-    print("Simulation finished.")
 
-    roadnet_data = parser.pack()
-    roadnet_bytes = roadnet_data[0]
-    node_count, way_count, crossroad_count = roadnet_data[1]
+def _pack_frame(payload: bytes) -> bytes:
+    return struct.pack("!I", len(payload)) + payload
 
-    event_data = calendar.pack()
-    event_bytes = event_data[0]
-    car_event_count, crossroad_event_count = event_data[1]
 
-    struct_header = struct.pack(
-        "!IIIII",
+def _pack_header(roadnet_counts, event_counts) -> bytes:
+    node_count, way_count, crossroad_count = roadnet_counts
+    car_event_count, crossroad_event_count = event_counts
+
+    return HEADER_STRUCT.pack(
         node_count,
         way_count,
         crossroad_count,
@@ -54,7 +938,125 @@ def simulation():
         crossroad_event_count,
     )
 
-    response = Response(struct_header + roadnet_bytes + event_bytes)
+
+def _pack_response(roadnet_data, event_data) -> Response:
+    """Sends the header, the roadnet and the chunks of the events without joining them"""
+    struct_header = _pack_header(roadnet_data[1], event_data[1])
+
+    response = Response([struct_header, roadnet_data[0], *event_data[0]])
     response.headers["Access-Control-Allow-Origin"] = "*"
 
     return response
+
+
+def _set_notification_stats(response: Response, stats: NotificationStats | None):
+    """Sends the notification counters of the simulation in a header"""
+    if stats is None:
+        return
+
+    response.headers["X-Notifications"] = (
+        f"delivered={stats.delivered}, skipped={stats.skipped}, "
+        f"allocated={stats.allocated}"
+    )
+    response.headers["Access-Control-Expose-Headers"] = ", ".join(
+        filter(
+            None,
+            (response.headers.get("Access-Control-Expose-Headers"), "X-Notifications"),
+        )
+    )
+
+
+def _get_cached_result(response: Response) -> CachedResult | None:
+    """Returns the result to cache, the failed and streamed responses are not cached"""
+    if response.status_code != 200 or response.is_streamed:
+        return None
+
+    return CachedResult(response.get_data(), dict(response.headers))
+
+
+def _prepare_simulation(
+    map_name: str,
+    vehicle_count: int,
+    seed: int,
+    engine: str,
+    mesoscopic_classes: list[HighwayClass],
+    record_from: float,
+):
+    """
+    Spawns the vehicles of a simulation advanced by slices,
+    returns its context, its parser and the functions advancing and finishing it
+    """
+    env = simpy.Environment()
+    calendar = Calendar(env, record_from)
+    context = SimulationContext(seed, env, calendar)
+
+    with context:
+        parser = Parser(env, calendar)
+        parser.parse(maps.paths[map_name])
+        parser.use_mesoscopic_model(mesoscopic_classes)
+
+        if engine == "timestep":
+            simulation = TimeSteppedEngine(
+                env, calendar, parser.ways, parser.crossroads
+            )
+            simulation.spawn_multiple(vehicle_count)
+
+            return context, parser, simulation.run, simulation.finish
+
+        spawner = VehicleSpawner(env, calendar, parser.ways)
+        spawner.spawn_multiple(vehicle_count)
+        if record_from > env.now:
+            env.process(calendar.snapshot_process(spawner.vehicles, parser.crossroads))
+
+    def advance(until):
+        env.run(until=until)
+
+    def finish():
+        for vehicle in spawner.vehicles:
+            vehicle.calendar_car_update()
+
+    return context, parser, advance, finish
+
+
+def _report_progress(now: float, start: float, until: float, calendar: Calendar):
+    """Reports the progress to the job running the simulation, if there is one"""
+    report = g.get("report_progress")
+    if report is not None:
+        report(time=now, start=start, until=until, events=calendar.car_event_count)
+
+
+def _run_in_slices(advance, start: float, until: float, calendar: Calendar):
+    """Advances the simulation to the time, by slices when its progress is reported"""
+    if g.get("report_progress") is None:
+        advance(until)
+        return
+
+    now = start
+    while now < until:
+        now = min(now + JOB_PROGRESS_SLICE, until)
+        advance(now)
+        _report_progress(now, start, until, calendar)
+
+
+def _run_simulation_job(query: str, result_path: str, report) -> dict[str, str]:
+    """Runs the simulation endpoint in the worker of a job and writes its response"""
+    with app.test_request_context(f"/?{query}"):
+        g.report_progress = report
+        response = simulation()
+
+        if response.status_code != 200:
+            raise ValueError(response.get_data(as_text=True))
+
+        with open(result_path, "wb") as f:
+            for chunk in response.response:
+                f.write(chunk)
+        response.close()
+
+    return {
+        name: value
+        for name, value in response.headers.items()
+        if name not in ("Content-Length", "Last-Modified", "ETag")
+    }
+
+
+jobs = JobQueue(_run_simulation_job, JOB_DIR)
@@ -0,0 +1,91 @@
+"""
+Compares the event driven and the time-stepped engine on the same roadnet.
+
+    python -m benchmarks.engines --map data/brno.osm --vehicles 1000 10000 100000
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+
+from entities import SimulationContext
+from modules import Parser, VehicleSpawner, TimeSteppedEngine
+from utils.globals import ENGINES
+
+
+def run_engine(map_path: str, engine: str, vehicle_count: int, time_span: int):
+    with SimulationContext(0) as context:
+        env = context.env
+        calendar = context.calendar
+
+        parser = Parser(env, calendar)
+        parser.parse(map_path)
+
+        start = time.perf_counter()
+
+        if engine == "timestep":
+            simulation = TimeSteppedEngine(
+                env, calendar, parser.ways, parser.crossroads
+            )
+            simulation.spawn_multiple(vehicle_count)
+            spawn_time = time.perf_counter() - start
+            simulation.run(until=time_span)
+            simulation.finish()
+        else:
+            spawner = VehicleSpawner(env, calendar, parser.ways)
+            spawner.spawn_multiple(vehicle_count)
+            spawn_time = time.perf_counter() - start
+            env.run(until=time_span)
+            for vehicle in spawner.vehicles:
+                vehicle.calendar_car_update()
+
+    run_time = time.perf_counter() - start - spawn_time
+
+    return {
+        "spawn_time": spawn_time,
+        "run_time": run_time,
+        "car_events": len(calendar.car_events),
+        "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _run_in_process(queue: multiprocessing.Queue, *args):
+    queue.put(run_engine(*args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--map", default="data/brno.osm")
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--engines", nargs="+", default=ENGINES, choices=ENGINES)
+    parser.add_argument("--time-span", type=int, default=60)
+    args = parser.parse_args()
+
+    print(
+        f"{'engine':<10}{'vehicles':>10}{'spawn [s]':>12}{'run [s]':>12}"
+        f"{'sim s / s':>12}{'events':>12}{'RSS [MB]':>12}"
+    )
+
+    for vehicle_count in args.vehicles:
+        for engine in args.engines:
+            # every run gets a fresh process, so the memory usage is not shared
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(
+                target=_run_in_process,
+                args=(queue, args.map, engine, vehicle_count, args.time_span),
+            )
+            process.start()
+            result = queue.get()
+            process.join()
+
+            print(
+                f"{engine:<10}{vehicle_count:>10}{result['spawn_time']:>12.2f}"
+                f"{result['run_time']:>12.2f}"
+                f"{args.time_span / result['run_time']:>12.2f}"
+                f"{result['car_events']:>12}{result['max_rss']:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
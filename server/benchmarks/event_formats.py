@@ -0,0 +1,66 @@
+"""
+Compares the size and encode time of the v1 and the compact v2 event format on a reference run.
+
+    python -m benchmarks.event_formats --map data/brno.osm --vehicles 1000 --time-span 300
+"""
+
+import argparse
+import gzip
+import time
+
+import numpy as np
+
+from entities import SimulationContext
+from modules import Parser, VehicleSpawner, EventFormatV2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--map", default="data/brno.osm")
+    parser.add_argument("--vehicles", type=int, default=1000)
+    parser.add_argument("--time-span", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with SimulationContext(args.seed) as context:
+        env = context.env
+        calendar = context.calendar
+
+        roadnet = Parser(env, calendar)
+        roadnet.parse(args.map)
+
+        spawner = VehicleSpawner(env, calendar, roadnet.ways)
+        spawner.spawn_multiple(args.vehicles)
+        env.run(until=args.time_span)
+
+    start = time.perf_counter()
+    v1 = calendar.pack()[0]
+    v1_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    v2 = EventFormatV2.pack(calendar, roadnet.crossroads)
+    v2_time = time.perf_counter() - start
+
+    # the decoded events must match the recorded ones up to the format resolution
+    decoded = EventFormatV2.unpack(v2)["car_events"]
+    order = np.argsort(calendar.car_events["car_id"], kind="stable")
+    recorded = calendar.car_events[order]
+    times = calendar.car_event_times[order]
+    max_errors = {
+        "time": max(abs(e["time"] - t) for e, t in zip(decoded, times)),
+        "position": max(abs(e["position"] - r["position"]) for e, r in zip(decoded, recorded)),
+        "speed": max(abs(e["speed"] - r["speed"]) for e, r in zip(decoded, recorded)),
+    }
+
+    print(f"{len(calendar.car_events)} car events, {len(calendar.crossroad_events)} crossroad events")
+    print(f"{'format':<8}{'size [B]':>12}{'gzip [B]':>12}{'B / event':>12}{'encode [ms]':>14}")
+    for name, data, encode_time in (("v1", v1, v1_time), ("v2", v2, v2_time)):
+        print(
+            f"{name:<8}{len(data):>12}{len(gzip.compress(data)):>12}"
+            f"{len(data) / max(1, len(calendar.car_events)):>12.2f}{encode_time * 1000:>14.2f}"
+        )
+    print("max decode error: " + ", ".join(f"{k} {v:.4f}" for k, v in max_errors.items()))
+
+
+if __name__ == "__main__":
+    main()
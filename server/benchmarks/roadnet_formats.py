@@ -0,0 +1,57 @@
+"""
+Compares the size and pack time of the v1 and the compact v2 roadnet format.
+
+    python -m benchmarks.roadnet_formats --map data/brno.osm
+"""
+
+import argparse
+import gzip
+import time
+
+import simpy
+
+from entities import Calendar
+from modules import Parser, RoadnetFormatV2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--map", default="data/brno.osm")
+    args = parser.parse_args()
+
+    env = simpy.Environment()
+    roadnet = Parser(env, Calendar(env))
+    roadnet.parse(args.map)
+
+    start = time.perf_counter()
+    v1, v1_counts = roadnet.pack()
+    v1_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    v2, v2_counts = RoadnetFormatV2.pack(roadnet)
+    v2_time = time.perf_counter() - start
+
+    # every lane must decode to its own coordinates
+    decoded = RoadnetFormatV2.unpack(v2)
+    lanes = [lane for way in roadnet.ways for lane in way.lanes] + [
+        lane for crossroad in roadnet.crossroads for lane in crossroad.lanes
+    ]
+    decoded_lanes = [lane for way in decoded["ways"] for lane in way["lanes"]] + [
+        lane for crossroad in decoded["crossroads"] for lane in crossroad["lanes"]
+    ]
+    max_error = max(
+        max(abs(node.lat - lat), abs(node.lng - lng))
+        for lane, decoded_lane in zip(lanes, decoded_lanes)
+        for node, (lat, lng) in zip(lane.nodes, decoded_lane["nodes"])
+    )
+    assert [lane.id for lane in lanes] == [lane["id"] for lane in decoded_lanes]
+
+    print(f"nodes / ways / crossroads: v1 {v1_counts}, v2 {v2_counts}, {len(lanes)} lanes")
+    print(f"{'format':<8}{'size [B]':>12}{'gzip [B]':>12}{'pack [ms]':>12}")
+    for name, data, pack_time in (("v1", v1, v1_time), ("v2", v2, v2_time)):
+        print(f"{name:<8}{len(data):>12}{len(gzip.compress(data)):>12}{pack_time * 1000:>12.2f}")
+    print(f"max coordinate error: {max_error:.2e} deg")
+
+
+if __name__ == "__main__":
+    main()
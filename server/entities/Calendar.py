@@ -1,35 +1,377 @@
+from __future__ import annotations
+
 import simpy
+import numpy as np
 
-from .CarEvent import CarEvent
-from .CrossroadEvent import CrossroadEvent
+from .CarEvent import CarEvent, CAR_EVENT_DTYPE
+from .CrossroadEvent import CrossroadEvent, CROSSROAD_EVENT_DTYPE
+from utils.globals import CALENDAR_INITIAL_CAPACITY
 
 
 class Calendar:
-    def __init__(self, env: simpy.Environment):
+    """
+    Recorded events stored in preallocated arrays with the layout of the wire format.
+    The green lanes of the crossroad events are kept in a separate buffer, indexed by offsets.
+    Every car event links to the previous event of the same car, so the trajectory
+    of a car is found without scanning the other events.
+    """
+
+    def __init__(
+        self,
+        env: simpy.Environment,
+        record_from: float = 0,
+        capacity: int = CALENDAR_INITIAL_CAPACITY,
+    ):
         self.env = env
-        self.car_events: list[CarEvent] = []
-        self.crossroad_events: list[CrossroadEvent] = []
+        # no events are recorded before this time (s)
+        self.record_from = record_from
+
+        self._car_events = np.empty(capacity, CAR_EVENT_DTYPE)
+        # exact event times, the packed float32 times lose precision on long runs
+        self._car_event_times = np.empty(capacity, np.float64)
+        self._car_event_count = 0
+        # position of the previous event of the same car, -1 for the first one
+        self._car_previous_events = np.empty(capacity, np.int64)
+        # position of the latest event of every car
+        self._car_last_events: dict[int, int] = {}
+
+        self._crossroad_events = np.empty(capacity, CROSSROAD_EVENT_DTYPE)
+        self._crossroad_event_times = np.empty(capacity, np.float64)
+        self._crossroad_event_count = 0
+        # start of the green lanes of each crossroad event in the lane buffer
+        self._green_lane_offsets = np.empty(capacity, np.int64)
+        self._green_lanes = np.empty(capacity, ">u4")
+        self._green_lane_count = 0
+
+    @property
+    def car_events(self) -> np.ndarray:
+        """View of the recorded car events"""
+        return self._car_events[: self._car_event_count]
+
+    @property
+    def car_event_count(self) -> int:
+        return self._car_event_count
+
+    @property
+    def car_event_times(self) -> np.ndarray:
+        return self._car_event_times[: self._car_event_count]
+
+    @property
+    def car_previous_events(self) -> np.ndarray:
+        return self._car_previous_events[: self._car_event_count]
+
+    @property
+    def car_last_events(self) -> dict[int, int]:
+        return self._car_last_events
+
+    @staticmethod
+    def follow_car_events(previous_events: np.ndarray, last: int) -> np.ndarray:
+        """Follows the links from the last event of a car back to its first one"""
+        indices = []
+        while last >= 0:
+            indices.append(last)
+            last = int(previous_events[last])
+
+        return np.array(indices[::-1], np.int64)
+
+    @property
+    def crossroad_events(self) -> np.ndarray:
+        """View of the recorded crossroad event headers"""
+        return self._crossroad_events[: self._crossroad_event_count]
+
+    @property
+    def crossroad_event_times(self) -> np.ndarray:
+        return self._crossroad_event_times[: self._crossroad_event_count]
+
+    @property
+    def green_lane_offsets(self) -> np.ndarray:
+        return self._green_lane_offsets[: self._crossroad_event_count]
+
+    @property
+    def green_lanes(self) -> np.ndarray:
+        return self._green_lanes[: self._green_lane_count]
+
+    def get_green_lanes(self, index: int) -> np.ndarray:
+        """Returns the green lane ids of the crossroad event"""
+        offset = self._green_lane_offsets[index]
+        return self._green_lanes[
+            offset : offset + self._crossroad_events[index]["lane_count"]
+        ]
+
+    @property
+    def is_recording(self) -> bool:
+        return self.env.now >= self.record_from
+
+    def snapshot_process(self, vehicles: list, crossroads: list):
+        """Records the state of every car and traffic light once the recording starts"""
+        yield self.env.timeout(max(0, self.record_from - self.env.now))
+
+        for vehicle in vehicles:
+            vehicle.calendar_car_update()
+
+        for crossroad in crossroads:
+            if crossroad.has_traffic_light:
+                crossroad.calendar_crossroad_update()
+
+    def record_car(
+        self,
+        car_id: int,
+        way_id: int,
+        crossroad_id: int,
+        lane_id: int,
+        position: float,
+        speed: float,
+    ):
+        """Writes the car event to the next free slot"""
+        if not self.is_recording:
+            return
+
+        if self._car_event_count == len(self._car_events):
+            self._car_events = self._grow(self._car_events)
+            self._car_event_times = self._grow(self._car_event_times)
+
+        self._link_car_event(car_id)
+        self._car_event_times[self._car_event_count] = self.env.now
+        self._car_events[self._car_event_count] = (
+            self.env.now,
+            car_id,
+            way_id,
+            crossroad_id,
+            lane_id,
+            position,
+            speed,
+        )
+        self._car_event_count += 1
+
+    def _link_car_event(self, car_id: int):
+        """Links the next car event to the previous one of the car"""
+        index = self._car_event_count
+        if index == len(self._car_previous_events):
+            self._car_previous_events = self._grow(self._car_previous_events)
+
+        self._car_previous_events[index] = self._car_last_events.get(car_id, -1)
+        self._car_last_events[car_id] = index
+
+    def record_crossroad(self, crossroad_id: int, lane_ids: list[int]):
+        """Writes the crossroad event to the next free slot and its lanes to the lane buffer"""
+        if not self.is_recording:
+            return
+
+        if self._crossroad_event_count == len(self._crossroad_events):
+            self._crossroad_events = self._grow(self._crossroad_events)
+            self._crossroad_event_times = self._grow(self._crossroad_event_times)
+            self._green_lane_offsets = self._grow(self._green_lane_offsets)
+
+        while self._green_lane_count + len(lane_ids) > len(self._green_lanes):
+            self._green_lanes = self._grow(self._green_lanes)
+
+        index = self._crossroad_event_count
+        self._crossroad_event_times[index] = self.env.now
+        self._crossroad_events[index] = (self.env.now, crossroad_id, len(lane_ids))
+        self._green_lane_offsets[index] = self._green_lane_count
+        self._green_lanes[
+            self._green_lane_count : self._green_lane_count + len(lane_ids)
+        ] = lane_ids
+
+        self._crossroad_event_count += 1
+        self._green_lane_count += len(lane_ids)
 
     def add_car_event(self, event: CarEvent):
-        event.time = float(self.env.now)
-        self.car_events.append(event)
+        self.record_car(
+            event.car_id,
+            event.way_id,
+            event.crossroad_id,
+            event.lane_id,
+            event.position,
+            event.speed,
+        )
 
-    def add_crossroad_event(self, event):
-        event.time = float(self.env.now)
-        self.crossroad_events.append(event)
+    def add_car_events(self, events: list[CarEvent]):
+        for event in events:
+            self.add_car_event(event)
+
+    def add_crossroad_event(self, event: CrossroadEvent):
+        self.record_crossroad(
+            event.crossroad_id, [lane.id for lane in event.green_lanes]
+        )
+
+    def extend(self, events: dict[str, np.ndarray]):
+        """Appends already recorded events given as returned by get_arrays"""
+        car_events = events["car_events"]
+
+        while self._car_event_count + len(car_events) > len(self._car_events):
+            self._car_events = self._grow(self._car_events)
+            self._car_event_times = self._grow(self._car_event_times)
+        while self._car_event_count + len(car_events) > len(self._car_previous_events):
+            self._car_previous_events = self._grow(self._car_previous_events)
+
+        start = self._car_event_count
+        end = start + len(car_events)
+        self._car_events[start:end] = car_events
+        self._car_event_times[start:end] = events["car_event_times"]
+        self._car_previous_events[start:end] = self._get_previous_events(
+            car_events["car_id"].astype(np.int64), start
+        )
+        self._car_event_count = end
+
+        self._extend_crossroad_events(events)
+
+    def _extend_crossroad_events(self, events: dict[str, np.ndarray]):
+        crossroad_events = events["crossroad_events"]
+        green_lanes = events["green_lanes"]
+
+        while self._crossroad_event_count + len(crossroad_events) > len(
+            self._crossroad_events
+        ):
+            self._crossroad_events = self._grow(self._crossroad_events)
+            self._crossroad_event_times = self._grow(self._crossroad_event_times)
+            self._green_lane_offsets = self._grow(self._green_lane_offsets)
+
+        while self._green_lane_count + len(green_lanes) > len(self._green_lanes):
+            self._green_lanes = self._grow(self._green_lanes)
+
+        start = self._crossroad_event_count
+        end = start + len(crossroad_events)
+        self._crossroad_events[start:end] = crossroad_events
+        self._crossroad_event_times[start:end] = events["crossroad_event_times"]
+        self._green_lane_offsets[start:end] = self._green_lane_count + np.concatenate(
+            ([0], np.cumsum(crossroad_events["lane_count"], dtype=np.int64)[:-1])
+        )[: len(crossroad_events)]
+        self._crossroad_event_count = end
+
+        self._green_lanes[
+            self._green_lane_count : self._green_lane_count + len(green_lanes)
+        ] = green_lanes
+        self._green_lane_count += len(green_lanes)
+
+    def _get_previous_events(self, car_ids: np.ndarray, start: int) -> np.ndarray:
+        """
+        Returns the position of the previous event of the same car for every car event
+        appended at the start position, the appended events become the latest of their cars
+        """
+        if len(car_ids) == 0:
+            return np.empty(0, np.int64)
+
+        # stable sort keeps the events of each car in the time order
+        order = np.argsort(car_ids, kind="stable")
+        sorted_ids = car_ids[order]
+        positions = start + order
+
+        is_first = np.ones(len(car_ids), bool)
+        is_first[1:] = sorted_ids[1:] != sorted_ids[:-1]
+
+        previous = np.empty(len(car_ids), np.int64)
+        previous[1:] = positions[:-1]
+        for index in np.flatnonzero(is_first):
+            previous[index] = self._car_last_events.get(int(sorted_ids[index]), -1)
+
+        is_last = np.append(is_first[1:], True)
+        for car_id, position in zip(sorted_ids[is_last], positions[is_last]):
+            self._car_last_events[int(car_id)] = int(position)
+
+        result = np.empty(len(car_ids), np.int64)
+        result[order] = previous
+        return result
+
+    def get_arrays(self, crossroad_ids=None, lane_ids=None) -> dict[str, np.ndarray]:
+        """
+        Returns copies of the recorded events, optionally only the events
+        of the given crossroads and the car events on the given lanes.
+        The first event of a car after it leaves the lanes is kept as well,
+        its lane missing from the filtered roadnet tells the clients the car left.
+        """
+        car_mask = slice(None)
+        if lane_ids is not None:
+            car_mask = np.isin(self.car_events["lane_id"], list(lane_ids))
+
+            previous = self.car_previous_events
+            has_previous = previous >= 0
+            car_mask[has_previous] |= car_mask[previous[has_previous]]
+        crossroad_mask = (
+            np.isin(self.crossroad_events["crossroad_id"], list(crossroad_ids))
+            if crossroad_ids is not None
+            else np.ones(self._crossroad_event_count, bool)
+        )
+        lanes_mask = np.repeat(
+            crossroad_mask, self.crossroad_events["lane_count"].astype(np.int64)
+        )
+
+        return {
+            "car_events": self.car_events[car_mask].copy(),
+            "car_event_times": self.car_event_times[car_mask].copy(),
+            "crossroad_events": self.crossroad_events[crossroad_mask],
+            "crossroad_event_times": self.crossroad_event_times[crossroad_mask],
+            "green_lanes": self.green_lanes[lanes_mask],
+        }
+
+    def filter(self, crossroad_ids=None, lane_ids=None) -> Calendar:
+        """
+        Returns a new calendar with only the events of the given crossroads and lanes,
+        and the events of the cars leaving the lanes
+        """
+        calendar = Calendar(self.env, self.record_from)
+        calendar.extend(self.get_arrays(crossroad_ids, lane_ids))
+        return calendar
+
+    def clear(self):
+        """Drops the recorded events, the allocated slots are reused"""
+        self._car_event_count = 0
+        self._car_last_events = {}
+        self._crossroad_event_count = 0
+        self._green_lane_count = 0
 
     def pack(self):
-        car_events_bytes = b"".join([event.pack() for event in self.car_events])
-        crossroad_events_bytes = b"".join(
-            [event.pack() for event in self.crossroad_events]
+        """Returns the packed events as one copy, it stays valid after the calendar is cleared"""
+        chunks, event_counts = self.pack_chunks()
+        return b"".join(chunks), event_counts
+
+    def pack_chunks(self):
+        """
+        Returns the car events as a view of the recorded ones, without copying them,
+        and the packed crossroad events. The view is valid until the calendar is cleared.
+        """
+        car_events_bytes = memoryview(self.car_events).cast("B")
+
+        return [car_events_bytes, self._pack_crossroad_events()], (
+            self._car_event_count,
+            self._crossroad_event_count,
         )
 
-        return (car_events_bytes + crossroad_events_bytes), (
-            len(self.car_events),
-            len(self.crossroad_events),
+    def _pack_crossroad_events(self) -> bytes:
+        """Interleaves the crossroad event headers with their green lanes"""
+        events = self.crossroad_events
+        lane_counts = events["lane_count"].astype(np.int64)
+
+        words = np.empty(3 * len(events) + self._green_lane_count, ">u4")
+
+        header_positions = 3 * np.arange(len(events)) + self.green_lane_offsets
+        words[header_positions] = np.ascontiguousarray(events["time"]).view(">u4")
+        words[header_positions + 1] = events["crossroad_id"]
+        words[header_positions + 2] = lane_counts
+
+        lane_events = np.repeat(np.arange(len(events)), lane_counts)
+        words[np.arange(self._green_lane_count) + 3 * (lane_events + 1)] = (
+            self.green_lanes
         )
 
+        return words.tobytes()
+
     def get_data(self):
-        car_events = [event.get_data() for event in self.car_events]
-        crossroad_events = [event.get_data() for event in self.crossroad_events]
+        car_events = [
+            dict(zip(CAR_EVENT_DTYPE.names, event.tolist())) for event in self.car_events
+        ]
+        crossroad_events = [
+            {
+                "time": float(event["time"]),
+                "crossroad_id": int(event["crossroad_id"]),
+                "green_lanes": self.get_green_lanes(index).tolist(),
+            }
+            for index, event in enumerate(self.crossroad_events)
+        ]
         return {"car_events": car_events, "crossroad_events": crossroad_events}
+
+    @staticmethod
+    def _grow(array: np.ndarray) -> np.ndarray:
+        grown = np.empty(max(2 * len(array), 1), array.dtype)
+        grown[: len(array)] = array
+        return grown
@@ -8,14 +8,15 @@ from enum import Enum
 import simpy
 from simpy.util import start_delayed
 import math
-import random
 
 from .Way import Way
 from .Entity import SimulationEntity, WithId
-from .CarEvent import CarEvent
+from .SimulationContext import SimulationContext
 from .Calendar import Calendar
 from .Lane import Lane
 from .Crossroad import Crossroad, BlockableLane
+from .Notifier import Notifier
+from .Platoon import Platoon
 from utils import LatLng, Direction
 from utils.map_geometry import is_incoming_way
 from utils.math import haversine
@@ -29,6 +30,9 @@ class CarState(Enum):
     Queued = 3
     Waiting = 4
     Despawning = 5
+    Platooning = 6
+    Mesoscopic = 7
+    Transferring = 8
 
 
 class Car(SimulationEntity, metaclass=WithId):
@@ -43,9 +47,11 @@ class Car(SimulationEntity, metaclass=WithId):
         comfortable_speed: int,
         length: int = 0.003,
         ways_to_cross_before_despawn: int = 50,
+        car_id: int = None,
     ):
         SimulationEntity.__init__(self, env)
-        self.id = next(self._ids)
+        self.id = car_id if car_id is not None else type(self).next_id()
+        self.random = SimulationContext.current().random
         self.spawner = spawner
         self.calendar = calendar
         # current way
@@ -78,18 +84,31 @@ class Car(SimulationEntity, metaclass=WithId):
 
         self._next_crossroad_blocked = False
         self._crossroad_unblock_proc = None
+        self._crossroad_unblock_time: float = None
 
-        # event called by the current car on its state change
-        self.update_event = env.event()
-        # event called by other cars to notify this car about their state change
-        self.environment_update_event = env.event()
+        # platoon the car is leading or following
+        self.platoon: Platoon = None
+
+        # time the car leaves the link of its mesoscopic lane
+        self.mesoscopic_exit_time = 0
+
+        # notifies the cars following this car about its state change
+        self._update_notifier = Notifier(env, spawner.notification_stats)
+        # notifies this car about the state change of other cars
+        self._environment_update_notifier = Notifier(
+            env, spawner.notification_stats
+        )
         self.controller_proc = env.process(self.controller())
         # insert the initial state to the calendar
         self.calendar_car_update()
 
     def controller(self):
         yield self.env.process(self.drive())
-        self.despawn()
+
+        if self.state == CarState.Transferring:
+            self.transfer()
+        else:
+            self.despawn()
 
     @property
     def way(self) -> Way:
@@ -122,6 +141,9 @@ class Car(SimulationEntity, metaclass=WithId):
 
         self._trigger_update_event()
 
+        if self.platoon is not None and self.platoon.leader == self:
+            self.platoon.follow_leader()
+
         if len(self._blocked_crossroad_lanes) > 1 or (
             not self._next_crossroad_blocked and len(self._blocked_crossroad_lanes) == 1
         ):
@@ -138,6 +160,13 @@ class Car(SimulationEntity, metaclass=WithId):
                 self._crossroad_unblock_proc = start_delayed(
                     self.env, self._unblock_crossroad_process(), time_to_leave_crossroad
                 )
+                self._crossroad_unblock_time = self.env.now + time_to_leave_crossroad
+
+    def follow_platoon_speed(self, value: int):
+        """Sets the speed of a platoon member, the platoon records it"""
+        self.position = self.position
+        self._speed = value
+        self._trigger_update_event()
 
     @property
     def desired_speed(self) -> float:
@@ -429,22 +458,43 @@ class Car(SimulationEntity, metaclass=WithId):
         self.poke_car_behind(car_behind)
         self.spawner.despawn(self)
 
+    def transfer(self):
+        """Hands the car over to the spawner simulating its current lane"""
+        self.calendar_car_update()
+        self._release_blockers()
+        car_behind = self.car_behind
+        self.lane.remove(self)
+        self.poke_car_behind(car_behind)
+        self.spawner.transfer(self)
+
+    @property
+    def update_event(self) -> simpy.Event:
+        """Subscribes to the next state change of this car"""
+        return self._update_notifier.subscribe()
+
+    @property
+    def environment_update_event(self) -> simpy.Event:
+        """Subscribes to the next state change of the cars around this car"""
+        return self._environment_update_notifier.subscribe()
+
     def _trigger_update_event(self):
-        self.update_event.succeed()
-        self.update_event = self.env.event()
+        self._update_notifier.notify()
 
     def trigger_environment_update_event(self):
-        self.environment_update_event.succeed()
-        self.environment_update_event = self.env.event()
+        self._environment_update_notifier.notify()
 
     def poke_car_behind(self, car_to_poke):
         """Triggers the enironment update event of the car behind this car"""
         if car_to_poke:
             car_to_poke.trigger_environment_update_event()
 
-    @property
-    def _car_ahead_update_event(self):
-        return self.car_ahead.update_event if self.car_ahead else self.env.event()
+    def _any_of_with_car_ahead_update(self, events: list[simpy.Event]):
+        """Waits for any of the events or the state change of the car ahead (if there is one)"""
+        car_ahead = self.car_ahead
+        if car_ahead is not None:
+            events.append(car_ahead.update_event)
+
+        return self.env.any_of(events)
 
     def get_mirror_position_in_lane(self, lane: Lane):
         """Returns the mirrored position on the given lane"""
@@ -577,7 +627,7 @@ class Car(SimulationEntity, metaclass=WithId):
 
             if blocking_car:
                 if blocking_car.speed == 0:
-                    if blocking_car.state != CarState.Queued:
+                    if blocking_car.state not in (CarState.Queued, CarState.Platooning):
                         return CarState.Despawning
                     self.speed = 0
                     yield blocking_car.update_event & self.env.timeout(1)
@@ -616,7 +666,9 @@ class Car(SimulationEntity, metaclass=WithId):
         arrive_timeout = self.env.timeout(self.time_to_be_at_position(lane_position))
         catch_up_car_ahead_timeout = self.env.timeout(self.time_to_reach_car_ahead)
 
-        yield arrive_timeout | catch_up_car_ahead_timeout | self.environment_update_event | self._car_ahead_update_event
+        yield self._any_of_with_car_ahead_update(
+            [arrive_timeout, catch_up_car_ahead_timeout, self.environment_update_event]
+        )
 
         self.position = self.position
 
@@ -633,12 +685,15 @@ class Car(SimulationEntity, metaclass=WithId):
         if self.lane.crossroad is not None:
             return CarState.CrossingCrossroad
 
+        if self.lane.mesoscopic_link is not None:
+            return CarState.Mesoscopic
+
         self.speed = self.desired_speed
 
         min_lane_change_percentage = self.lane_percentage + (100 - self.lane_percentage) / 2
 
         p = yield self.env.process(
-            self.drive_to_lane_percentage(random.uniform(min_lane_change_percentage, 100))
+            self.drive_to_lane_percentage(self.random.uniform(min_lane_change_percentage, 100))
         )
 
         if self.ways_to_cross_before_despawn == 0:
@@ -689,6 +744,21 @@ class Car(SimulationEntity, metaclass=WithId):
 
         return CarState.Waiting
 
+    def can_join_platoon(self, car_ahead: "Car") -> bool:
+        """Returns True if the car can follow the car ahead as a platoon member"""
+        return (
+            car_ahead is not None
+            and car_ahead.state in (CarState.Queued, CarState.Platooning)
+            and car_ahead._lane_to_switch is None
+            and self._lane_to_switch is None
+            and (car_ahead.platoon is None or car_ahead.platoon.tail == car_ahead)
+            and car_ahead.speed <= self.desired_speed
+        )
+
+    def leave_platoon(self):
+        if self.platoon is not None:
+            self.platoon.leave(self)
+
     def queued_process(self):
         """Drives behind the car ahead, tries to switch lane"""
         if not self.car_ahead:
@@ -696,6 +766,7 @@ class Car(SimulationEntity, metaclass=WithId):
 
         # Switch lane if would switch anyways at some point
         if self._lane_to_switch is not None:
+            self.leave_platoon()
             p = yield self.env.process(
                 self.switch_closer_to_lane_process(self._lane_to_switch)
             )
@@ -707,6 +778,7 @@ class Car(SimulationEntity, metaclass=WithId):
 
         # Try to overtake to left and right side
         if self.can_overtake(self.lane.left) and self.should_overtake(self.lane.left):
+            self.leave_platoon()
             this_lane = self.lane
             self.state = CarState.Crossing
             p = yield self.env.process(self.switch_closer_to_lane_process(self.lane.left))
@@ -715,6 +787,7 @@ class Car(SimulationEntity, metaclass=WithId):
 
             return p.value
         elif self.can_overtake(self.lane.right) and self.should_overtake(self.lane.right):
+            self.leave_platoon()
             this_lane = self.lane
             self.state = CarState.Crossing
             p = yield self.env.process(self.switch_closer_to_lane_process(self.lane.right))
@@ -723,6 +796,13 @@ class Car(SimulationEntity, metaclass=WithId):
 
             return p.value
 
+        # Follow the car ahead as a part of its platoon
+        if self.can_join_platoon(self.car_ahead):
+            self.speed = self.car_ahead.speed
+            platoon = self.car_ahead.platoon or Platoon(self.car_ahead)
+            platoon.join(self)
+            return CarState.Platooning
+
         self.speed = min(self.car_ahead.speed, self.desired_speed)
         original_car_ahead = self.car_ahead
         lane_end_timeout = self.env.timeout(
@@ -730,7 +810,9 @@ class Car(SimulationEntity, metaclass=WithId):
         )
         try_overtake_timeout = self.env.timeout(3) # try to overtake again
 
-        yield self.environment_update_event | self._car_ahead_update_event | lane_end_timeout | try_overtake_timeout
+        yield self._any_of_with_car_ahead_update(
+            [self.environment_update_event, lane_end_timeout, try_overtake_timeout]
+        )
 
         if lane_end_timeout.processed:
             return CarState.Waiting
@@ -753,6 +835,94 @@ class Car(SimulationEntity, metaclass=WithId):
         else:
             return CarState.Crossing  # leave the queue
 
+    def platoon_process(self):
+        """Follows the platoon leader until the platoon splits"""
+        if self.platoon is None or self.platoon.leader == self:
+            return CarState.Queued
+
+        try_overtake_timeout = self.env.timeout(3)  # try to overtake again
+
+        yield self.environment_update_event | try_overtake_timeout
+
+        if self.platoon is None or self.platoon.leader == self:
+            return CarState.Queued
+
+        if try_overtake_timeout.processed and not (
+            (self.can_overtake(self.lane.left) and self.should_overtake(self.lane.left))
+            or (
+                self.can_overtake(self.lane.right)
+                and self.should_overtake(self.lane.right)
+            )
+        ):
+            return CarState.Platooning
+
+        # the cars around changed or the car wants to overtake
+        self.platoon.split_at(self)
+        return CarState.Queued
+
+    def mesoscopic_process(self):
+        """Crosses the lane as a part of its link queue, the car is simulated again at the crossroad"""
+        # lane changes are not modeled, the car joins the queue of the lane it has to end in
+        if self._lane_to_switch is not None:
+            position_in_dest_lane = self.get_mirror_position_in_lane(
+                self._lane_to_switch
+            )
+            car_behind = self.car_behind
+
+            self.lane.remove(self)
+            self.poke_car_behind(car_behind)
+            self.place_car_on_lane(self._lane_to_switch, position_in_dest_lane)
+            self._lane_to_switch = None
+
+        link = self.lane.mesoscopic_link
+
+        while True:
+            car_ahead = self.car_ahead
+            car_ahead_exit_time = (
+                car_ahead.mesoscopic_exit_time
+                if car_ahead and car_ahead.state == CarState.Mesoscopic
+                else None
+            )
+
+            distance = self.lane.length - self.position
+            self.mesoscopic_exit_time = link.get_exit_time(
+                self.env.now, distance, self.desired_speed, car_ahead_exit_time
+            )
+
+            # the car behind has to leave after this car
+            car_behind = self.car_behind
+            if (
+                car_behind
+                and car_behind.state == CarState.Mesoscopic
+                and car_behind.mesoscopic_exit_time
+                < self.mesoscopic_exit_time + link.headway
+            ):
+                car_behind.trigger_environment_update_event()
+
+            if self.mesoscopic_exit_time <= self.env.now:
+                break
+
+            # constant speed, so the calendar interpolates the car along the link
+            self.speed = distance / ((self.mesoscopic_exit_time - self.env.now) / 3600)
+            exit_timeout = self.env.timeout(self.mesoscopic_exit_time - self.env.now)
+
+            yield exit_timeout | self.environment_update_event
+
+            if exit_timeout.processed:
+                break
+
+        # wait for the cars ahead to leave the link
+        while not self.is_first_in_lane:
+            self.speed = 0
+            yield self.environment_update_event
+
+        if self.ways_to_cross_before_despawn == 0:
+            return CarState.Despawning
+
+        # the car enters the crossroad at its usual speed
+        self.speed = self.desired_speed
+        return CarState.Waiting
+
     def crossroad_crossing_process(self):
         """Drives through the crossroad"""
         self.calendar_car_update()
@@ -777,6 +947,9 @@ class Car(SimulationEntity, metaclass=WithId):
 
         self.poke_car_behind(car_behind_in_prev_lane)
 
+        if not self.spawner.owns_lane(self.lane):
+            return CarState.Transferring
+
         next_path = self._get_next_path()
         self._next_way, self._next_lanes, self._lane_to_switch = (
             next_path if next_path else (None, [], None)
@@ -814,6 +987,9 @@ class Car(SimulationEntity, metaclass=WithId):
             self.speed = prev_speed
             return CarState.CrossingCrossroad
         else:
+            if not self.spawner.owns_lane(self.lane):
+                return CarState.Transferring
+
             next_path = self._get_next_path()
             (
                 self._next_way,
@@ -835,11 +1011,23 @@ class Car(SimulationEntity, metaclass=WithId):
                 p = yield self.env.process(self.queued_process())
             elif self.state == CarState.Waiting:
                 p = yield self.env.process(self.waiting_process())
+            elif self.state == CarState.Platooning:
+                p = yield self.env.process(self.platoon_process())
+            elif self.state == CarState.Mesoscopic:
+                p = yield self.env.process(self.mesoscopic_process())
             else:
                 return
 
             self.state = CarState(p)
 
+            # the leader hands the platoon over once it stops following the queue
+            if (
+                self.platoon is not None
+                and self.platoon.leader == self
+                and self.state != CarState.Queued
+            ):
+                self.platoon.release_leader()
+
     def _get_next_path(self) -> tuple[Way, list[Lane], Lane]:
         """Returns a random next path to drive"""
         crossroad = self.next_crossroad
@@ -859,18 +1047,18 @@ class Car(SimulationEntity, metaclass=WithId):
             if len(next_lanes) == 0:
                 return None
 
-            next_lane = random.choice(next_lanes)
+            next_lane = self.random.choice(next_lanes)
         else:
-            next_way_option = random.choice(next_way_options)
+            next_way_option = self.random.choice(next_way_options)
             next_way = next_way_option.way
             lane_options = crossroad.get_next_lane_options(self.way, next_way)
             if self.lane not in lane_options.keys():
-                lane_to_switch = random.choice(list(lane_options.keys()))
-                next_lane = random.choice(lane_options[lane_to_switch])
+                lane_to_switch = self.random.choice(list(lane_options.keys()))
+                next_lane = self.random.choice(lane_options[lane_to_switch])
 
                 self._lane_to_switch = lane_to_switch
             else:
-                next_lane = random.choice(lane_options[self.lane])
+                next_lane = self.random.choice(lane_options[self.lane])
 
         crossroad_lane = crossroad.get_lane(
             self._lane_to_switch or self.lane, next_lane
@@ -909,14 +1097,108 @@ class Car(SimulationEntity, metaclass=WithId):
 
         return LatLng(lat, lng)
 
+    def get_state(self, lane_indices: dict[Lane, int], way_indices: dict[Way, int]) -> dict:
+        """Returns the state of the car with the lanes and ways given by their indices"""
+        unblock_pending = (
+            self._crossroad_unblock_proc is not None
+            and self._crossroad_unblock_proc.is_alive
+        )
+
+        return {
+            "id": self.id,
+            "lane": lane_indices[self.lane],
+            "position": self.position,
+            "speed": self.speed,
+            "comfortable_speed": self.comfortable_speed,
+            "length": self.length,
+            "state": self.state.value,
+            "ways_to_cross": self.ways_to_cross_before_despawn,
+            "next_way": way_indices[self._next_way] if self._next_way else None,
+            "next_lanes": [lane_indices[lane] for lane in self._next_lanes],
+            "lane_to_switch": (
+                lane_indices[self._lane_to_switch] if self._lane_to_switch else None
+            ),
+            "blocked_lanes": [
+                (lane_indices[lane], request is not None)
+                for lane, request in zip(
+                    self._blocked_crossroad_lanes, self._lane_block_requests
+                )
+            ],
+            "next_crossroad_blocked": self._next_crossroad_blocked,
+            "unblock_time": self._crossroad_unblock_time if unblock_pending else None,
+            "mesoscopic_exit_time": self.mesoscopic_exit_time,
+        }
+
+    @classmethod
+    def from_state(
+        cls,
+        env: simpy.Environment,
+        spawner: "VehicleSpawner",
+        calendar: Calendar,
+        state: dict,
+        lanes: list[Lane],
+        ways: list[Way],
+    ) -> "Car":
+        """
+        Recreates the car from its state, the car continues in the state it was saved in.
+        The lane queues and the crossroad blockers are restored by the caller.
+        """
+        car = cls.__new__(cls)
+        SimulationEntity.__init__(car, env)
+        car.id = state["id"]
+        car.random = SimulationContext.current().random
+        car.spawner = spawner
+        car.calendar = calendar
+        car.lane = lanes[state["lane"]]
+        car._way = car.lane.way
+        car.comfortable_speed = state["comfortable_speed"]
+        car._speed = state["speed"]
+        car.length = state["length"]
+        car._position = state["position"]
+        car.update_time = env.now
+        car.state = CarState(state["state"])
+
+        car.ways_to_cross_before_despawn = state["ways_to_cross"]
+        car._next_way = ways[state["next_way"]] if state["next_way"] is not None else None
+        car._next_lanes = [lanes[index] for index in state["next_lanes"]]
+        car._lane_to_switch = (
+            lanes[state["lane_to_switch"]] if state["lane_to_switch"] is not None else None
+        )
+
+        car._blocked_crossroad_lanes = []
+        car._lane_block_requests = []
+        car._next_crossroad_blocked = state["next_crossroad_blocked"]
+        car._crossroad_unblock_proc = None
+        car._crossroad_unblock_time = state["unblock_time"]
+        if car._crossroad_unblock_time is not None:
+            delay = car._crossroad_unblock_time - env.now
+            car._crossroad_unblock_proc = (
+                start_delayed(env, car._unblock_crossroad_process(), delay)
+                if delay > 0
+                else env.process(car._unblock_crossroad_process())
+            )
+
+        car.platoon = None
+        car.mesoscopic_exit_time = state["mesoscopic_exit_time"]
+
+        if car.state == CarState.Waiting:
+            # the waiting process stops the car and continues at the speed it had before
+            car._speed = car.desired_speed
+
+        car._update_notifier = Notifier(env, spawner.notification_stats)
+        car._environment_update_notifier = Notifier(env, spawner.notification_stats)
+        car.controller_proc = env.process(car.controller())
+        car.calendar_car_update()
+
+        return car
+
     def calendar_car_update(self):
-        self.calendar.add_car_event(
-            CarEvent(
+        if self.calendar.is_recording:
+            self.calendar.record_car(
                 self.id,
-                self.way.id if self.way else None,
-                self.next_crossroad.id if self.way is None else None,
+                self.way.id if self.way else -1,
+                self.next_crossroad.id if self.way is None else -1,
                 self.lane.id,
                 self.lane_percentage,
                 self.speed,
             )
-        )
@@ -1,4 +1,18 @@
 import struct
+import numpy as np
+
+# layout of a packed car event
+CAR_EVENT_DTYPE = np.dtype(
+    [
+        ("time", ">f4"),
+        ("car_id", ">u4"),
+        ("way_id", ">i4"),
+        ("crossroad_id", ">i4"),
+        ("lane_id", ">u4"),
+        ("position", ">f4"),
+        ("speed", ">f4"),
+    ]
+)
 
 
 class CarEvent:
@@ -8,14 +8,13 @@ import simpy
 import collections
 import struct
 import math
-import random
 
 from .Node import Node
 from .Lane import Lane
 from .BlockableLane import BlockableLane
 from .Calendar import Calendar
-from .CrossroadEvent import CrossroadEvent
 from .Entity import EntityBase, WithId
+from .SimulationContext import SimulationContext
 from utils import Turn
 from utils.map_geometry import is_incoming_way, angle_between_nodes
 from utils.globals import TRAFFIC_LIGHT_DISABLED_TIME, TRAFFIC_LIGHT_INTERVAL
@@ -40,9 +39,10 @@ class CrossroadTurn:
 class Crossroad(EntityBase, metaclass=WithId):
     def __init__(self, env: simpy.Environment, calendar: Calendar, node: Node):
         super().__init__()
-        self.id = next(self._ids)
+        self.id = type(self).next_id()
         self.env = env
         self.calendar = calendar
+        self.random = SimulationContext.current().random
         self._ways: list[Way] = []
         self.node: Node = node
         self.turns: dict[Way, CrossroadTurn] = {}
@@ -50,6 +50,13 @@ class Crossroad(EntityBase, metaclass=WithId):
         self.lanes: list[BlockableLane] = []
         self.main_ways: list[Way] = []
 
+        # current phase of the traffic light and the time it ends
+        self.signal_phase = 0
+        self.signal_phase_end: float = None
+        # disabled flags and green lane ids of the lanes in every phase, built on the first use
+        self._signal_phase_disabled: list[list[bool]] = None
+        self._signal_phase_lanes: list[list[int]] = None
+
         self._semaphore_process = (
             self.env.process(self.semaphore_process())
             if self.has_traffic_light
@@ -160,42 +167,82 @@ class Crossroad(EntityBase, metaclass=WithId):
         return [lane for lane in self.lanes if not lane.disabled]
 
     def calendar_crossroad_update(self):
-        self.calendar.add_crossroad_event(CrossroadEvent(self.id, self.enabled_lanes))
+        if not self.calendar.is_recording:
+            return
 
-    def semaphore_process(self):
-        dir1 = (self.ways[0], self.turns[self.ways[0]].through)
-        dir2 = (self.turns[self.ways[0]].left, self.turns[self.ways[0]].right)
+        if self._signal_phase_lanes is not None:
+            # the green lanes of the phases are shared by all its events
+            lane_ids = self._signal_phase_lanes[self.signal_phase]
+        else:
+            lane_ids = [lane.id for lane in self.lanes if not lane.disabled]
 
-        # dir1 is always green at the beginning
-        self.enable_all_lanes()
-        self.disable_lanes_beginning_on_way(dir2[0])
-        self.disable_lanes_beginning_on_way(dir2[1])
-        self.calendar_crossroad_update()
+        self.calendar.record_crossroad(self.id, lane_ids)
 
-        # switch to the next state after a random time
-        yield self.env.timeout(random.randint(0, TRAFFIC_LIGHT_INTERVAL))
+    def semaphore_process(self):
+        if self.signal_phase_end is None:
+            # switch to the next phase after a random time
+            self.signal_phase_end = self.env.now + self.random.randint(
+                0, TRAFFIC_LIGHT_INTERVAL
+            )
 
         while True:
-            self.disable_all_lanes()
+            self._set_signal_phase(self.signal_phase)
             self.calendar_crossroad_update()
-            yield self.env.timeout(TRAFFIC_LIGHT_DISABLED_TIME)
 
-            self.enable_all_lanes()
-            self.disable_lanes_beginning_on_way(dir1[0])
-            self.disable_lanes_beginning_on_way(dir1[1])
-            self.calendar_crossroad_update()
+            yield self.env.timeout(self.signal_phase_end - self.env.now)
 
-            yield self.env.timeout(TRAFFIC_LIGHT_INTERVAL)
-            self.disable_all_lanes()
-            self.calendar_crossroad_update()
+            # green for dir1, red, green for dir2, red
+            self.signal_phase = (self.signal_phase + 1) % 4
+            self.signal_phase_end = self.env.now + (
+                TRAFFIC_LIGHT_INTERVAL
+                if self.signal_phase % 2 == 0
+                else TRAFFIC_LIGHT_DISABLED_TIME
+            )
 
-            yield self.env.timeout(TRAFFIC_LIGHT_DISABLED_TIME)
-            self.enable_all_lanes()
-            self.disable_lanes_beginning_on_way(dir2[0])
-            self.disable_lanes_beginning_on_way(dir2[1])
-            self.calendar_crossroad_update()
+    def _set_signal_phase(self, phase: int):
+        if self._signal_phase_disabled is None:
+            self._init_signal_phases()
+
+        for lane, disabled in zip(self.lanes, self._signal_phase_disabled[phase]):
+            lane.disabled = disabled
+
+    def _init_signal_phases(self):
+        """Builds the lanes of the phases once, the roadnet doesn't change afterwards"""
+        self._signal_phase_disabled = []
+        self._signal_phase_lanes = []
 
-            yield self.env.timeout(TRAFFIC_LIGHT_INTERVAL)
+        for phase in range(4):
+            self._apply_signal_phase(phase)
+            self._signal_phase_disabled.append([lane.disabled for lane in self.lanes])
+            self._signal_phase_lanes.append(
+                [lane.id for lane in self.lanes if not lane.disabled]
+            )
+
+    def _apply_signal_phase(self, phase: int):
+        dir1 = (self.ways[0], self.turns[self.ways[0]].through)
+        dir2 = (self.turns[self.ways[0]].left, self.turns[self.ways[0]].right)
+
+        if phase % 2 == 1:
+            self.disable_all_lanes()
+            return
+
+        # dir1 is green in the first phase
+        red_dir = dir2 if phase == 0 else dir1
+        self.enable_all_lanes()
+        self.disable_lanes_beginning_on_way(red_dir[0])
+        self.disable_lanes_beginning_on_way(red_dir[1])
+
+    def get_state(self) -> dict:
+        """Returns the state of the traffic light"""
+        return {
+            "signal_phase": self.signal_phase,
+            "signal_phase_end": self.signal_phase_end,
+        }
+
+    def set_state(self, state: dict):
+        """Restores the state of the traffic light before the simulation continues"""
+        self.signal_phase = state["signal_phase"]
+        self.signal_phase_end = state["signal_phase_end"]
 
     def lane_begin_way(self, lane: Lane) -> Way:
         for way in self._ways:
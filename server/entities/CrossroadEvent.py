@@ -5,6 +5,12 @@ if TYPE_CHECKING:
     from entities.Crossroad import BlockableLane
 
 import struct
+import numpy as np
+
+# layout of a packed crossroad event header, the green lane ids follow it
+CROSSROAD_EVENT_DTYPE = np.dtype(
+    [("time", ">f4"), ("crossroad_id", ">u4"), ("lane_count", ">u4")]
+)
 
 
 class CrossroadEvent:
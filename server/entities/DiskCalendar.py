@@ -0,0 +1,234 @@
+import os
+import simpy
+import numpy as np
+
+from .Calendar import Calendar
+from .CarEvent import CAR_EVENT_DTYPE
+from utils.globals import EVENT_LOG_SEGMENT_SIZE
+
+
+class DiskCalendar(Calendar):
+    """
+    Calendar writing the car events straight to a file instead of the memory.
+
+        preamble, car events (packed records), crossroad events (written by close)
+
+    The file grows by segments of a fixed number of records, only the current segment is mapped,
+    so the memory stays flat on long runs. The links between the events of each car
+    are written the same way to a file next to it, the crossroad events are few
+    and kept in the memory.
+    Once closed, the file has the layout of the event part of the wire format
+    and can be sent as is or mapped again for an analysis.
+    """
+
+    def __init__(
+        self,
+        env: simpy.Environment,
+        path: str,
+        record_from: float = 0,
+        segment_size: int = EVENT_LOG_SEGMENT_SIZE,
+    ):
+        super().__init__(env, record_from)
+        self.path = path
+        # number of car events in one mapped segment
+        self.segment_size = segment_size
+
+        # the car events are never kept in the memory
+        self._car_events = None
+        self._car_event_times = None
+        self._car_previous_events = None
+
+        self._file = open(path, "w+b")
+        self._links_file = open(self.get_links_path(path), "w+b")
+        self._events_offset = 0
+        self._segment: np.memmap = None
+        self._links_segment: np.memmap = None
+
+    @staticmethod
+    def get_links_path(path: str) -> str:
+        """Path of the positions of the previous events of the same car, as int64"""
+        return f"{path}.links"
+
+    @property
+    def car_events(self) -> np.ndarray:
+        """Read-only mapping of the recorded car events"""
+        if self._car_event_count == 0:
+            return np.empty(0, CAR_EVENT_DTYPE)
+
+        if not self._file.closed:
+            self._file.flush()
+
+        return np.memmap(
+            self.path,
+            CAR_EVENT_DTYPE,
+            mode="r",
+            offset=self._events_offset,
+            shape=(self._car_event_count,),
+        )
+
+    @property
+    def car_event_times(self) -> np.ndarray:
+        """Times of the car events, only with the precision of the packed records"""
+        return self.car_events["time"].astype(np.float64)
+
+    @property
+    def car_previous_events(self) -> np.ndarray:
+        """Read-only mapping of the links between the events of each car"""
+        if self._car_event_count == 0:
+            return np.empty(0, np.int64)
+
+        if not self._links_file.closed:
+            self._links_file.flush()
+
+        return np.memmap(
+            self._links_file.name,
+            np.int64,
+            mode="r",
+            shape=(self._car_event_count,),
+        )
+
+    @property
+    def events_offset(self) -> int:
+        """Position of the first car event in the file"""
+        return self._events_offset
+
+    def write_preamble(self, data: bytes):
+        """Writes the data before the events, e.g. the header and the roadnet of a response"""
+        if self._car_event_count > 0:
+            raise RuntimeError("The preamble must be written before the first event")
+
+        self._release_segment()
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(data)
+        self._file.flush()
+        self._events_offset = len(data)
+
+    def record_car(
+        self,
+        car_id: int,
+        way_id: int,
+        crossroad_id: int,
+        lane_id: int,
+        position: float,
+        speed: float,
+    ):
+        """Writes the car event to the next slot of the mapped segment"""
+        if not self.is_recording:
+            return
+
+        slot = self._car_event_count % self.segment_size
+        if slot == 0:
+            self._map_segment()
+
+        self._link_car_event(car_id)
+        self._segment[slot] = (
+            self.env.now,
+            car_id,
+            way_id,
+            crossroad_id,
+            lane_id,
+            position,
+            speed,
+        )
+        self._car_event_count += 1
+
+    def _link_car_event(self, car_id: int):
+        """Links the next car event to the previous one of the car, in the mapped segment"""
+        slot = self._car_event_count % self.segment_size
+        self._links_segment[slot] = self._car_last_events.get(car_id, -1)
+        self._car_last_events[car_id] = self._car_event_count
+
+    def extend(self, events: dict[str, np.ndarray]):
+        """Appends already recorded events given as returned by get_arrays, segment by segment"""
+        car_events = events["car_events"]
+        previous_events = self._get_previous_events(
+            car_events["car_id"].astype(np.int64), self._car_event_count
+        )
+
+        written = 0
+        while written < len(car_events):
+            slot = self._car_event_count % self.segment_size
+            if slot == 0:
+                self._map_segment()
+
+            count = min(self.segment_size - slot, len(car_events) - written)
+            self._segment[slot : slot + count] = car_events[written : written + count]
+            self._links_segment[slot : slot + count] = previous_events[
+                written : written + count
+            ]
+            self._car_event_count += count
+            written += count
+
+        self._extend_crossroad_events(events)
+
+    def clear(self):
+        """Drops the recorded events, the preamble is kept"""
+        self._release_segment()
+        self._file.truncate(self._events_offset)
+        self._links_file.truncate(0)
+        super().clear()
+
+    def close(self) -> tuple[int, int]:
+        """Appends the crossroad events, trims the last segment and returns the event counts"""
+        self._release_segment()
+
+        self._file.truncate(
+            self._events_offset + self._car_event_count * CAR_EVENT_DTYPE.itemsize
+        )
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(self._pack_crossroad_events())
+        self._file.close()
+
+        self._links_file.truncate(self._car_event_count * np.dtype(np.int64).itemsize)
+        self._links_file.close()
+
+        return self._car_event_count, self._crossroad_event_count
+
+    def discard(self):
+        """Releases the mapped segments and removes the files of the calendar"""
+        self._release_segment()
+        self._file.close()
+        self._links_file.close()
+
+        for path in (self.path, self.get_links_path(self.path)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _map_segment(self):
+        """Extends the file by one segment and maps it in place of the previous one"""
+        self._release_segment()
+
+        offset = self._events_offset + self._car_event_count * CAR_EVENT_DTYPE.itemsize
+        size = self.segment_size * CAR_EVENT_DTYPE.itemsize
+        os.ftruncate(self._file.fileno(), offset + size)
+
+        self._segment = np.memmap(
+            self._file,
+            CAR_EVENT_DTYPE,
+            mode="r+",
+            offset=offset,
+            shape=(self.segment_size,),
+        )
+
+        links_offset = self._car_event_count * np.dtype(np.int64).itemsize
+        os.ftruncate(
+            self._links_file.fileno(),
+            links_offset + self.segment_size * np.dtype(np.int64).itemsize,
+        )
+        self._links_segment = np.memmap(
+            self._links_file,
+            np.int64,
+            mode="r+",
+            offset=links_offset,
+            shape=(self.segment_size,),
+        )
+
+    def _release_segment(self):
+        if self._segment is not None:
+            self._segment.flush()
+            self._segment = None
+
+        if self._links_segment is not None:
+            self._links_segment.flush()
+            self._links_segment = None
@@ -1,11 +1,16 @@
 import simpy
-import itertools
+from .SimulationContext import SimulationContext
 
 
 class WithId(type):
-    def __init__(cls, name, bases, attrs):
-        super().__init__(name, bases, attrs)
-        cls._ids = itertools.count(1)
+    """Numbers the instances of every class, the ids are allocated by the active context"""
+
+    def next_id(cls) -> int:
+        return SimulationContext.current().next_id(cls)
+
+    def reset_ids(cls):
+        """Numbers the next instances from 1 again"""
+        SimulationContext.current().reset_ids(cls)
 
 
 class EntityBase:
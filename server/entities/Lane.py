@@ -3,6 +3,7 @@ from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
     from entities.Crossroad import Crossroad
+    from entities.MesoscopicLink import MesoscopicLink
 
 import struct
 from .Entity import SimulationEntity, EntityBase, WithId
@@ -23,7 +24,7 @@ class Lane(EntityBase, metaclass=WithId):
         next_lanes: list["Lane"] = None,
     ):
         super().__init__()
-        self.id = next(self._ids)
+        self.id = type(self).next_id()
         self.is_forward = is_forward
         self.turns = turns if turns is not None else []
         self.nodes: list[LatLng] = nodes
@@ -39,6 +40,9 @@ class Lane(EntityBase, metaclass=WithId):
         # First car in queue is the last one on the lane
         self.queue: list[Car] = []
 
+        # queue model used instead of the microscopic one (if any)
+        self.mesoscopic_link: MesoscopicLink = None
+
     def _get_length(self):
         length = 0
         for i in range(len(self.nodes) - 1):
@@ -0,0 +1,40 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from entities.Lane import Lane
+
+from utils.globals import MESOSCOPIC_LANE_CAPACITY
+
+
+class MesoscopicLink:
+    """Link level queue model of a lane, the cars leave it in order and at most at its capacity"""
+
+    def __init__(self, lane: Lane, capacity: int = MESOSCOPIC_LANE_CAPACITY):
+        self.lane = lane
+        self.capacity = capacity  # vehicles/h
+        self.free_flow_speed = lane.way.max_speed  # km/h
+
+    @property
+    def headway(self) -> float:
+        """Minimum time between two cars leaving the link (s)"""
+        return 3600 / self.capacity
+
+    def get_exit_time(
+        self,
+        now: float,
+        distance: float,
+        speed: float,
+        car_ahead_exit_time: float = None,
+    ) -> float:
+        """
+        Returns the time the car driving the distance (km) at its speed (km/h) leaves the link.
+        The cars leave in order of the queue, separated by the headway.
+        """
+        speed = min(speed, self.free_flow_speed)
+        exit_time = now + (distance / speed) * 3600 if speed > 0 else now
+
+        if car_ahead_exit_time is not None:
+            exit_time = max(exit_time, car_ahead_exit_time + self.headway)
+
+        return exit_time
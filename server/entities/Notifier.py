@@ -0,0 +1,52 @@
+import simpy
+
+
+class NotificationStats:
+    def __init__(self):
+        # notifications that woke at least one waiting process
+        self.delivered = 0
+        # notifications dropped because nobody was subscribed
+        self.skipped = 0
+        # events allocated for subscribers
+        self.allocated = 0
+
+    def __repr__(self) -> str:
+        return f"NotificationStats(delivered={self.delivered}, skipped={self.skipped}, allocated={self.allocated})"
+
+
+class Notifier:
+    """Lazily allocated update event of an entity, shared by its subscribers"""
+
+    def __init__(self, env: simpy.Environment, stats: NotificationStats = None):
+        self.env = env
+        self.stats = stats
+        self._event: simpy.Event = None
+
+    def subscribe(self) -> simpy.Event:
+        """Returns the event triggered on the next notification"""
+        if self._event is None:
+            self._event = self.env.event()
+            if self.stats:
+                self.stats.allocated += 1
+
+        return self._event
+
+    @property
+    def has_waiters(self) -> bool:
+        """Returns True if a process is still waiting for the event"""
+        return self._event is not None and len(self._event.callbacks) > 0
+
+    def notify(self):
+        """Triggers the event if there is a live waiter, otherwise does nothing"""
+        if not self.has_waiters:
+            # an event without callbacks is kept for the next subscriber
+            if self.stats:
+                self.stats.skipped += 1
+            return
+
+        event = self._event
+        self._event = None
+        event.succeed()
+
+        if self.stats:
+            self.stats.delivered += 1
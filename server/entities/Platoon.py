@@ -0,0 +1,93 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from entities.Car import Car
+
+
+class Platoon:
+    """
+    Queued cars following the leader at the same speed.
+    Only the leader runs the queue logic, the members are advanced and recorded together with it.
+    """
+
+    def __init__(self, leader: Car, members: list[Car] = None):
+        self.leader = leader
+        self.members: list[Car] = []
+
+        leader.platoon = self
+        for member in members or []:
+            self._add_member(member)
+
+    def __len__(self):
+        return len(self.members) + 1
+
+    @property
+    def tail(self) -> Car:
+        """Returns the last car of the platoon"""
+        return self.members[-1] if len(self.members) > 0 else self.leader
+
+    def join(self, car: Car):
+        """Appends the car (and its own platoon if it leads one) to the end of the platoon"""
+        followers = car.platoon.members if car.platoon is not None else []
+
+        self._add_member(car)
+        for follower in followers:
+            self._add_member(follower)
+
+    def follow_leader(self):
+        """Applies the speed of the leader to the members and records them"""
+        speed = self.leader.speed
+
+        for member in list(self.members):
+            if member.speed == speed:
+                continue
+
+            if member.desired_speed < speed:
+                # the member can't keep up, the cars behind it stay with it
+                self.split_at(member)
+                break
+
+            member.follow_platoon_speed(speed)
+            member.calendar_car_update()
+
+    def split_at(self, member: Car):
+        """Detaches the member and the cars behind it, the member leads them from now on"""
+        member_index = self.members.index(member)
+        followers = self.members[member_index + 1 :]
+        self.members = self.members[:member_index]
+
+        member.platoon = None
+        if len(followers) > 0:
+            Platoon(member, followers)
+
+        if len(self.members) == 0:
+            self.leader.platoon = None
+
+        member.trigger_environment_update_event()
+
+    def release_leader(self):
+        """Removes the leader, the first member becomes the new leader"""
+        self.leader.platoon = None
+
+        if len(self.members) == 0:
+            return
+
+        self.leader = self.members.pop(0)
+        if len(self.members) == 0:
+            self.leader.platoon = None
+
+        self.leader.trigger_environment_update_event()
+
+    def leave(self, car: Car):
+        """Removes the car from the platoon"""
+        if car == self.leader:
+            self.release_leader()
+        elif car in self.members:
+            self.split_at(car)
+            if car.platoon is not None:
+                car.platoon.release_leader()
+
+    def _add_member(self, car: Car):
+        self.members.append(car)
+        car.platoon = self
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import contextvars
+import random
+import simpy
+
+from .Calendar import Calendar
+
+_active_context = contextvars.ContextVar("simulation_context", default=None)
+# context of the code running no simulation of its own, e.g. the scripts
+_default_context: SimulationContext = None
+
+
+class SimulationContext:
+    """
+    State of one simulation: its environment, calendar, random generator and id allocators.
+    The entities take the context active when they are created, so the simulations
+    running in parallel threads don't share their ids nor their random sequences.
+
+        with SimulationContext(seed, env, calendar) as context:
+            parser = Parser(context.env, context.calendar)
+    """
+
+    def __init__(
+        self,
+        seed: int | str = 0,
+        env: simpy.Environment = None,
+        calendar: Calendar = None,
+    ):
+        self.seed = seed
+        self.env = env if env is not None else simpy.Environment()
+        self.calendar = calendar if calendar is not None else Calendar(self.env)
+        self.random = random.Random(seed)
+
+        # next id and the step between the ids of every entity class
+        self._ids: dict[type, tuple[int, int]] = {}
+        self._tokens: list[contextvars.Token] = []
+
+    def __enter__(self) -> SimulationContext:
+        self._tokens.append(_active_context.set(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        _active_context.reset(self._tokens.pop())
+
+    @staticmethod
+    def current() -> SimulationContext:
+        """Returns the active context, or the default one if none is active"""
+        global _default_context
+
+        context = _active_context.get()
+        if context is not None:
+            return context
+
+        if _default_context is None:
+            _default_context = SimulationContext()
+        return _default_context
+
+    def reseed(self, seed: int | str):
+        """Restarts the random sequence, the generator is shared by the created entities"""
+        self.seed = seed
+        self.random.seed(seed)
+
+    def next_id(self, cls: type) -> int:
+        next_id, step = self._ids.get(cls, (1, 1))
+        self._ids[cls] = (next_id + step, step)
+        return next_id
+
+    def peek_id(self, cls: type) -> int:
+        """Returns the next id of the class without taking it"""
+        return self._ids.get(cls, (1, 1))[0]
+
+    def set_next_id(self, cls: type, next_id: int, step: int = 1):
+        self._ids[cls] = (next_id, step)
+
+    def reset_ids(self, *classes: type):
+        """Numbers the next instances of the classes from 1 again"""
+        for cls in classes:
+            self._ids.pop(cls, None)
@@ -55,7 +55,7 @@ class Way(EntityBase, metaclass=WithId):
         osm_id: int = None,
     ):
         super().__init__()
-        self.id = next(self._ids)
+        self.id = type(self).next_id()
         self.osm_id = osm_id
         self.highway_class = highway_class
         self.max_speed = max_speed
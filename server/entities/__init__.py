@@ -1,8 +1,13 @@
 from .Car import *
 from .Calendar import *
 from .Crossroad import *
+from .DiskCalendar import *
 from .Entity import *
 from .CarEvent import *
 from .CrossroadEvent import *
+from .MesoscopicLink import *
 from .Node import *
+from .Notifier import *
+from .Platoon import *
+from .SimulationContext import *
 from .Way import *
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import pickle
+from entities import Car, Platoon, Lane
+from utils import HighwayClass
+from .Parser import Parser
+from .VehicleSpawner import VehicleSpawner
+
+
+class Checkpoint:
+    """
+    Saved state of the event driven simulation, a later run on the same roadnet continues from it.
+    The car processes restart in the state they were saved in, pending timers are kept as end times.
+    """
+
+    def __init__(
+        self,
+        time: float,
+        map_version: str,
+        mesoscopic_classes: list[HighwayClass],
+        lane_count: int,
+        cars: list[dict],
+        lane_queues: dict[int, list[int]],
+        blockers: dict[int, list[int]],
+        platoons: dict[int, list[int]],
+        crossroads: list[dict],
+        next_car_id: int,
+        random_state: tuple,
+    ):
+        self.time = time
+        self.map_version = map_version
+        self.mesoscopic_classes = mesoscopic_classes
+        self.lane_count = lane_count
+        self.cars = cars
+        self.lane_queues = lane_queues
+        self.blockers = blockers
+        self.platoons = platoons
+        self.crossroads = crossroads
+        self.next_car_id = next_car_id
+        self.random_state = random_state
+
+    @classmethod
+    def capture(
+        cls,
+        parser: Parser,
+        spawner: VehicleSpawner,
+        map_version: str,
+        mesoscopic_classes: list[HighwayClass],
+    ) -> Checkpoint:
+        """Saves the current state of the simulation run on the map of given version"""
+        lanes = _get_lanes(parser)
+        lane_indices = {lane: index for index, lane in enumerate(lanes)}
+        way_indices = {way: index for index, way in enumerate(parser.ways)}
+
+        request_owners = {
+            request: car
+            for car in spawner.vehicles
+            for request in car._lane_block_requests
+            if request is not None
+        }
+
+        blockers = {}
+        for crossroad in parser.crossroads:
+            for lane in crossroad.lanes:
+                requests = lane.blocker.users + lane.blocker.queue
+                owners = [request_owners[r].id for r in requests if r in request_owners]
+                if len(owners) > 0:
+                    blockers[lane_indices[lane]] = owners
+
+        return cls(
+            parser.env.now,
+            map_version,
+            list(mesoscopic_classes),
+            len(lanes),
+            [car.get_state(lane_indices, way_indices) for car in spawner.vehicles],
+            {
+                lane_indices[lane]: [car.id for car in lane.queue]
+                for lane in lanes
+                if len(lane.queue) > 0
+            },
+            blockers,
+            {
+                car.id: [member.id for member in car.platoon.members]
+                for car in spawner.vehicles
+                if car.platoon is not None and car.platoon.leader == car
+            },
+            [crossroad.get_state() for crossroad in parser.crossroads],
+            parser.context.peek_id(Car),
+            parser.context.random.getstate(),
+        )
+
+    def validate(self, map_version: str, mesoscopic_classes: list[HighwayClass]):
+        """Checks the resumed simulation is set up as the saved one"""
+        if map_version != self.map_version:
+            raise ValueError("The checkpoint was saved on a different map version")
+
+        if set(mesoscopic_classes) != set(self.mesoscopic_classes):
+            raise ValueError("The checkpoint was saved with other mesoscopic classes")
+
+    def restore(self, parser: Parser, spawner: VehicleSpawner):
+        """Recreates the saved cars in the spawner, the environment must start at the checkpoint time"""
+        lanes = _get_lanes(parser)
+
+        if len(lanes) != self.lane_count or len(parser.crossroads) != len(
+            self.crossroads
+        ):
+            raise ValueError("The checkpoint was saved on a different roadnet")
+
+        if parser.env.now != self.time:
+            raise ValueError(f"The environment must start at {self.time} s")
+
+        for crossroad, state in zip(parser.crossroads, self.crossroads):
+            crossroad.set_state(state)
+
+        cars: dict[int, Car] = {}
+        for state in self.cars:
+            car = Car.from_state(
+                spawner.env, spawner, spawner.calendar, state, lanes, parser.ways
+            )
+            cars[car.id] = car
+            spawner.vehicles.append(car)
+
+        for lane_index, car_ids in self.lane_queues.items():
+            lanes[lane_index].queue = [cars[car_id] for car_id in car_ids]
+
+        # the requests are made in the original order, so the same cars get the lanes
+        requests = {}
+        for lane_index, car_ids in self.blockers.items():
+            for car_id in car_ids:
+                requests[(car_id, lane_index)] = lanes[lane_index].blocker.request()
+
+        for state in self.cars:
+            car = cars[state["id"]]
+            for lane_index, has_request in state["blocked_lanes"]:
+                car._blocked_crossroad_lanes.append(lanes[lane_index])
+                car._lane_block_requests.append(
+                    requests.get((car.id, lane_index)) if has_request else None
+                )
+
+        for leader_id, member_ids in self.platoons.items():
+            Platoon(cars[leader_id], [cars[member_id] for member_id in member_ids])
+
+        parser.context.set_next_id(Car, self.next_car_id)
+        parser.context.random.setstate(self.random_state)
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path: str) -> Checkpoint:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def _get_lanes(parser: Parser) -> list[Lane]:
+    """Returns the lanes of the roadnet in a stable order"""
+    return [lane for way in parser.ways for lane in way.lanes] + [
+        lane for crossroad in parser.crossroads for lane in crossroad.lanes
+    ]
@@ -0,0 +1,196 @@
+import numpy as np
+from entities import Calendar, Crossroad
+from utils.varint import encode_varints, decode_varints, zigzag_encode
+from utils.globals import (
+    EVENT_TIME_RESOLUTION,
+    EVENT_POSITION_RESOLUTION,
+    EVENT_SPEED_RESOLUTION,
+)
+
+
+class EventFormatV2:
+    """
+    Compact event format, all numbers are varints.
+
+        car count
+        per car (ordered by id): id delta, event count
+            per event: time delta (ms), lane id + 1 or 0 for the same lane,
+                       zigzag position delta (0.01 %), zigzag speed delta (0.1 km/h)
+        crossroad count
+        per crossroad (ordered by id): id delta, lane count, phase count,
+            per phase: green lane bitset as ceil(lane count / 32) words, low lanes first
+            event count
+            per event: time delta (ms), phase index
+
+    The deltas are taken from the previous event of the same car or crossroad,
+    the first event of each holds absolute values.
+    The way and crossroad of a car are implied by its lane.
+    The phases are the distinct sets of green lanes of a crossroad, bit i of a phase
+    is set if the i-th lane of the crossroad in the roadnet is green.
+    """
+
+    @classmethod
+    def pack(cls, calendar: Calendar, crossroads: list[Crossroad]) -> bytes:
+        return cls._pack_car_events(calendar) + cls._pack_crossroad_events(
+            calendar, crossroads
+        )
+
+    @staticmethod
+    def _pack_car_events(calendar: Calendar) -> bytes:
+        events = calendar.car_events
+        event_count = len(events)
+
+        # stable sort keeps the events of each car in time order
+        order = np.argsort(events["car_id"], kind="stable")
+        events = events[order]
+        car_ids = events["car_id"].astype(np.int64)
+
+        is_first = np.ones(event_count, bool)
+        is_first[1:] = car_ids[1:] != car_ids[:-1]
+
+        def deltas(values: np.ndarray) -> np.ndarray:
+            result = values.copy()
+            result[1:] -= values[:-1]
+            result[is_first] = values[is_first]
+            return result
+
+        times = np.rint(calendar.car_event_times[order] / EVENT_TIME_RESOLUTION)
+        positions = np.rint(events["position"] / EVENT_POSITION_RESOLUTION)
+        speeds = np.rint(events["speed"] / EVENT_SPEED_RESOLUTION)
+        lanes = events["lane_id"].astype(np.int64)
+
+        same_lane = np.zeros(event_count, bool)
+        same_lane[1:] = lanes[1:] == lanes[:-1]
+        same_lane &= ~is_first
+
+        columns = np.empty((event_count, 4), np.uint64)
+        columns[:, 0] = deltas(times.astype(np.int64))
+        columns[:, 1] = np.where(same_lane, 0, lanes + 1)
+        columns[:, 2] = zigzag_encode(deltas(positions.astype(np.int64)))
+        columns[:, 3] = zigzag_encode(deltas(speeds.astype(np.int64)))
+
+        first_events = np.flatnonzero(is_first)
+        car_count = len(first_events)
+        unique_car_ids = car_ids[first_events]
+        car_event_counts = np.diff(np.append(first_events, event_count))
+
+        values = np.empty(1 + 2 * car_count + 4 * event_count, np.uint64)
+        values[0] = car_count
+
+        header_positions = 1 + 2 * np.arange(car_count) + 4 * first_events
+        values[header_positions] = np.diff(unique_car_ids, prepend=0)
+        values[header_positions + 1] = car_event_counts
+
+        event_cars = np.cumsum(is_first) - 1
+        event_positions = 1 + 2 * (event_cars + 1) + 4 * np.arange(event_count)
+        for field in range(4):
+            values[event_positions + field] = columns[:, field]
+
+        return encode_varints(values)
+
+    @staticmethod
+    def _pack_crossroad_events(calendar: Calendar, crossroads: list[Crossroad]) -> bytes:
+        events = calendar.crossroad_events
+        times = np.rint(calendar.crossroad_event_times / EVENT_TIME_RESOLUTION)
+        times = times.astype(np.int64).tolist()
+        crossroads_by_id = {crossroad.id: crossroad for crossroad in crossroads}
+
+        by_crossroad: dict[int, list[int]] = {}
+        for index, crossroad_id in enumerate(events["crossroad_id"].tolist()):
+            by_crossroad.setdefault(crossroad_id, []).append(index)
+
+        values = [len(by_crossroad)]
+        previous_id = 0
+        for crossroad_id in sorted(by_crossroad):
+            indices = by_crossroad[crossroad_id]
+            lanes = crossroads_by_id[crossroad_id].lanes
+            lane_indices = {lane.id: i for i, lane in enumerate(lanes)}
+
+            # the phases are numbered in the order of their first event
+            phases: dict[int, int] = {}
+            event_phases = []
+            for index in indices:
+                bitset = 0
+                for lane_id in calendar.get_green_lanes(index).tolist():
+                    bitset |= 1 << lane_indices[lane_id]
+                event_phases.append(phases.setdefault(bitset, len(phases)))
+
+            word_count = (len(lanes) + 31) // 32
+            values += [crossroad_id - previous_id, len(lanes), len(phases)]
+            for bitset in phases:
+                values += [(bitset >> (32 * i)) & 0xFFFFFFFF for i in range(word_count)]
+            previous_id = crossroad_id
+
+            values.append(len(indices))
+            previous_time = 0
+            for index, phase in zip(indices, event_phases):
+                values += [times[index] - previous_time, phase]
+                previous_time = times[index]
+
+        return encode_varints(np.array(values, np.uint64))
+
+    @staticmethod
+    def unpack(data: bytes, offset: int = 0) -> dict:
+        """
+        Decodes the events back to absolute values, the reference for the clients.
+        The green lanes of the crossroad events are the indices of the lanes of the crossroad.
+        """
+        car_events = []
+        crossroad_events = []
+
+        (car_count,), offset = decode_varints(data, offset, 1)
+        car_id = 0
+        for _ in range(car_count):
+            (car_id_delta, event_count), offset = decode_varints(data, offset, 2)
+            car_id += car_id_delta
+
+            time = position = speed = lane_id = 0
+            fields, offset = decode_varints(data, offset, 4 * event_count)
+            for i in range(event_count):
+                time_delta, lane, position_delta, speed_delta = fields[4 * i : 4 * i + 4]
+                time += time_delta
+                lane_id = lane_id if lane == 0 else lane - 1
+                position += (position_delta >> 1) ^ -(position_delta & 1)
+                speed += (speed_delta >> 1) ^ -(speed_delta & 1)
+
+                car_events.append(
+                    {
+                        "time": time * EVENT_TIME_RESOLUTION,
+                        "car_id": car_id,
+                        "lane_id": lane_id,
+                        "position": position * EVENT_POSITION_RESOLUTION,
+                        "speed": speed * EVENT_SPEED_RESOLUTION,
+                    }
+                )
+
+        (crossroad_count,), offset = decode_varints(data, offset, 1)
+        crossroad_id = 0
+        for _ in range(crossroad_count):
+            header, offset = decode_varints(data, offset, 3)
+            crossroad_id_delta, lane_count, phase_count = header
+            crossroad_id += crossroad_id_delta
+
+            word_count = (lane_count + 31) // 32
+            phases = []
+            for _ in range(phase_count):
+                words, offset = decode_varints(data, offset, word_count)
+                bitset = sum(word << (32 * i) for i, word in enumerate(words))
+                phases.append([i for i in range(lane_count) if bitset >> i & 1])
+
+            (event_count,), offset = decode_varints(data, offset, 1)
+            fields, offset = decode_varints(data, offset, 2 * event_count)
+
+            time = 0
+            for i in range(event_count):
+                time_delta, phase = fields[2 * i : 2 * i + 2]
+                time += time_delta
+
+                crossroad_events.append(
+                    {
+                        "time": time * EVENT_TIME_RESOLUTION,
+                        "crossroad_id": crossroad_id,
+                        "green_lanes": phases[phase],
+                    }
+                )
+
+        return {"car_events": car_events, "crossroad_events": crossroad_events}
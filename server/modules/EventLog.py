@@ -0,0 +1,391 @@
+from __future__ import annotations
+
+import os
+import struct
+import time
+import numpy as np
+from entities import Calendar, DiskCalendar, CAR_EVENT_DTYPE
+from utils.math import haversine
+from utils.globals import EVENT_INDEX_BUCKET, EVENT_LOG_RETENTION, EVENT_LOG_DISK
+from .Parser import Parser
+
+# window response header: t0, t1, car and crossroad event counts of the keyframe and of the window
+WINDOW_HEADER = struct.Struct("!ffIIII")
+
+
+class EventLog:
+    """
+    Event log spilled by the disk calendar together with its time index.
+    The index holds the position of the first car event of every time bucket
+    and the time, crossroad and byte offset of every crossroad event,
+    so a time window is found without reading the log.
+    It holds a keyframe at the start of every bucket as well, the positions
+    of the latest event of every car and crossroad, so a seek reads only
+    the events since the start of its bucket.
+    The links between the events of each car are kept in a separate mapped file,
+    a trajectory is read in the time proportional to the event count of its car.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        with np.load(self.get_index_path(path)) as index:
+            self.bucket = float(index["bucket"])
+            self.events_offset = int(index["events_offset"])
+            self.car_offsets = index["car_offsets"]
+            self.crossroad_offsets = index["crossroad_offsets"]
+            self.keyframe_car_offsets = index["keyframe_car_offsets"]
+            self.keyframe_cars = index["keyframe_cars"]
+            self.keyframe_crossroad_offsets = index["keyframe_crossroad_offsets"]
+            self.keyframe_crossroads = index["keyframe_crossroads"]
+            self.crossroad_times = index["crossroad_times"]
+            self.crossroad_ids = index["crossroad_ids"]
+            self.crossroad_byte_offsets = index["crossroad_byte_offsets"]
+            self.car_ids = index["car_ids"]
+            self.car_last_events = index["car_last_events"]
+            self.lane_ids = index["lane_ids"]
+            self.lane_vertex_offsets = index["lane_vertex_offsets"]
+            self.lane_vertices = index["lane_vertices"]
+            self.lane_distances = index["lane_distances"]
+
+        self.car_event_count = int(self.car_offsets[-1])
+        self.car_events = (
+            np.memmap(
+                path,
+                CAR_EVENT_DTYPE,
+                mode="r",
+                offset=self.events_offset,
+                shape=(self.car_event_count,),
+            )
+            if self.car_event_count > 0
+            else np.empty(0, CAR_EVENT_DTYPE)
+        )
+        self.car_previous_events = (
+            np.memmap(
+                DiskCalendar.get_links_path(path),
+                np.int64,
+                mode="r",
+                shape=(self.car_event_count,),
+            )
+            if self.car_event_count > 0
+            else np.empty(0, np.int64)
+        )
+
+        crossroads_offset = (
+            self.events_offset + self.car_event_count * CAR_EVENT_DTYPE.itemsize
+        )
+        self.crossroad_bytes = (
+            np.memmap(
+                path,
+                np.uint8,
+                mode="r",
+                offset=crossroads_offset,
+                shape=(int(self.crossroad_byte_offsets[-1]),),
+            )
+            if self.crossroad_byte_offsets[-1] > 0
+            else np.empty(0, np.uint8)
+        )
+
+    @staticmethod
+    def get_index_path(path: str) -> str:
+        return f"{path}.index.npz"
+
+    @classmethod
+    def get_paths(cls, path: str) -> list[str]:
+        """Paths of the events, the links and the index of the log"""
+        return [path, DiskCalendar.get_links_path(path), cls.get_index_path(path)]
+
+    @classmethod
+    def evict(
+        cls,
+        directory: str,
+        retention: float = EVENT_LOG_RETENTION,
+        disk_size: int = EVENT_LOG_DISK,
+    ):
+        """
+        Removes the logs older than the retention time, then the oldest indexed logs
+        until the rest fits the disk size. The logs without an index are still written.
+        """
+        logs = []
+        for name in os.listdir(directory):
+            if not name.endswith(".bin"):
+                continue
+
+            path = os.path.join(directory, name)
+            paths = [p for p in cls.get_paths(path) if os.path.exists(p)]
+            logs.append(
+                (
+                    os.path.getmtime(path),
+                    path,
+                    sum(os.path.getsize(p) for p in paths),
+                    os.path.exists(cls.get_index_path(path)),
+                )
+            )
+
+        now = time.time()
+        size = sum(log_size for _, _, log_size, _ in logs)
+        for modified, path, log_size, is_indexed in sorted(logs):
+            if now - modified <= retention and (size <= disk_size or not is_indexed):
+                continue
+
+            for p in cls.get_paths(path):
+                if os.path.exists(p):
+                    os.remove(p)
+            size -= log_size
+
+    @classmethod
+    def write_index(
+        cls, calendar: DiskCalendar, parser: Parser, bucket: float = EVENT_INDEX_BUCKET
+    ):
+        """
+        Indexes the closed calendar, its events are in the time order.
+        The events are read by segments, so the memory stays flat on long runs.
+        """
+        car_events = calendar.car_events
+        car_event_count = len(car_events)
+        end = float(car_events["time"][-1]) if car_event_count > 0 else 0
+        bucket_starts = np.arange(0, end + bucket, bucket)
+
+        # the events before every bucket start are counted segment by segment
+        car_offsets = np.zeros(len(bucket_starts), np.int64)
+        for start in range(0, car_event_count, calendar.segment_size):
+            times = car_events["time"][start : start + calendar.segment_size]
+            car_offsets += np.searchsorted(times, bucket_starts, side="left")
+        car_offsets = np.append(car_offsets, car_event_count)
+
+        crossroad_events = calendar.crossroad_events
+        crossroad_offsets = np.searchsorted(
+            calendar.crossroad_event_times, bucket_starts, side="left"
+        )
+
+        keyframe_cars = cls._get_keyframes(
+            car_events["car_id"],
+            car_offsets[:-1],
+            max(calendar.car_last_events, default=0),
+            calendar.segment_size,
+        )
+        keyframe_crossroads = cls._get_keyframes(
+            crossroad_events["crossroad_id"],
+            crossroad_offsets,
+            int(crossroad_events["crossroad_id"].max(initial=0)),
+            calendar.segment_size,
+        )
+        # every crossroad event is packed as 3 words followed by its green lanes
+        crossroad_byte_offsets = 4 * np.concatenate(
+            ([0], np.cumsum(3 + crossroad_events["lane_count"].astype(np.int64)))
+        )
+
+        # lane polylines with the distance of every vertex from the lane start (km)
+        lanes = [lane for way in parser.ways for lane in way.lanes] + [
+            lane for crossroad in parser.crossroads for lane in crossroad.lanes
+        ]
+        lanes.sort(key=lambda lane: lane.id)
+
+        lane_vertices = []
+        lane_distances = []
+        for lane in lanes:
+            distance = 0
+            for i, node in enumerate(lane.nodes):
+                if i > 0:
+                    distance += haversine(lane.nodes[i - 1], node)
+                lane_vertices.append((node.lat, node.lng))
+                lane_distances.append(distance)
+
+        car_ids = np.array(sorted(calendar.car_last_events), np.int64)
+
+        np.savez(
+            cls.get_index_path(calendar.path),
+            bucket=bucket,
+            events_offset=calendar.events_offset,
+            car_offsets=car_offsets,
+            crossroad_offsets=crossroad_offsets,
+            keyframe_car_offsets=np.cumsum([0] + [len(k) for k in keyframe_cars]),
+            keyframe_cars=np.concatenate(keyframe_cars),
+            keyframe_crossroad_offsets=np.cumsum(
+                [0] + [len(k) for k in keyframe_crossroads]
+            ),
+            keyframe_crossroads=np.concatenate(keyframe_crossroads),
+            crossroad_times=calendar.crossroad_event_times,
+            crossroad_ids=crossroad_events["crossroad_id"].astype(np.int64),
+            crossroad_byte_offsets=crossroad_byte_offsets,
+            car_ids=car_ids,
+            car_last_events=np.array(
+                [calendar.car_last_events[car_id] for car_id in car_ids.tolist()],
+                np.int64,
+            ),
+            lane_ids=np.array([lane.id for lane in lanes], np.int64),
+            lane_vertex_offsets=np.cumsum([0] + [len(lane.nodes) for lane in lanes]),
+            lane_vertices=np.array(lane_vertices, np.float64).reshape(-1, 2),
+            lane_distances=np.array(lane_distances, np.float64),
+        )
+
+    def get_roadnet(self) -> bytes:
+        """Returns the header and the roadnet written before the events"""
+        with open(self.path, "rb") as f:
+            return f.read(self.events_offset)
+
+    def get_window(self, t0: float, t1: float) -> bytes:
+        """
+        Packs the events of the [t0, t1) window, preceded by a keyframe
+        with the latest event of every car and crossroad before t0.
+        """
+        car_start = self._find_car_event(t0)
+        car_end = self._find_car_event(t1)
+
+        crossroad_start = int(np.searchsorted(self.crossroad_times, t0, side="left"))
+        crossroad_end = int(np.searchsorted(self.crossroad_times, t1, side="left"))
+
+        # the keyframe of the bucket is updated by the events from its start to t0
+        bucket = int(np.clip(t0 // self.bucket, 0, len(self.car_offsets) - 2))
+        keyframe_cars = self._update_keyframe(
+            self.car_events["car_id"],
+            self.keyframe_cars,
+            self.keyframe_car_offsets,
+            bucket,
+            int(self.car_offsets[bucket]),
+            car_start,
+        )
+        keyframe_crossroads = self._update_keyframe(
+            self.crossroad_ids,
+            self.keyframe_crossroads,
+            self.keyframe_crossroad_offsets,
+            bucket,
+            int(self.crossroad_offsets[bucket]),
+            crossroad_start,
+        )
+
+        header = WINDOW_HEADER.pack(
+            t0,
+            t1,
+            len(keyframe_cars),
+            len(keyframe_crossroads),
+            car_end - car_start,
+            crossroad_end - crossroad_start,
+        )
+
+        return b"".join(
+            [
+                header,
+                self.car_events[keyframe_cars].tobytes(),
+                b"".join(
+                    self._get_crossroad_bytes(index, index + 1)
+                    for index in keyframe_crossroads
+                ),
+                self.car_events[car_start:car_end].tobytes(),
+                self._get_crossroad_bytes(crossroad_start, crossroad_end),
+            ]
+        )
+
+    def get_trajectory(self, car_id: int) -> np.ndarray:
+        """Returns the events of the car in the time order"""
+        position = int(np.searchsorted(self.car_ids, car_id))
+        if position == len(self.car_ids) or self.car_ids[position] != car_id:
+            return np.empty(0, CAR_EVENT_DTYPE)
+
+        indices = Calendar.follow_car_events(
+            self.car_previous_events, int(self.car_last_events[position])
+        )
+        return self.car_events[indices]
+
+    def get_polyline(self, car_id: int, step: float) -> np.ndarray:
+        """Returns the time, lat and lng of the car resampled to the time step"""
+        events = self.get_trajectory(car_id)
+        if len(events) == 0:
+            return np.empty((0, 3))
+
+        positions = np.array(
+            [
+                self._get_lane_point(lane_id, position)
+                for lane_id, position in zip(
+                    events["lane_id"].tolist(), events["position"].tolist()
+                )
+            ]
+        )
+
+        times = events["time"].astype(np.float64)
+        sample_times = np.append(np.arange(times[0], times[-1], step), times[-1])
+
+        return np.column_stack(
+            (
+                sample_times,
+                np.interp(sample_times, times, positions[:, 0]),
+                np.interp(sample_times, times, positions[:, 1]),
+            )
+        )
+
+    def _get_lane_point(self, lane_id: int, percentage: float) -> tuple[float, float]:
+        """Returns the lat and lng at the percentage of the lane length"""
+        lane = int(np.searchsorted(self.lane_ids, lane_id))
+        start = self.lane_vertex_offsets[lane]
+        end = self.lane_vertex_offsets[lane + 1]
+
+        distances = self.lane_distances[start:end]
+        vertices = self.lane_vertices[start:end]
+        distance = percentage / 100 * distances[-1]
+
+        return (
+            float(np.interp(distance, distances, vertices[:, 0])),
+            float(np.interp(distance, distances, vertices[:, 1])),
+        )
+
+    def _find_car_event(self, time: float) -> int:
+        """Position of the first car event at the time or later, searches only its bucket"""
+        bucket = int(np.clip(time // self.bucket, 0, len(self.car_offsets) - 2))
+        start = int(self.car_offsets[bucket])
+        end = int(self.car_offsets[bucket + 1])
+
+        if time >= (bucket + 1) * self.bucket:
+            return end
+
+        times = self.car_events["time"][start:end]
+        return start + int(np.searchsorted(times, time, side="left"))
+
+    def _get_crossroad_bytes(self, start: int, end: int) -> bytes:
+        return self.crossroad_bytes[
+            self.crossroad_byte_offsets[start] : self.crossroad_byte_offsets[end]
+        ].tobytes()
+
+    @classmethod
+    def _get_keyframes(
+        cls, ids: np.ndarray, offsets: np.ndarray, max_id: int, segment_size: int
+    ) -> list[np.ndarray]:
+        """
+        Positions of the latest event of every id before each offset,
+        the events are read by segments
+        """
+        latest = np.full(max_id + 1, -1, np.int64)
+        keyframes = []
+
+        position = 0
+        for offset in offsets.tolist():
+            while position < offset:
+                end = min(offset, position + segment_size)
+                chunk = ids[position:end].astype(np.int64)
+                chunk_latest = cls._get_latest(chunk)
+                latest[chunk[chunk_latest]] = position + chunk_latest
+                position = end
+
+            keyframes.append(np.sort(latest[latest >= 0]))
+
+        return keyframes
+
+    @classmethod
+    def _update_keyframe(
+        cls,
+        ids: np.ndarray,
+        keyframes: np.ndarray,
+        keyframe_offsets: np.ndarray,
+        bucket: int,
+        start: int,
+        end: int,
+    ) -> np.ndarray:
+        """Positions of the latest event of every id in the bucket keyframe and the events after it"""
+        keyframe = keyframes[keyframe_offsets[bucket] : keyframe_offsets[bucket + 1]]
+        positions = np.concatenate((keyframe, np.arange(start, end, dtype=np.int64)))
+        return positions[cls._get_latest(ids[positions])]
+
+    @staticmethod
+    def _get_latest(ids: np.ndarray) -> np.ndarray:
+        """Positions of the last occurrence of every id, in the order of the positions"""
+        _, reversed_positions = np.unique(ids[::-1], return_index=True)
+        return np.sort(len(ids) - 1 - reversed_positions)
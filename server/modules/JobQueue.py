@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from typing import Callable
+from utils.globals import JOB_WORKERS, JOB_QUEUE_SIZE, JOB_RETENTION
+
+
+class Job:
+    """Simulation run in the background, its result is written to a file"""
+
+    def __init__(self, job_id: str, args, result_path: str):
+        self.id = job_id
+        self.args = args
+        self.result_path = result_path
+        # queued, running, done, failed or cancelled
+        self.status = "queued"
+        # simulated time reached, its start and end and the recorded car events
+        self.progress: dict = {}
+        self.headers: dict[str, str] = {}
+        self.error: str = None
+
+        self.submitted = time.monotonic()
+        self.started: float = None
+        self.finished: float = None
+
+        self._process: multiprocessing.Process = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    @property
+    def eta(self) -> float | None:
+        """Estimated remaining wall time (s), extrapolated from the simulated time reached"""
+        if self.status != "running" or "time" not in self.progress:
+            return None
+
+        span = self.progress["until"] - self.progress["start"]
+        done = (self.progress["time"] - self.progress["start"]) / span if span > 0 else 1
+        if done <= 0:
+            return None
+
+        elapsed = time.monotonic() - self.started
+        return elapsed / done * (1 - done)
+
+    def get_state(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "time": self.progress.get("time"),
+            "time_span": self.progress.get("until"),
+            "events": self.progress.get("events"),
+            "eta": self.eta,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Runs the jobs on a bounded pool of worker processes, the others wait in the queue.
+    Every job runs in a process forked for it, so it starts from a clean state
+    and can be cancelled by terminating the process.
+
+    The target is called in the worker as target(args, result_path, report),
+    it writes the result to the path, calls report(**progress) while it runs
+    and returns the headers of the result.
+    """
+
+    def __init__(
+        self,
+        target: Callable,
+        output_dir: str,
+        workers: int = JOB_WORKERS,
+        max_queued: int = JOB_QUEUE_SIZE,
+        retention: float = JOB_RETENTION,
+    ):
+        self.target = target
+        self.output_dir = output_dir
+        self.workers = workers
+        self.max_queued = max_queued
+        # how long the finished jobs and their results are kept (s)
+        self.retention = retention
+
+        self._jobs: dict[str, Job] = {}
+        self._queue: list[Job] = []
+        self._running = 0
+        self._lock = threading.RLock()
+        self._context = multiprocessing.get_context("fork")
+
+    def submit(self, args) -> Job | None:
+        """Queues the job, returns None if the queue is full"""
+        with self._lock:
+            self._evict_finished()
+            if len(self._queue) >= self.max_queued:
+                return None
+
+            os.makedirs(self.output_dir, exist_ok=True)
+            job_id = uuid.uuid4().hex
+            job = Job(job_id, args, os.path.join(self.output_dir, f"{job_id}.bin"))
+
+            self._jobs[job_id] = job
+            self._queue.append(job)
+            self._dispatch()
+
+            return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels the queued or running job, returns False if it already finished"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.is_finished:
+                return False
+
+            if job.status == "queued":
+                self._queue.remove(job)
+            else:
+                job._process.terminate()
+
+            # the monitor of a running job sets it again once its process ends
+            job.finished = time.monotonic()
+
+            job.status = "cancelled"
+            return True
+
+    def _dispatch(self):
+        """Starts the queued jobs while there are free workers"""
+        with self._lock:
+            while self._running < self.workers and len(self._queue) > 0:
+                job = self._queue.pop(0)
+                receiver, sender = self._context.Pipe(duplex=False)
+
+                job._process = self._context.Process(
+                    target=_run_job,
+                    args=(self.target, job.args, job.result_path, sender),
+                    daemon=True,
+                )
+                job.status = "running"
+                job.started = time.monotonic()
+                job._process.start()
+                sender.close()
+
+                self._running += 1
+                threading.Thread(
+                    target=self._monitor, args=(job, receiver), daemon=True
+                ).start()
+
+    def _monitor(self, job: Job, receiver):
+        """Collects the progress of the running job until its process ends"""
+        while True:
+            try:
+                kind, value = receiver.recv()
+            except (EOFError, OSError):
+                break
+
+            if kind == "progress":
+                job.progress = value
+            elif kind == "done":
+                job.headers = value
+            elif kind == "failed":
+                job.error = value
+
+        job._process.join()
+
+        with self._lock:
+            if job.status != "cancelled":
+                if job._process.exitcode == 0 and job.error is None:
+                    job.status = "done"
+                else:
+                    job.status = "failed"
+                    job.error = (
+                        job.error or f"The worker exited with {job._process.exitcode}"
+                    )
+
+            if job.status != "done" and os.path.exists(job.result_path):
+                os.remove(job.result_path)
+
+            job.finished = time.monotonic()
+            self._running -= 1
+            self._dispatch()
+
+    def _evict_finished(self):
+        now = time.monotonic()
+        for job in list(self._jobs.values()):
+            if job.is_finished and now - job.finished > self.retention:
+                del self._jobs[job.id]
+                if os.path.exists(job.result_path):
+                    os.remove(job.result_path)
+
+
+def _run_job(target: Callable, args, result_path: str, sender):
+    def report(**progress):
+        sender.send(("progress", progress))
+
+    try:
+        sender.send(("done", target(args, result_path, report)))
+    except Exception as e:
+        sender.send(("failed", f"{type(e).__name__}: {e}"))
+    finally:
+        sender.close()
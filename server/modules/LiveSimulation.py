@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import collections
+import math
+import struct
+import threading
+import time
+import uuid
+import numpy as np
+from typing import Callable, Iterator
+from entities import SimulationContext, CAR_EVENT_DTYPE, CROSSROAD_EVENT_DTYPE
+from utils.globals import (
+    LIVE_SLICE,
+    LIVE_WINDOW,
+    LIVE_MAX_SIMULATIONS,
+    LIVE_RETENTION,
+)
+
+# slice header: simulated time at the end of the slice, car and crossroad event counts
+SLICE_HEADER = struct.Struct("!fII")
+
+
+class LiveSlice:
+    """
+    Events recorded in one slice, packed as a frame of the streamed simulation.
+    A keyframe holds the latest event of every car and crossroad up to the slice instead.
+    """
+
+    def __init__(self, index: int, time: float, data: bytes, is_keyframe: bool = False):
+        self.index = index
+        self.time = time
+        self.data = data
+        self.is_keyframe = is_keyframe
+
+
+class LiveSimulation:
+    """
+    Simulation advancing in the background, paced by the wall clock.
+    Every slice advances the simulated time by the slice length and then waits
+    until the wall clock catches up, the speed is the simulated time per wall second.
+    A slower computation is not waited for, the simulation then runs behind.
+
+    The calendar is emptied after every slice, only the slices of the last window
+    of the simulated time are kept for the clients connecting or reconnecting late.
+    The slices leaving the window are merged into a keyframe, the state of the cars
+    and traffic lights at the start of the window, sent first to these clients.
+    """
+
+    def __init__(
+        self,
+        live_id: str,
+        context: SimulationContext,
+        advance: Callable[[float], None],
+        finish: Callable[[], None],
+        until: float,
+        slice_length: float = LIVE_SLICE,
+        speed: float = 1,
+        window: float = LIVE_WINDOW,
+    ):
+        self.id = live_id
+        self.context = context
+        self.until = until
+        self.slice_length = slice_length
+        self.speed = speed
+
+        self._advance = advance
+        self._finish = finish
+        self.slices: collections.deque[LiveSlice] = collections.deque(
+            maxlen=max(math.ceil(window / slice_length), 1)
+        )
+        self.subscribers = 0
+        self.error: str = None
+        self.finished: float = None
+
+        self.keyframe: LiveSlice = None
+        self._keyframe_cars = np.empty(0, CAR_EVENT_DTYPE)
+        # packed latest event of every crossroad, in the order of the events
+        self._keyframe_crossroads: dict[int, bytes] = {}
+
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def now(self) -> float:
+        return self.context.env.now
+
+    @property
+    def is_finished(self) -> bool:
+        return self.finished is not None
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def get_state(self) -> dict:
+        with self._condition:
+            return {
+                "id": self.id,
+                "time": self.now,
+                "until": self.until,
+                "speed": self.speed,
+                "slices": len(self.slices),
+                "subscribers": self.subscribers,
+                "finished": self.is_finished,
+                "error": self.error,
+            }
+
+    def iter_slices(
+        self, after: int = -1, timeout: float = None
+    ) -> Iterator[LiveSlice | None]:
+        """
+        Yields the kept slices following the given index and then every new one
+        until the simulation finishes. Yields None if no slice came in the timeout,
+        so the caller can keep its connection alive.
+        The slices after the index that already left the window are replaced by the keyframe.
+        """
+        with self._condition:
+            self.subscribers += 1
+
+        try:
+            while True:
+                with self._condition:
+                    slices = self._get_slices(after)
+                    if len(slices) == 0:
+                        if self.is_finished:
+                            return
+
+                        self._condition.wait(timeout)
+                        slices = self._get_slices(after)
+
+                if len(slices) == 0:
+                    yield None
+                    continue
+
+                for live_slice in slices:
+                    yield live_slice
+                after = slices[-1].index
+        finally:
+            with self._condition:
+                self.subscribers -= 1
+
+    def _run(self):
+        start = self.now
+        wall_start = time.monotonic()
+        index = 0
+
+        try:
+            now = start
+            while now < self.until and not self._stopped.is_set():
+                now = min(now + self.slice_length, self.until)
+                with self.context:
+                    self._advance(now)
+                    if now == self.until:
+                        self._finish()
+
+                calendar = self.context.calendar
+                event_bytes, event_counts = calendar.pack()
+                calendar.clear()
+
+                data = SLICE_HEADER.pack(now, *event_counts) + event_bytes
+                with self._condition:
+                    if len(self.slices) == self.slices.maxlen:
+                        self._update_keyframe(self.slices[0])
+                    self.slices.append(LiveSlice(index, now, data))
+                    self._condition.notify_all()
+                index += 1
+
+                deadline = wall_start + (now - start) / self.speed
+                self._stopped.wait(max(deadline - time.monotonic(), 0))
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            with self._condition:
+                self.finished = time.monotonic()
+                self._condition.notify_all()
+
+
+    def _get_slices(self, after: int) -> list[LiveSlice]:
+        slices = [s for s in self.slices if s.index > after]
+        if len(slices) > 0 and slices[0].index > after + 1 and self.keyframe is not None:
+            slices.insert(0, self.keyframe)
+
+        return slices
+
+    def _update_keyframe(self, live_slice: LiveSlice):
+        """Merges the events of the slice leaving the window into the keyframe"""
+        _, car_count, crossroad_count = SLICE_HEADER.unpack_from(live_slice.data)
+
+        car_events = np.concatenate(
+            (
+                self._keyframe_cars,
+                np.frombuffer(
+                    live_slice.data, CAR_EVENT_DTYPE, car_count, SLICE_HEADER.size
+                ),
+            ),
+            # keeps the byte order of the wire format
+            dtype=CAR_EVENT_DTYPE,
+        )
+        # the latest event of every car, in the time order
+        _, reversed_positions = np.unique(car_events["car_id"][::-1], return_index=True)
+        self._keyframe_cars = car_events[
+            np.sort(len(car_events) - 1 - reversed_positions)
+        ]
+
+        offset = SLICE_HEADER.size + car_count * CAR_EVENT_DTYPE.itemsize
+        for _ in range(crossroad_count):
+            event = np.frombuffer(live_slice.data, CROSSROAD_EVENT_DTYPE, 1, offset)[0]
+            end = offset + CROSSROAD_EVENT_DTYPE.itemsize + 4 * int(event["lane_count"])
+
+            crossroad_id = int(event["crossroad_id"])
+            self._keyframe_crossroads.pop(crossroad_id, None)
+            self._keyframe_crossroads[crossroad_id] = live_slice.data[offset:end]
+            offset = end
+
+        data = SLICE_HEADER.pack(
+            live_slice.time, len(self._keyframe_cars), len(self._keyframe_crossroads)
+        )
+        self.keyframe = LiveSlice(
+            live_slice.index,
+            live_slice.time,
+            data
+            + self._keyframe_cars.tobytes()
+            + b"".join(self._keyframe_crossroads.values()),
+            is_keyframe=True,
+        )
+
+
+class LiveSimulationStore:
+    """Running live simulations, the finished ones are kept for the retention time (s)"""
+
+    def __init__(
+        self,
+        max_simulations: int = LIVE_MAX_SIMULATIONS,
+        retention: float = LIVE_RETENTION,
+    ):
+        self.max_simulations = max_simulations
+        self.retention = retention
+        self._simulations: dict[str, LiveSimulation] = {}
+        self._lock = threading.Lock()
+
+    def is_full(self) -> bool:
+        with self._lock:
+            return self._is_full()
+
+    def create(self, *args, **kwargs) -> LiveSimulation | None:
+        """Starts the simulation with a new id, returns None if too many are running"""
+        with self._lock:
+            if self._is_full():
+                return None
+
+            simulation = LiveSimulation(uuid.uuid4().hex, *args, **kwargs)
+            self._simulations[simulation.id] = simulation
+
+        simulation.start()
+        return simulation
+
+    def get(self, live_id: str) -> LiveSimulation | None:
+        with self._lock:
+            return self._simulations.get(live_id)
+
+    def _is_full(self) -> bool:
+        self._evict_finished()
+        running = [s for s in self._simulations.values() if not s.is_finished]
+        return len(running) >= self.max_simulations
+
+    def _evict_finished(self):
+        now = time.monotonic()
+        for live_id, simulation in list(self._simulations.items()):
+            if simulation.is_finished and now - simulation.finished > self.retention:
+                del self._simulations[live_id]
@@ -0,0 +1,132 @@
+import collections
+import math
+from entities import Way, Crossroad, Lane
+
+
+class MapPartition:
+    """
+    Splits the crossroads of the roadnet into connected regions of similar size.
+    A way lane belongs to the region of the crossroad it leads to.
+    """
+
+    def __init__(self, ways: list[Way], crossroads: list[Crossroad], count: int):
+        self.ways = ways
+        self.crossroads = crossroads
+        self.count = count
+
+        self._neighbours = self._get_neighbours()
+        self.crossroad_regions: dict[int, int] = self._split_crossroads()
+
+    def lane_region(self, lane: Lane) -> int:
+        """Returns the region simulating the cars on the lane"""
+        if lane.way is None:
+            return self.crossroad_regions[lane.crossroad.id]
+
+        crossroad = self._next_crossroad(lane) or self._prev_crossroad(lane)
+        return self.crossroad_regions[crossroad.id] if crossroad else 0
+
+    def region_lanes(self, region: int) -> list[Lane]:
+        """Returns the way lanes owned by the region"""
+        return [
+            lane
+            for way in self.ways
+            for lane in way.lanes
+            if self.lane_region(lane) == region
+        ]
+
+    @property
+    def boundary_lanes(self) -> list[Lane]:
+        """Returns the way lanes entered from a crossroad of another region"""
+        boundary_lanes = []
+
+        for way in self.ways:
+            for lane in way.lanes:
+                crossroad = self._prev_crossroad(lane)
+                if crossroad is None:
+                    continue
+
+                if self.crossroad_regions[crossroad.id] != self.lane_region(lane):
+                    boundary_lanes.append(lane)
+
+        return boundary_lanes
+
+    @property
+    def lookahead(self) -> float:
+        """Returns the minimal free flow travel time of the boundary lanes (s)"""
+        travel_times = [
+            lane.length / lane.way.max_speed * 3600 for lane in self.boundary_lanes
+        ]
+
+        return min(travel_times) if len(travel_times) > 0 else math.inf
+
+    def _next_crossroad(self, lane: Lane) -> Crossroad:
+        return lane.way.next_crossroad if lane.is_forward else lane.way.prev_crossroad
+
+    def _prev_crossroad(self, lane: Lane) -> Crossroad:
+        return lane.way.prev_crossroad if lane.is_forward else lane.way.next_crossroad
+
+    def _get_neighbours(self) -> dict[Crossroad, list[Crossroad]]:
+        neighbours = {crossroad: [] for crossroad in self.crossroads}
+
+        for way in self.ways:
+            if way.prev_crossroad is None or way.next_crossroad is None:
+                continue
+
+            neighbours[way.prev_crossroad].append(way.next_crossroad)
+            neighbours[way.next_crossroad].append(way.prev_crossroad)
+
+        return neighbours
+
+    def _get_weight(self, crossroad: Crossroad) -> int:
+        """Number of lanes leading to the crossroad"""
+        weight = 1
+        for way in crossroad.ways:
+            for lane in way.lanes:
+                if self._next_crossroad(lane) == crossroad:
+                    weight += 1
+
+        return weight
+
+    def _breadth_first_order(self, start: Crossroad) -> list[Crossroad]:
+        order = [start]
+        visited = {start}
+        queue = collections.deque([start])
+
+        while len(queue) > 0:
+            crossroad = queue.popleft()
+            for neighbour in sorted(self._neighbours[crossroad], key=lambda c: c.id):
+                if neighbour not in visited:
+                    visited.add(neighbour)
+                    order.append(neighbour)
+                    queue.append(neighbour)
+
+        return order
+
+    def _split_crossroads(self) -> dict[int, int]:
+        """Cuts the breadth first order of the crossroads into bands of similar weight"""
+        order: list[Crossroad] = []
+        visited = set()
+
+        for crossroad in sorted(self.crossroads, key=lambda c: c.id):
+            if crossroad in visited:
+                continue
+
+            # start from the far end of the component to get thin bands
+            start = self._breadth_first_order(crossroad)[-1]
+            component = self._breadth_first_order(start)
+
+            visited.update(component)
+            order.extend(component)
+
+        weights = [self._get_weight(crossroad) for crossroad in order]
+        total_weight = sum(weights)
+
+        regions = {}
+        cumulative_weight = 0
+        for crossroad, weight in zip(order, weights):
+            regions[crossroad.id] = min(
+                self.count - 1, cumulative_weight * self.count // total_weight
+            )
+            cumulative_weight += weight
+
+        return regions
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from entities import SimulationContext
+from utils.globals import MAP_DIR, MAP_MEMORY_BUDGET, PARSED_ROADNET_FACTOR
+from .Parser import Parser
+from .PackedRoadnet import PackedRoadnet
+from .RoadnetFormatV2 import RoadnetFormatV2
+from .TileIndex import TileIndex
+
+
+class LoadedMap:
+    """
+    Map parsed once and kept for the requests reading its roadnet.
+    The simulations parse their own copy, the entities hold the state of one simulation.
+    """
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+
+        with SimulationContext() as context:
+            self.parser = Parser(context.env, context.calendar)
+            self.parser.parse(path)
+
+        self._roadnets: dict[str, PackedRoadnet] = {}
+        self._tile_index: TileIndex = None
+        self._lock = threading.Lock()
+
+        self.get_roadnet("1")
+
+    @property
+    def version(self) -> str:
+        """Version of the map, the hash of its packed roadnet"""
+        return self.get_roadnet("1").version
+
+    @property
+    def size(self) -> int:
+        """Estimated memory of the parsed roadnet and its packed formats (bytes)"""
+        packed_size = len(self.get_roadnet("1").data)
+        return int(packed_size * PARSED_ROADNET_FACTOR) + sum(
+            roadnet.size for roadnet in self._roadnets.values()
+        )
+
+    @property
+    def tile_index(self) -> TileIndex:
+        with self._lock:
+            if self._tile_index is None:
+                self._tile_index = TileIndex(self.parser)
+            return self._tile_index
+
+    def get_roadnet(self, roadnet_format: str = "1") -> PackedRoadnet:
+        with self._lock:
+            if roadnet_format not in self._roadnets:
+                self._roadnets[roadnet_format] = PackedRoadnet(
+                    *(
+                        RoadnetFormatV2.pack(self.parser)
+                        if roadnet_format == "2"
+                        else self.parser.pack()
+                    )
+                )
+            return self._roadnets[roadnet_format]
+
+
+class MapRegistry:
+    """
+    Maps served by name, every *.osm file of the directory is a map named by its file name.
+    The maps are parsed on their first use, so the startup only lists the directory.
+    The loaded maps over the memory budget (bytes) are dropped, the least recently used first.
+    """
+
+    def __init__(
+        self, directory: str = MAP_DIR, memory_budget: int = MAP_MEMORY_BUDGET
+    ):
+        self.directory = directory
+        self.memory_budget = memory_budget
+
+        self.paths: dict[str, str] = {
+            name[: -len(".osm")]: os.path.join(directory, name)
+            for name in sorted(os.listdir(directory))
+            if name.endswith(".osm")
+        }
+
+        self._loaded: OrderedDict[str, LoadedMap] = OrderedDict()
+        self._lock = threading.Lock()
+        # a map is loaded by one request, the others wait for it
+        self._load_locks = {name: threading.Lock() for name in self.paths}
+        # the forked job workers inherit the locks held by the other threads
+        os.register_at_fork(after_in_child=self._reset_locks)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.paths
+
+    def get(self, name: str) -> LoadedMap:
+        """Returns the loaded map, raises KeyError if there is no map of the name"""
+        path = self.paths[name]
+
+        with self._load_locks[name]:
+            with self._lock:
+                if name in self._loaded:
+                    self._loaded.move_to_end(name)
+                    return self._loaded[name]
+
+            print(f"Loading map '{name}'...")
+            loaded = LoadedMap(name, path)
+
+            with self._lock:
+                self._loaded[name] = loaded
+                self._evict(keep=name)
+
+            return loaded
+
+    def get_state(self) -> list[dict]:
+        with self._lock:
+            return [
+                {
+                    "name": name,
+                    "loaded": name in self._loaded,
+                    "size": self._loaded[name].size if name in self._loaded else None,
+                }
+                for name in self.paths
+            ]
+
+    def _reset_locks(self):
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in self.paths}
+        for loaded in self._loaded.values():
+            loaded._lock = threading.Lock()
+
+    def _evict(self, keep: str):
+        """Drops the least recently used maps until the others fit the budget"""
+        used = sum(loaded.size for loaded in self._loaded.values())
+        for name in list(self._loaded):
+            if used <= self.memory_budget:
+                break
+
+            if name != keep:
+                used -= self._loaded.pop(name).size
+                print(f"Map '{name}' unloaded.")
@@ -0,0 +1,18 @@
+import gzip
+import hashlib
+import struct
+
+
+class PackedRoadnet:
+    def __init__(self, data: bytes, counts: tuple[int, int, int]):
+        self.data = data
+        self.counts = counts
+        # the roadnet alone, after the header of a simulation with no events
+        self.body = struct.pack("!IIIII", *counts, 0, 0) + data
+        self.gzipped_body = gzip.compress(self.body)
+        # the parsing is deterministic, the same map always has the same version
+        self.version = hashlib.sha256(self.body).hexdigest()[:16]
+
+    @property
+    def size(self) -> int:
+        return len(self.data) + len(self.body) + len(self.gzipped_body)
@@ -0,0 +1,165 @@
+import multiprocessing
+import numpy as np
+import simpy
+from entities.Car import Car
+from .Parser import Parser
+from .MapPartition import MapPartition
+from .RegionSpawner import RegionSpawner
+
+
+class ParallelSimulation:
+    """
+    Conservative parallel simulation of the map partitioned into regions, one process per region.
+    The regions advance in windows of the lookahead (the minimal travel time of a boundary lane),
+    a car crossing the boundary is inserted into the next region after the lookahead,
+    so no region ever receives a car from its past.
+    The result is deterministic for a given seed and partition count.
+    """
+
+    def __init__(self, parser: Parser, partitions: int, seed: int):
+        self.parser = parser
+        self.calendar = parser.calendar
+        self.partition = MapPartition(parser.ways, parser.crossroads, partitions)
+        self.seed = seed
+        self.lookahead = self.partition.lookahead
+        self.windows = 0
+        self.transfers = 0
+
+        self._lanes_by_id = {lane.id: lane for way in parser.ways for lane in way.lanes}
+
+    def run(self, vehicle_count: int, until: float):
+        """Runs the regions and merges their calendars into the calendar of the parser"""
+        context = multiprocessing.get_context("fork")
+        connections = []
+        processes = []
+
+        for region, region_vehicle_count in enumerate(
+            self._split_vehicle_count(vehicle_count)
+        ):
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(
+                target=self._run_region,
+                args=(child_connection, region, region_vehicle_count),
+                daemon=True,
+            )
+            process.start()
+            connections.append(parent_connection)
+            processes.append(process)
+
+        inboxes = [[] for _ in connections]
+        now = 0
+        while now < until:
+            now = min(now + self.lookahead, until)
+            for connection, inbox in zip(connections, inboxes):
+                connection.send(("advance", now, inbox))
+
+            inboxes = [[] for _ in connections]
+            for connection in connections:
+                for transfer in connection.recv():
+                    lane = self._lanes_by_id[transfer.lane_id]
+                    inboxes[self.partition.lane_region(lane)].append(transfer)
+                    self.transfers += 1
+
+            self.windows += 1
+
+        results = []
+        for connection in connections:
+            connection.send(("finish",))
+            results.append(connection.recv())
+
+        for process in processes:
+            process.join()
+
+        self._merge(results)
+
+    def _split_vehicle_count(self, vehicle_count: int) -> list[int]:
+        """Distributes the vehicles among the regions by their lane count"""
+        lane_counts = [
+            len(self.partition.region_lanes(region))
+            for region in range(self.partition.count)
+        ]
+        total = sum(lane_counts)
+        counts = [vehicle_count * lane_count // total for lane_count in lane_counts]
+
+        remainders = sorted(
+            range(len(counts)),
+            key=lambda region: -(vehicle_count * lane_counts[region] % total),
+        )
+        for region in remainders[: vehicle_count - sum(counts)]:
+            counts[region] += 1
+
+        return counts
+
+    def _run_region(self, connection, region: int, vehicle_count: int):
+        """Worker process simulating one region on its copy of the roadnet"""
+        # the forked copy of the context, shared by the entities of the roadnet
+        context = self.parser.context
+        context.reseed(f"{self.seed}/{region}")
+        context.set_next_id(Car, region + 1, self.partition.count)
+
+        env: simpy.Environment = self.parser.env
+        spawner = RegionSpawner(
+            env, self.calendar, self.partition, region, self.lookahead
+        )
+        spawner.spawn_multiple(vehicle_count)
+
+        if self.calendar.record_from > env.now:
+            env.process(
+                self.calendar.snapshot_process(spawner.vehicles, self.parser.crossroads)
+            )
+
+        while True:
+            message = connection.recv()
+            if message[0] == "finish":
+                break
+
+            _, until, transfers = message
+            spawner.receive(transfers)
+            env.run(until=until)
+            connection.send(spawner.take_outbox())
+
+        for vehicle in spawner.vehicles:
+            vehicle.calendar_car_update()
+
+        owned_crossroads = [
+            crossroad_id
+            for crossroad_id, crossroad_region in self.partition.crossroad_regions.items()
+            if crossroad_region == region
+        ]
+        connection.send(self.calendar.get_arrays(owned_crossroads))
+        connection.close()
+
+    def _merge(self, results: list[dict]):
+        """Merges the region calendars ordered by time, the earlier region goes first on ties"""
+        car_events = np.concatenate([result["car_events"] for result in results])
+        car_event_times = np.concatenate(
+            [result["car_event_times"] for result in results]
+        )
+        car_order = np.argsort(car_event_times, kind="stable")
+
+        crossroad_events = np.concatenate(
+            [result["crossroad_events"] for result in results]
+        )
+        crossroad_event_times = np.concatenate(
+            [result["crossroad_event_times"] for result in results]
+        )
+        green_lanes = np.concatenate([result["green_lanes"] for result in results])
+        lane_counts = crossroad_events["lane_count"].astype(np.int64)
+        offsets = np.concatenate(([0], np.cumsum(lane_counts)[:-1]))
+
+        crossroad_order = np.argsort(crossroad_event_times, kind="stable")
+        green_lanes = np.concatenate(
+            [green_lanes[offsets[i] : offsets[i] + lane_counts[i]] for i in crossroad_order]
+            + [np.empty(0, green_lanes.dtype)]
+        )
+
+        self.calendar.clear()
+        self.calendar.extend(
+            {
+                "car_events": car_events[car_order],
+                "car_event_times": car_event_times[car_order],
+                "crossroad_events": crossroad_events[crossroad_order],
+                "crossroad_event_times": crossroad_event_times[crossroad_order],
+                "green_lanes": green_lanes,
+            }
+        )
@@ -1,7 +1,17 @@
 import osmium
 import simpy
 from utils import LatLng, str_to_int, Turn, HighwayClass
-from entities import Way, WayLanesProps, Crossroad, Node, Calendar
+from entities import (
+    Way,
+    WayLanesProps,
+    Crossroad,
+    Node,
+    Calendar,
+    MesoscopicLink,
+    Lane,
+    BlockableLane,
+    SimulationContext,
+)
 
 
 class Parser(osmium.SimpleHandler):
@@ -9,11 +19,17 @@ class Parser(osmium.SimpleHandler):
         osmium.SimpleHandler.__init__(self)
         self.env = env
         self.calendar = calendar
+        # context the roadnet entities were created in
+        self.context = SimulationContext.current()
         self._nodes: dict(int, Node) = {}
         self.ways: list[Way] = []
         self.crossroads: list[Crossroad] = []
 
     def parse(self, filename):
+        # the same map always gets the same ids, so its packed roadnet can be cached
+        for entity in (Way, Lane, BlockableLane, Crossroad):
+            entity.reset_ids()
+
         self.apply_file(filename)
         self.init_crossroads()
         self.remove_short_way_segments()
@@ -43,10 +59,30 @@ class Parser(osmium.SimpleHandler):
         for way in self.ways:
             way.remove_short_segments()
 
-    def pack(self):
-        nodes_list = [node.pack() for node in self._nodes.values()]
-        ways_list = [way.pack() for way in self.ways]
-        crossroads_list = [crossroad.pack() for crossroad in self.crossroads]
+    def use_mesoscopic_model(self, highway_classes: list[HighwayClass]):
+        """Simulates the lanes of the ways with given classes by the link queue model"""
+        for way in self.ways:
+            if way.highway_class not in highway_classes:
+                continue
+
+            for lane in way.lanes:
+                lane.mesoscopic_link = MesoscopicLink(lane)
+
+    def pack(self, ways: list[Way] = None, crossroads: list[Crossroad] = None):
+        """Packs the roadnet or only the given ways and crossroads with their nodes"""
+        if ways is None and crossroads is None:
+            nodes = list(self._nodes.values())
+        else:
+            used_nodes = {node for way in ways or [] for node in way.nodes}
+            used_nodes |= {crossroad.node for crossroad in crossroads or []}
+            nodes = [node for node in self._nodes.values() if node in used_nodes]
+
+        ways = self.ways if ways is None else ways
+        crossroads = self.crossroads if crossroads is None else crossroads
+
+        nodes_list = [node.pack() for node in nodes]
+        ways_list = [way.pack() for way in ways]
+        crossroads_list = [crossroad.pack() for crossroad in crossroads]
 
         return (
             b"".join(nodes_list) + b"".join(ways_list) + b"".join(crossroads_list),
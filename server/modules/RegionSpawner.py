@@ -0,0 +1,81 @@
+from entities.Car import Car
+from entities.Lane import Lane
+from .MapPartition import MapPartition
+from .VehicleSpawner import VehicleSpawner
+
+
+class CarTransfer:
+    """Car leaving one region, inserted into the region of its lane after the lookahead"""
+
+    def __init__(self, car: Car, arrival_time: float, lookahead: float):
+        self.arrival_time = arrival_time
+        self.car_id = car.id
+        self.lane_id = car.lane.id
+        self.position = min(car.speed * lookahead / 3600, car.lane.length)
+        self.speed = car.speed
+        self.comfortable_speed = car.comfortable_speed
+        self.length = car.length
+        self.ways_to_cross = car.ways_to_cross_before_despawn
+
+
+class RegionSpawner(VehicleSpawner):
+    """Spawns the vehicles of one region and exchanges the vehicles crossing its boundary"""
+
+    def __init__(self, env, calendar, partition: MapPartition, region: int, lookahead):
+        self.partition = partition
+        self.region = region
+        self.lookahead = lookahead
+        self.lanes = partition.region_lanes(region)
+        self._lanes_by_id: dict[int, Lane] = {lane.id: lane for lane in self.lanes}
+        self.outbox: list[CarTransfer] = []
+
+        super().__init__(env, calendar, list({lane.way: None for lane in self.lanes}))
+
+    def owns_lane(self, lane):
+        return self.partition.lane_region(lane) == self.region
+
+    def transfer(self, vehicle):
+        if vehicle in self.vehicles:
+            self.vehicles.remove(vehicle)
+
+        self.outbox.append(CarTransfer(vehicle, self.env.now + self.lookahead, self.lookahead))
+
+    def take_outbox(self) -> list[CarTransfer]:
+        """Returns the transfers created since the last call"""
+        outbox = self.outbox
+        self.outbox = []
+        return outbox
+
+    def receive(self, transfers: list[CarTransfer]):
+        """Schedules the insertion of the cars handed over by the other regions"""
+        for transfer in sorted(transfers, key=lambda t: (t.arrival_time, t.car_id)):
+            self.env.process(self._insert_process(transfer))
+
+    def _insert_process(self, transfer: CarTransfer):
+        yield self.env.timeout(transfer.arrival_time - self.env.now)
+
+        lane = self._lanes_by_id[transfer.lane_id]
+        position = transfer.position
+
+        # the other region could not see the queue on the lane
+        last_car = lane.last
+        if last_car is not None and last_car.position < position:
+            position = max(0, last_car.position - last_car.length)
+
+        vehicle = Car(
+            self.env,
+            self,
+            self.calendar,
+            lane.way,
+            lane,
+            position,
+            transfer.comfortable_speed,
+            transfer.length,
+            transfer.ways_to_cross,
+            transfer.car_id,
+        )
+        self.vehicles.append(vehicle)
+
+    def _get_spawn_lane(self):
+        lane = self.lanes[self.random.randint(0, len(self.lanes) - 1)]
+        return lane.way, lane
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable
+from utils.globals import RESULT_CACHE_MEMORY, RESULT_CACHE_DISK
+
+
+class CachedResult:
+    """Packed response of a simulation with its headers"""
+
+    def __init__(self, body: bytes, headers: dict[str, str]):
+        self.body = body
+        self.headers = headers
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+
+class ResultCache:
+    """
+    Content addressed cache of the simulation results.
+    A run is fully determined by its parameters, the map and the code,
+    so the key is a hash of them and an identical request is served from the cache.
+
+    The recently used results are kept in the memory, the others on the disk,
+    each tier evicts the least recently used results when it exceeds its size (bytes).
+    Identical requests arriving while the result is computed wait for it
+    instead of computing it again.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        version: str,
+        memory_size: int = RESULT_CACHE_MEMORY,
+        disk_size: int = RESULT_CACHE_DISK,
+    ):
+        self.directory = directory
+        # version of the code producing the results
+        self.version = version
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "collapsed": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+        self._memory: OrderedDict[str, CachedResult] = OrderedDict()
+        self._memory_used = 0
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_used = 0
+        # keys being computed, the waiting requests are woken up by their events
+        self._pending: dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+        self._load_disk_entries()
+        # the forked job workers could wait for a computation only the parent runs
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def get_key(self, params: dict) -> str:
+        data = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(f"{self.version}:{data}".encode()).hexdigest()
+
+    def get_or_compute(
+        self, key: str, compute: Callable[[], CachedResult | None]
+    ) -> tuple[CachedResult | None, bool]:
+        """
+        Returns the cached result and True, or computes it and returns False.
+        The result is cached only if the computation returns one.
+        """
+        while True:
+            with self._lock:
+                result = self._get(key)
+                if result is not None:
+                    return result, True
+
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = threading.Event()
+                    self.stats["misses"] += 1
+                    break
+
+                self.stats["collapsed"] += 1
+
+            # the result is looked up again, the computation may have failed
+            pending.wait()
+
+        try:
+            result = compute()
+            if result is not None:
+                self.put(key, result)
+            return result, False
+        finally:
+            with self._lock:
+                self._pending.pop(key).set()
+
+    def put(self, key: str, result: CachedResult):
+        with self._lock:
+            self._put_memory(key, result)
+            if key in self._disk or result.size > self.disk_size:
+                return
+
+        # the other requests are not held up by the disk write
+        size = self._write_disk(key, result)
+
+        with self._lock:
+            self._put_disk(key, size)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups += self.stats["misses"]
+
+            return {
+                **self.stats,
+                "hit_rate": (
+                    (self.stats["memory_hits"] + self.stats["disk_hits"]) / lookups
+                    if lookups > 0
+                    else None
+                ),
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_used,
+            }
+
+    def _reset_after_fork(self):
+        """Forgets the computations of the parent, its lock may have been held by a thread"""
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> CachedResult | None:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return self._memory[key]
+
+        # the results of the jobs are written by their worker processes
+        path = self._get_path(key)
+        if key not in self._disk and os.path.exists(path):
+            self._disk[key] = os.path.getsize(path)
+            self._disk_used += self._disk[key]
+
+        if key in self._disk:
+            try:
+                with open(path, "rb") as f:
+                    result = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                self._remove_disk(key)
+                return None
+
+            self._disk.move_to_end(key)
+            os.utime(path)
+            self.stats["disk_hits"] += 1
+            self._put_memory(key, result)
+            return result
+
+        return None
+
+    def _put_memory(self, key: str, result: CachedResult):
+        if result.size > self.memory_size:
+            return
+
+        if key in self._memory:
+            self._memory_used -= self._memory.pop(key).size
+
+        self._memory[key] = result
+        self._memory_used += result.size
+
+        while self._memory_used > self.memory_size:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= evicted.size
+            self.stats["memory_evictions"] += 1
+
+    def _write_disk(self, key: str, result: CachedResult) -> int:
+        """Writes the result to the disk, returns its size (bytes)"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        # written aside and renamed, so a result is never read half written
+        path = self._get_path(key)
+        fd, temporary_path = tempfile.mkstemp(".tmp", dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(result, f)
+        os.replace(temporary_path, path)
+
+        return os.path.getsize(path)
+
+    def _put_disk(self, key: str, size: int):
+        # the result may have been written by another request meanwhile
+        if key in self._disk:
+            return
+
+        self._disk[key] = size
+        self._disk_used += size
+
+        while self._disk_used > self.disk_size:
+            self._remove_disk(next(iter(self._disk)))
+            self.stats["disk_evictions"] += 1
+
+    def _remove_disk(self, key: str):
+        self._disk_used -= self._disk.pop(key)
+        if os.path.exists(self._get_path(key)):
+            os.remove(self._get_path(key))
+
+    def _load_disk_entries(self):
+        """Picks up the results cached by the previous runs, the oldest first"""
+        if not os.path.isdir(self.directory):
+            return
+
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pickle"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, name[: -len(".pickle")], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_used += size
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pickle")
+
+    @staticmethod
+    def get_code_version(root: str) -> str:
+        """Hash of the source files under the directory"""
+        digest = hashlib.sha256()
+        for directory, directories, files in os.walk(root):
+            directories.sort()
+            for name in sorted(files):
+                if name.endswith(".py"):
+                    path = os.path.join(directory, name)
+                    digest.update(os.path.relpath(path, root).encode())
+                    with open(path, "rb") as f:
+                        digest.update(f.read())
+
+        return digest.hexdigest()[:16]
@@ -0,0 +1,210 @@
+import numpy as np
+from entities import Lane, Way, Crossroad
+from utils import Turn
+from utils.varint import encode_varints, decode_varints
+from .Parser import Parser
+
+# order of the turn flags in the lane bitfield, after the forward flag
+LANE_TURNS = [
+    Turn.none,
+    Turn.left,
+    Turn.right,
+    Turn.through,
+    Turn.merge_to_right,
+    Turn.merge_to_left,
+    Turn.slight_right,
+    Turn.slight_left,
+]
+
+# coordinate quantum (degrees), the precision of OSM coordinates
+COORDINATE_RESOLUTION = 1e-7
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+class RoadnetFormatV2:
+    """
+    Compact roadnet format, all numbers are varints, the ids are zigzag deltas from the previous one.
+
+        vertex count, zigzag lat/lng deltas of the vertices (1e-7 deg)
+        node count, per node: osm id delta, vertex index
+        way count, per way: id delta, max speed, lane count, lanes
+        crossroad count, per crossroad: id delta, node index, traffic light flag, lane count, lanes
+        lane: id delta, flags (forward, turns), run count,
+              runs of the vertex indices: zigzag start - previous run end, length
+
+    Only the nodes of the crossroads are sent, referenced by their dense index.
+    The lane vertices are shared, so the crossroad lanes reuse the ends of the way lanes.
+    """
+
+    @classmethod
+    def pack(
+        cls, parser: Parser, ways: list[Way] = None, crossroads: list[Crossroad] = None
+    ) -> tuple[bytes, tuple[int, int, int]]:
+        """Packs the roadnet or only the given ways and crossroads"""
+        ways = parser.ways if ways is None else ways
+        crossroads = parser.crossroads if crossroads is None else crossroads
+        vertices: dict[tuple[float, float], int] = {}
+
+        def vertex_index(lat: float, lng: float) -> int:
+            return vertices.setdefault((lat, lng), len(vertices))
+
+        nodes = [crossroad.node for crossroad in crossroads]
+        node_vertices = [vertex_index(node.pos.lat, node.pos.lng) for node in nodes]
+
+        state = {"lane_id": 0, "vertex": -1}
+
+        def pack_lane(lane: Lane) -> list[int]:
+            flags = int(lane.is_forward)
+            for bit, turn in enumerate(LANE_TURNS, 1):
+                if turn in lane.turns:
+                    flags |= 1 << bit
+
+            indices = [vertex_index(node.lat, node.lng) for node in lane.nodes]
+
+            runs = []
+            for index in indices:
+                if len(runs) > 0 and runs[-1][0] + runs[-1][1] == index:
+                    runs[-1][1] += 1
+                else:
+                    runs.append([index, 1])
+
+            values = [_zigzag(lane.id - state["lane_id"]), flags, len(runs)]
+            state["lane_id"] = lane.id
+            for start, length in runs:
+                values += [_zigzag(start - state["vertex"]), length]
+                state["vertex"] = start + length - 1
+
+            return values
+
+        way_values = [len(ways)]
+        previous_id = 0
+        for way in ways:
+            way_values += [_zigzag(way.id - previous_id), way.max_speed, len(way.lanes)]
+            previous_id = way.id
+            for lane in way.lanes:
+                way_values += pack_lane(lane)
+
+        crossroad_values = [len(crossroads)]
+        previous_id = 0
+        for node_index, crossroad in enumerate(crossroads):
+            crossroad_values += [
+                _zigzag(crossroad.id - previous_id),
+                node_index,
+                int(crossroad.has_traffic_light),
+                len(crossroad.lanes),
+            ]
+            previous_id = crossroad.id
+            for lane in crossroad.lanes:
+                crossroad_values += pack_lane(lane)
+
+        coordinates = np.rint(
+            np.array(list(vertices.keys()), np.float64).reshape(-1, 2)
+            / COORDINATE_RESOLUTION
+        ).astype(np.int64)
+        coordinate_deltas = np.diff(coordinates, axis=0, prepend=0).ravel()
+
+        node_values = [len(nodes)]
+        previous_id = 0
+        for node, vertex in zip(nodes, node_vertices):
+            node_values += [_zigzag(node.id - previous_id), vertex]
+            previous_id = node.id
+
+        values = np.concatenate(
+            [
+                np.array([len(vertices)], np.uint64),
+                ((coordinate_deltas << 1) ^ (coordinate_deltas >> 63)).astype(
+                    np.uint64
+                ),
+                np.array(node_values + way_values + crossroad_values, np.uint64),
+            ]
+        )
+
+        return encode_varints(values), (
+            len(nodes),
+            len(ways),
+            len(crossroads),
+        )
+
+    @staticmethod
+    def unpack(data: bytes) -> dict:
+        """Decodes the roadnet, the reference for the clients"""
+        values, _ = decode_varints(data)
+        position = 0
+
+        def take(count: int = 1) -> list[int]:
+            nonlocal position
+            taken = values[position : position + count]
+            position += count
+            return taken
+
+        (vertex_count,) = take()
+        deltas = np.array(
+            [_unzigzag(value) for value in take(2 * vertex_count)], np.int64
+        ).reshape(-1, 2)
+        vertices = (np.cumsum(deltas, axis=0) * COORDINATE_RESOLUTION).tolist()
+
+        (node_count,) = take()
+        nodes = []
+        node_id = 0
+        for _ in range(node_count):
+            id_delta, vertex = take(2)
+            node_id += _unzigzag(id_delta)
+            nodes.append({"id": node_id, "pos": vertices[vertex]})
+
+        lane_state = {"id": 0, "vertex": -1}
+
+        def take_lane() -> dict:
+            id_delta, flags, run_count = take(3)
+            lane_state["id"] += _unzigzag(id_delta)
+
+            indices = []
+            for _ in range(run_count):
+                start_delta, length = take(2)
+                start = lane_state["vertex"] + _unzigzag(start_delta)
+                indices += range(start, start + length)
+                lane_state["vertex"] = start + length - 1
+
+            return {
+                "id": lane_state["id"],
+                "is_forward": bool(flags & 1),
+                "turns": [
+                    turn.name
+                    for bit, turn in enumerate(LANE_TURNS, 1)
+                    if flags & (1 << bit)
+                ],
+                "nodes": [vertices[index] for index in indices],
+            }
+
+        (way_count,) = take()
+        ways = []
+        way_id = 0
+        for _ in range(way_count):
+            id_delta, max_speed, lane_count = take(3)
+            way_id += _unzigzag(id_delta)
+            lanes = [take_lane() for _ in range(lane_count)]
+            ways.append({"id": way_id, "max_speed": max_speed, "lanes": lanes})
+
+        (crossroad_count,) = take()
+        crossroads = []
+        crossroad_id = 0
+        for _ in range(crossroad_count):
+            id_delta, node_index, has_traffic_light, lane_count = take(4)
+            crossroad_id += _unzigzag(id_delta)
+            lanes = [take_lane() for _ in range(lane_count)]
+            crossroads.append(
+                {
+                    "id": crossroad_id,
+                    "node": nodes[node_index],
+                    "has_traffic_light": bool(has_traffic_light),
+                    "lanes": lanes,
+                }
+            )
+
+        return {"nodes": nodes, "ways": ways, "crossroads": crossroads}
@@ -0,0 +1,56 @@
+import threading
+import time
+from entities import SimulationContext
+from utils import HighwayClass
+from .Parser import Parser
+from .VehicleSpawner import VehicleSpawner
+
+
+class Session:
+    """Simulation kept alive between requests, it can be advanced further in time"""
+
+    def __init__(
+        self,
+        session_id: str,
+        map_path: str,
+        vehicle_count: int,
+        seed: int,
+        mesoscopic_classes: list[HighwayClass] = None,
+    ):
+        self.id = session_id
+        self.last_access = time.monotonic()
+        # a session is advanced by one request at a time
+        self.lock = threading.Lock()
+
+        # every session continues its own ids and random sequence
+        self.context = SimulationContext(seed)
+        self.env = self.context.env
+        self.calendar = self.context.calendar
+
+        with self.context:
+            self.parser = Parser(self.env, self.calendar)
+            self.parser.parse(map_path)
+            self.parser.use_mesoscopic_model(mesoscopic_classes or [])
+
+            self.spawner = VehicleSpawner(self.env, self.calendar, self.parser.ways)
+            self.spawner.spawn_multiple(vehicle_count)
+
+    @property
+    def now(self) -> float:
+        return self.env.now
+
+    def advance(self, until: float):
+        """Runs the simulation to the given time, returns the packed events recorded since the last call"""
+        self.last_access = time.monotonic()
+
+        with self.context:
+            self.env.run(until=until)
+
+        for vehicle in self.spawner.vehicles:
+            vehicle.calendar_car_update()
+
+        # the sent events are not kept, so the memory does not grow with the session
+        event_data = self.calendar.pack()
+        self.calendar.clear()
+
+        return event_data
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from .Session import Session
+from utils.globals import SESSION_IDLE_TIMEOUT, SESSION_MAX_COUNT
+
+
+class SessionStore:
+    """Live simulation sessions, the ones idle for longer than the timeout are evicted"""
+
+    def __init__(
+        self,
+        idle_timeout: float = SESSION_IDLE_TIMEOUT,
+        max_sessions: int = SESSION_MAX_COUNT,
+    ):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions: dict[str, Session] = {}
+        # guards the sessions, each session runs in its own context
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def is_full(self) -> bool:
+        with self.lock:
+            self.evict_idle()
+            return len(self._sessions) >= self.max_sessions
+
+    def create(self, *args, **kwargs) -> Session | None:
+        """
+        Creates a session with a new id, the arguments are passed to the Session.
+        Returns None if too many sessions are kept.
+        """
+        if self.is_full():
+            return None
+
+        session = Session(uuid.uuid4().hex, *args, **kwargs)
+        with self.lock:
+            # another session could be created while this one was set up
+            if self.is_full():
+                return None
+
+            self._sessions[session.id] = session
+            return session
+
+    def get(self, session_id: str) -> Session:
+        """Returns the session or None if it does not exist or was evicted"""
+        with self.lock:
+            self.evict_idle()
+            return self._sessions.get(session_id)
+
+    def remove(self, session_id: str):
+        with self.lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_idle(self):
+        now = time.monotonic()
+        with self.lock:
+            for session_id, session in list(self._sessions.items()):
+                if now - session.last_access > self.idle_timeout:
+                    del self._sessions[session_id]
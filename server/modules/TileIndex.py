@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from entities import Lane, Way, Crossroad
+from utils.math import latlng_to_tile, tile_to_bounds
+from utils.globals import TILE_ZOOM
+from .Parser import Parser
+
+
+class TileIndex:
+    """
+    Lanes of the roadnet by the web mercator tiles their bounding boxes touch.
+    The bounds are (south, west, north, east) tuples in degrees.
+    """
+
+    def __init__(self, parser: Parser, zoom: int = TILE_ZOOM):
+        self.parser = parser
+        self.zoom = zoom
+
+        self.lane_bounds: dict[Lane, tuple[float, float, float, float]] = {}
+        self.tiles: dict[tuple[int, int], list[Lane]] = {}
+
+        lanes = [lane for way in parser.ways for lane in way.lanes] + [
+            lane for crossroad in parser.crossroads for lane in crossroad.lanes
+        ]
+        for lane in lanes:
+            lats = [node.lat for node in lane.nodes]
+            lngs = [node.lng for node in lane.nodes]
+            bounds = (min(lats), min(lngs), max(lats), max(lngs))
+
+            self.lane_bounds[lane] = bounds
+            min_x, min_y, max_x, max_y = self._get_tile_range(bounds)
+            for x in range(min_x, max_x + 1):
+                for y in range(min_y, max_y + 1):
+                    self.tiles.setdefault((x, y), []).append(lane)
+
+    def get_tiles(self, bounds: tuple[float, float, float, float]):
+        """Returns the x and y of every tile the bounds touch"""
+        min_x, min_y, max_x, max_y = self._get_tile_range(bounds)
+
+        # large bounds are matched against the indexed tiles only
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > len(self.tiles):
+            return [
+                (x, y)
+                for x, y in self.tiles
+                if min_x <= x <= max_x and min_y <= y <= max_y
+            ]
+
+        return [
+            (x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)
+        ]
+
+    def _get_tile_range(
+        self, bounds: tuple[float, float, float, float]
+    ) -> tuple[int, int, int, int]:
+        south, west, north, east = bounds
+        min_x, min_y = latlng_to_tile(north, west, self.zoom)
+        max_x, max_y = latlng_to_tile(south, east, self.zoom)
+
+        return min_x, min_y, max_x, max_y
+
+    def get_lanes(self, bounds: tuple[float, float, float, float]) -> set[Lane]:
+        """Returns the lanes whose bounding box intersects the bounds"""
+        south, west, north, east = bounds
+
+        lanes = set()
+        for tile in self.get_tiles(bounds):
+            for lane in self.tiles.get(tile, []):
+                lane_south, lane_west, lane_north, lane_east = self.lane_bounds[lane]
+                if (
+                    lane_south <= north
+                    and lane_north >= south
+                    and lane_west <= east
+                    and lane_east >= west
+                ):
+                    lanes.add(lane)
+
+        return lanes
+
+    def get_tile_lanes(self, tiles: list[tuple[int, int, int]]) -> set[Lane]:
+        """Returns the lanes touching any of the (zoom, x, y) tiles"""
+        lanes = set()
+        for zoom, x, y in tiles:
+            lanes |= self.get_lanes(tile_to_bounds(zoom, x, y))
+
+        return lanes
+
+    def get_elements(self, lanes: set[Lane]) -> tuple[list[Way], list[Crossroad]]:
+        """Returns the ways and crossroads with any of the lanes, in the roadnet order"""
+        ways = [
+            way for way in self.parser.ways if any(lane in lanes for lane in way.lanes)
+        ]
+        crossroads = [
+            crossroad
+            for crossroad in self.parser.crossroads
+            if any(lane in lanes for lane in crossroad.lanes)
+        ]
+
+        return ways, crossroads
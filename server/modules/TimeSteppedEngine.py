@@ -0,0 +1,726 @@
+import math
+
+import numpy as np
+import simpy
+
+from entities import Calendar, Car, CarEvent, Crossroad, Lane, Way, SimulationContext
+from utils.globals import (
+    MIN_GAP,
+    CROSSROAD_BLOCKING_TIME,
+    MIN_TRAVEL_DISTANCE,
+    MAX_TRAVEL_DISTANCE,
+    TIME_STEP,
+)
+
+# IDM car-following parameters
+MAX_ACCELERATION = 1.5  # m/s^2
+COMFORTABLE_DECELERATION = 2.0  # m/s^2
+TIME_HEADWAY = 1.2  # s
+ACCELERATION_EXPONENT = 4
+STANDSTILL_GAP = MIN_GAP * 1000  # m
+
+# MOBIL lane-change parameters
+POLITENESS = 0.3
+LANE_CHANGE_THRESHOLD = 0.2  # m/s^2
+SAFE_DECELERATION = 3.0  # m/s^2
+# distance before the end of the lane where the cars keep their lane (m)
+LANE_KEEPING_DISTANCE = 50
+
+# the car is recorded once its position differs from the recorded trajectory by more than this (m)
+POSITION_TOLERANCE = 2.0
+# the car is recorded once its speed differs from the recorded speed by more than this (m/s)
+SPEED_TOLERANCE = 2.0
+
+# lane keys of the sorted vehicles are lane index * KEY_SCALE + position
+KEY_SCALE = 1e7
+
+
+class TimeSteppedEngine:
+    """
+    Fixed step car-following (IDM) and lane-change (MOBIL) model over NumPy arrays.
+    Uses the same roadnet, crossroad priorities and traffic lights as the event driven model
+    and records the same car events to the calendar.
+    """
+
+    def __init__(
+        self,
+        env: simpy.Environment,
+        calendar: Calendar,
+        ways: list[Way],
+        crossroads: list[Crossroad],
+        time_step: float = TIME_STEP,
+    ):
+        self.env = env
+        self.calendar = calendar
+        self.ways = ways
+        self.crossroads = crossroads
+        self.time_step = time_step
+        self.context = SimulationContext.current()
+        self.random = self.context.random
+
+        self._init_lanes()
+        self._init_paths()
+        self._init_vehicles(0)
+
+    @property
+    def vehicle_count(self) -> int:
+        return len(self.car_id)
+
+    """
+    ################################################
+                    ROADNET
+    ################################################
+    """
+
+    def _init_lanes(self):
+        way_lanes = [lane for way in self.ways for lane in way.lanes]
+        crossroad_lanes = [
+            lane for crossroad in self.crossroads for lane in crossroad.lanes
+        ]
+
+        self.lanes: list[Lane] = way_lanes + crossroad_lanes
+        self._way_lane_count = len(way_lanes)
+        self._lane_index: dict[Lane, int] = {
+            lane: idx for idx, lane in enumerate(self.lanes)
+        }
+
+        lane_count = len(self.lanes)
+        self.lane_length = np.array([lane.length * 1000 for lane in self.lanes])
+        self.lane_entity_id = np.array([lane.id for lane in self.lanes])
+        self.lane_is_crossroad = np.arange(lane_count) >= self._way_lane_count
+        self.lane_way_id = np.full(lane_count, -1)
+        self.lane_crossroad_id = np.full(lane_count, -1)
+        self.lane_left = np.full(lane_count, -1)
+        self.lane_right = np.full(lane_count, -1)
+        self.lane_speed = np.zeros(lane_count)
+        # number of lanes on the right side of the lane
+        self.lane_rank = np.zeros(lane_count, dtype=np.int64)
+
+        for idx, lane in enumerate(way_lanes):
+            self.lane_way_id[idx] = lane.way.id
+            self.lane_speed[idx] = lane.way.max_speed / 3.6
+            if lane.left is not None:
+                self.lane_left[idx] = self._lane_index[lane.left]
+            if lane.right is not None:
+                self.lane_right[idx] = self._lane_index[lane.right]
+
+            right_lane = lane.right
+            while right_lane is not None:
+                self.lane_rank[idx] += 1
+                right_lane = right_lane.right
+
+        for idx, lane in enumerate(crossroad_lanes, self._way_lane_count):
+            self.lane_crossroad_id[idx] = lane.crossroad.id
+            self.lane_speed[idx] = lane.next_lanes[0].way.max_speed / 3.6
+
+        # crossroad lanes with traffic lights, their state is read every step
+        self._signal_lanes = [
+            (self._lane_index[lane], lane)
+            for crossroad in self.crossroads
+            if crossroad.has_traffic_light
+            for lane in crossroad.lanes
+        ]
+        self.lane_disabled = np.zeros(lane_count, dtype=bool)
+
+    def _next_crossroad(self, lane: Lane) -> Crossroad:
+        return lane.way.next_crossroad if lane.is_forward else lane.way.prev_crossroad
+
+    def _init_paths(self):
+        """Precomputes the path options, priorities and conflicts of every lane"""
+        lane_count = len(self.lanes)
+
+        # per way lane: list of (own options, {lane to switch: options}) for every next way
+        self._paths: list[list[tuple[list, dict]]] = [[] for _ in range(lane_count)]
+        # per way lane: lanes to turn back to if there is no other way
+        self._turn_back_lanes: list[list[int]] = [[] for _ in range(lane_count)]
+        # per way lane: incoming lanes on the right of the next crossroad
+        self._right_lanes: list[list[int]] = [[] for _ in range(lane_count)]
+        self.lane_on_main_way = np.zeros(lane_count, dtype=bool)
+        self.lane_has_traffic_light = np.zeros(lane_count, dtype=bool)
+
+        # per crossroad lane: conflicting crossroad lanes and the lane it begins on
+        self._conflicts: list[list[int]] = [[] for _ in range(lane_count)]
+        self.lane_from = np.full(lane_count, -1)
+        self.lane_main_crossing = np.zeros(lane_count, dtype=bool)
+
+        for way in self.ways:
+            for lane in way.lanes:
+                self._init_lane_paths(way, lane)
+
+    def _init_lane_paths(self, way: Way, lane: Lane):
+        idx = self._lane_index[lane]
+        crossroad = self._next_crossroad(lane)
+        if crossroad is None:
+            return
+
+        self.lane_on_main_way[idx] = way in crossroad.main_ways
+        self.lane_has_traffic_light[idx] = crossroad.has_traffic_light
+
+        right_way = crossroad.turns[way].right if way in crossroad.turns else None
+        if right_way is not None:
+            self._right_lanes[idx] = [
+                self._lane_index[right_lane]
+                for right_lane in crossroad._get_in_lanes(right_way)
+            ]
+
+        next_way_options = crossroad.get_next_way_options(way)
+        if len(next_way_options) == 0:
+            back_lanes = way.lanes.backward if lane.is_forward else way.lanes.forward
+            self._turn_back_lanes[idx] = [self._lane_index[l] for l in back_lanes]
+            return
+
+        for next_way_option in next_way_options:
+            next_way = next_way_option.way
+            lane_options = crossroad.get_next_lane_options(way, next_way)
+
+            own_options = []
+            switch_options: dict[int, list[tuple[int, int]]] = {}
+
+            for from_lane, to_lanes in lane_options.items():
+                options = []
+                for to_lane in to_lanes:
+                    crossroad_lane = crossroad.get_lane(from_lane, to_lane)
+                    crossroad_lane_idx = (
+                        self._lane_index[crossroad_lane]
+                        if crossroad_lane in self._lane_index
+                        else -1
+                    )
+                    options.append((crossroad_lane_idx, self._lane_index[to_lane]))
+
+                    if crossroad_lane_idx >= 0 and from_lane == lane:
+                        self._init_crossroad_lane(
+                            crossroad,
+                            crossroad_lane_idx,
+                            (way, from_lane),
+                            (next_way, to_lane),
+                        )
+
+                if from_lane == lane:
+                    own_options = options
+                else:
+                    switch_options[self._lane_index[from_lane]] = options
+
+            self._paths[idx].append((own_options, switch_options))
+
+    def _init_crossroad_lane(
+        self,
+        crossroad: Crossroad,
+        idx: int,
+        from_way_lane: tuple[Way, Lane],
+        to_way_lane: tuple[Way, Lane],
+    ):
+        self.lane_from[idx] = self._lane_index[from_way_lane[1]]
+        self.lane_main_crossing[idx] = (
+            from_way_lane[0] in crossroad.main_ways
+            and to_way_lane[0] in crossroad.main_ways
+        )
+        self._conflicts[idx] = [
+            self._lane_index[lane]
+            for lane in crossroad.get_conflicting_lanes(from_way_lane, to_way_lane)
+            if lane in self._lane_index
+        ]
+
+    """
+    ################################################
+                    VEHICLES
+    ################################################
+    """
+
+    def _init_vehicles(self, amount: int):
+        self.car_id = np.zeros(amount, dtype=np.int64)
+        self.lane = np.zeros(amount, dtype=np.int64)
+        self.position = np.zeros(amount)  # m
+        self.speed = np.zeros(amount)  # m/s
+        self.comfortable_speed = np.ones(amount)  # ratio of the speed limit
+        self.length = np.zeros(amount)  # m
+        self.next_lane = np.full(amount, -1)
+        self.next_next_lane = np.full(amount, -1)
+        self.lane_to_switch = np.full(amount, -1)
+        self.ways_to_cross = np.zeros(amount, dtype=np.int64)
+        # the car passes the next crossroad whatever happens
+        self.committed = np.zeros(amount, dtype=bool)
+
+        # last recorded state
+        self.recorded_time = np.zeros(amount)
+        self.recorded_position = np.zeros(amount)
+        self.recorded_speed = np.zeros(amount)
+
+    def spawn_multiple(self, amount: int):
+        self._init_vehicles(amount)
+        events = [self._spawn_vehicle(v) for v in range(amount)]
+        self.calendar.add_car_events(events)
+
+    def _spawn_vehicle(self, v: int) -> CarEvent:
+        """Places a new car to a random position, same as the VehicleSpawner"""
+        comfortable_speed = self.random.randint(70, 100)
+        way = self.ways[self.random.randint(0, len(self.ways) - 1)]
+        lane = way.lanes[self.random.randint(0, len(way.lanes) - 1)]
+        position = self.random.uniform(lane.length * 0.2, lane.length * 0.8)
+        car_length = self.random.uniform(0.002, 0.004)
+        ways_to_cross = self.random.randint(MIN_TRAVEL_DISTANCE, MAX_TRAVEL_DISTANCE)
+
+        self.car_id[v] = self.context.next_id(Car)
+        self.lane[v] = self._lane_index[lane]
+        self.position[v] = position * 1000
+        self.comfortable_speed[v] = comfortable_speed / 100
+        self.speed[v] = self.lane_speed[self.lane[v]] * self.comfortable_speed[v]
+        self.length[v] = car_length * 1000
+        self.ways_to_cross[v] = ways_to_cross
+        self.committed[v] = False
+        self._choose_path(v)
+
+        return self._get_car_event(v)
+
+    def _choose_path(self, v: int, own_only: bool = False):
+        """Picks a random next path, same as Car._get_next_path"""
+        lane = self.lane[v]
+        path_options = self._paths[lane]
+        self.lane_to_switch[v] = -1
+        self.next_next_lane[v] = -1
+
+        if own_only:
+            path_options = [path for path in path_options if len(path[0]) > 0]
+
+        if len(path_options) == 0:
+            turn_back_lanes = self._turn_back_lanes[lane]
+            self.next_lane[v] = (
+                self.random.choice(turn_back_lanes) if len(turn_back_lanes) > 0 else -1
+            )
+            return
+
+        own_options, switch_options = self.random.choice(path_options)
+        if len(own_options) > 0:
+            crossroad_lane, next_lane = self.random.choice(own_options)
+        else:
+            lane_to_switch = self.random.choice(list(switch_options.keys()))
+            crossroad_lane, next_lane = self.random.choice(switch_options[lane_to_switch])
+            self.lane_to_switch[v] = lane_to_switch
+
+        if crossroad_lane >= 0:
+            self.next_lane[v] = crossroad_lane
+            self.next_next_lane[v] = next_lane
+        else:
+            self.next_lane[v] = next_lane
+
+    """
+    ################################################
+                    DRIVING MODEL
+    ################################################
+    """
+
+    def _idm_acceleration(self, speed, desired_speed, gap, leader_speed):
+        desired_gap = STANDSTILL_GAP + np.maximum(
+            0,
+            speed * TIME_HEADWAY
+            + speed
+            * (speed - leader_speed)
+            / (2 * math.sqrt(MAX_ACCELERATION * COMFORTABLE_DECELERATION)),
+        )
+        free_road = (speed / np.maximum(desired_speed, 0.1)) ** ACCELERATION_EXPONENT
+        interaction = (desired_gap / np.maximum(gap, 0.1)) ** 2
+
+        return MAX_ACCELERATION * (1 - free_road - interaction)
+
+    def _sort_vehicles(self):
+        """Sorts the vehicles by lane and position, returns the sorted order and lanes"""
+        order = np.lexsort((self.position, self.lane))
+        sorted_lanes = self.lane[order]
+        return order, sorted_lanes
+
+    def _get_neighbours(self, order, sorted_lanes):
+        """Returns the leader and the follower of every vehicle in its lane (-1 if none)"""
+        count = self.vehicle_count
+        same_lane = sorted_lanes[1:] == sorted_lanes[:-1]
+
+        leader = np.full(count, -1)
+        follower = np.full(count, -1)
+        leader[order[:-1][same_lane]] = order[1:][same_lane]
+        follower[order[1:][same_lane]] = order[:-1][same_lane]
+
+        # the last and the first vehicle of every lane
+        lane_count = len(self.lanes)
+        lane_last = np.full(lane_count, -1)
+        lane_first = np.full(lane_count, -1)
+        starts = np.flatnonzero(np.r_[True, ~same_lane])
+        ends = np.r_[starts[1:] - 1, count - 1]
+        lane_last[sorted_lanes[starts]] = order[starts]
+        lane_first[sorted_lanes[ends]] = order[ends]
+
+        return leader, follower, lane_last, lane_first
+
+    def _get_gaps(self, leader, lane_last):
+        """Returns the gap and the speed of the obstacle ahead of every vehicle"""
+        gap = np.full(self.vehicle_count, np.inf)
+        leader_speed = self.lane_speed[self.lane] * self.comfortable_speed
+
+        has_leader = leader >= 0
+        ahead = leader[has_leader]
+        gap[has_leader] = (
+            self.position[ahead] - self.length[ahead] - self.position[has_leader]
+        )
+        leader_speed[has_leader] = self.speed[ahead]
+
+        # the first vehicles in lane follow the last vehicle of the next lanes
+        remaining = self.lane_length[self.lane] - self.position
+        for next_lanes, offset in (
+            (self.next_lane, remaining),
+            (self.next_next_lane, remaining + self.lane_length[self.next_lane]),
+        ):
+            free = ~has_leader & (next_lanes >= 0) & np.isinf(gap)
+            next_last = np.where(free, lane_last[np.maximum(next_lanes, 0)], -1)
+            found = next_last >= 0
+            ahead = next_last[found]
+            gap[found] = offset[found] + self.position[ahead] - self.length[ahead]
+            leader_speed[found] = self.speed[ahead]
+
+        return gap, leader_speed
+
+    def _crossroad_entries(self, leader, lane_first):
+        """
+        Decides which first vehicles in lane may enter the next crossroad.
+        Returns the mask of vehicles that have to stop at the end of their lane.
+        """
+        must_stop = np.zeros(self.vehicle_count, dtype=bool)
+
+        next_lane = self.next_lane
+        approaching = (
+            (leader < 0)
+            & ~self.lane_is_crossroad[self.lane]
+            & (next_lane >= 0)
+            & self.lane_is_crossroad[np.maximum(next_lane, 0)]
+        )
+        remaining = self.lane_length[self.lane] - self.position
+        horizon = (
+            STANDSTILL_GAP
+            + self.speed * CROSSROAD_BLOCKING_TIME
+            + self.speed**2 / (2 * COMFORTABLE_DECELERATION)
+            + 10
+        )
+        candidates = np.flatnonzero(approaching & (remaining <= horizon))
+        if len(candidates) == 0:
+            return must_stop
+
+        arrival_time = remaining / np.maximum(self.speed, 0.1)
+
+        # committed cars go first, then the main way ones, then by the arrival time
+        candidates = candidates[
+            np.lexsort(
+                (
+                    arrival_time[candidates],
+                    ~self.lane_main_crossing[next_lane[candidates]],
+                    ~self.committed[candidates],
+                )
+            )
+        ]
+
+        busy = (
+            np.bincount(self.lane, minlength=len(self.lanes)).astype(bool).tolist()
+        )
+        disabled = self.lane_disabled.tolist()
+        commit_distance = (
+            self.speed * self.time_step * 2 + STANDSTILL_GAP
+        )  # no way to stop anymore
+
+        for v in candidates.tolist():
+            lane = self.lane[v]
+            crossroad_lane = next_lane[v]
+
+            if not self.committed[v]:
+                if disabled[crossroad_lane] or any(
+                    busy[conflict] for conflict in self._conflicts[crossroad_lane]
+                ):
+                    must_stop[v] = True
+                    continue
+
+                if (
+                    not self.lane_has_traffic_light[lane]
+                    and not self.lane_on_main_way[lane]
+                    and self._has_car_on_right(v, lane_first, arrival_time)
+                ):
+                    must_stop[v] = True
+                    continue
+
+                if remaining[v] <= commit_distance[v]:
+                    self.committed[v] = True
+
+            busy[crossroad_lane] = True
+
+        return must_stop
+
+    def _has_car_on_right(self, v: int, lane_first, arrival_time) -> bool:
+        for right_lane in self._right_lanes[self.lane[v]]:
+            first = lane_first[right_lane]
+            if (
+                first >= 0
+                and arrival_time[first] < arrival_time[v] + CROSSROAD_BLOCKING_TIME
+            ):
+                return True
+
+        return False
+
+    def _change_lanes(self):
+        """Moves the vehicles to the neighbour lanes (MOBIL), records the changes"""
+        order, sorted_lanes = self._sort_vehicles()
+        leader, follower, lane_last, _ = self._get_neighbours(order, sorted_lanes)
+        gap, leader_speed = self._get_gaps(leader, lane_last)
+        desired_speed = self.lane_speed[self.lane] * self.comfortable_speed
+        acceleration = self._idm_acceleration(
+            self.speed, desired_speed, gap, leader_speed
+        )
+        keys = sorted_lanes * KEY_SCALE + self.position[order]
+        remaining = self.lane_length[self.lane] - self.position
+
+        eligible = ~self.lane_is_crossroad[self.lane] & ~self.committed
+        changing = np.zeros(self.vehicle_count, dtype=bool)
+        changes = []
+
+        for neighbours in (self.lane_left, self.lane_right):
+            target = neighbours[self.lane]
+            valid = eligible & ~changing & (target >= 0)
+            target = np.maximum(target, 0)
+            position = self.position * self.lane_length[target] / self.lane_length[
+                self.lane
+            ]
+
+            idx = np.searchsorted(keys, target * KEY_SCALE + position)
+            new_leader = np.where(
+                (idx < len(keys))
+                & (sorted_lanes[np.minimum(idx, len(keys) - 1)] == target),
+                order[np.minimum(idx, len(keys) - 1)],
+                -1,
+            )
+            new_follower = np.where(
+                (idx > 0) & (sorted_lanes[np.maximum(idx - 1, 0)] == target),
+                order[np.maximum(idx - 1, 0)],
+                -1,
+            )
+
+            has_new_leader = new_leader >= 0
+            has_new_follower = new_follower >= 0
+            gap_ahead = np.where(
+                has_new_leader,
+                self.position[new_leader] - self.length[new_leader] - position,
+                np.inf,
+            )
+            gap_behind = np.where(
+                has_new_follower,
+                position - self.length - self.position[new_follower],
+                np.inf,
+            )
+            new_leader_speed = np.where(
+                has_new_leader, self.speed[new_leader], desired_speed
+            )
+
+            acceleration_new = self._idm_acceleration(
+                self.speed, desired_speed, gap_ahead, new_leader_speed
+            )
+            follower_acceleration_new = np.where(
+                has_new_follower,
+                self._idm_acceleration(
+                    self.speed[new_follower],
+                    desired_speed[new_follower],
+                    gap_behind,
+                    self.speed,
+                ),
+                0,
+            )
+            follower_acceleration_old = np.where(
+                has_new_follower, acceleration[new_follower], 0
+            )
+
+            safe = (
+                (gap_ahead > STANDSTILL_GAP)
+                & (gap_behind > STANDSTILL_GAP)
+                & (follower_acceleration_new >= -SAFE_DECELERATION)
+            )
+            incentive = (
+                acceleration_new
+                - acceleration
+                + POLITENESS * (follower_acceleration_new - follower_acceleration_old)
+            )
+
+            rank = self.lane_rank[self.lane]
+            mandatory = (
+                (self.lane_to_switch >= 0)
+                & (self.lane_to_switch != self.lane)
+                & (
+                    np.sign(self.lane_rank[target] - rank)
+                    == np.sign(self.lane_rank[np.maximum(self.lane_to_switch, 0)] - rank)
+                )
+            )
+            discretionary = (
+                (self.lane_to_switch < 0)
+                & (remaining > LANE_KEEPING_DISTANCE)
+                & (incentive > LANE_CHANGE_THRESHOLD)
+            )
+
+            selected = np.flatnonzero(valid & safe & (mandatory | discretionary))
+            # one change per target lane and step, so the changing cars can't collide
+            _, first = np.unique(target[selected], return_index=True)
+            selected = selected[first]
+
+            changing[selected] = True
+            changes.extend(
+                (v, target[v], position[v], bool(discretionary[v]))
+                for v in selected.tolist()
+            )
+
+        events = []
+        for v, target, position, discretionary in changes:
+            events.append(self._get_car_event(v))
+
+            if discretionary:
+                self.lane_to_switch[v] = self.lane[v]  # return after overtaking
+            self.lane[v] = target
+            self.position[v] = position
+            if self.lane_to_switch[v] == target:
+                self.lane_to_switch[v] = -1
+
+            events.append(self._get_car_event(v))
+
+        self.calendar.add_car_events(events)
+
+    def _move(self):
+        """Accelerates and moves all vehicles by one time step"""
+        order, sorted_lanes = self._sort_vehicles()
+        leader, _, lane_last, lane_first = self._get_neighbours(order, sorted_lanes)
+        gap, leader_speed = self._get_gaps(leader, lane_last)
+
+        must_stop = self._crossroad_entries(leader, lane_first)
+        stop_gap = self.lane_length[self.lane] - self.position - STANDSTILL_GAP / 2
+        gap = np.where(must_stop, np.minimum(gap, stop_gap), gap)
+        leader_speed = np.where(must_stop, 0, leader_speed)
+
+        desired_speed = self.lane_speed[self.lane] * self.comfortable_speed
+        acceleration = self._idm_acceleration(
+            self.speed, desired_speed, gap, leader_speed
+        )
+
+        new_speed = np.maximum(self.speed + acceleration * self.time_step, 0)
+        new_position = self.position + (self.speed + new_speed) / 2 * self.time_step
+
+        # never drive into the car ahead or over the stop line
+        has_leader = leader >= 0
+        limit = np.full(self.vehicle_count, np.inf)
+        limit[has_leader] = (
+            self.position[leader[has_leader]]
+            - self.length[leader[has_leader]]
+            - STANDSTILL_GAP / 10
+        )
+        limit = np.where(must_stop, self.lane_length[self.lane] - 0.01, limit)
+        blocked = new_position >= limit
+        new_position = np.where(blocked, np.maximum(limit, self.position), new_position)
+        new_speed = np.where(blocked, np.minimum(new_speed, leader_speed), new_speed)
+
+        self.position = new_position
+        self.speed = new_speed
+
+    def _leave_lanes(self) -> list[CarEvent]:
+        """Moves the vehicles at the end of their lane to the next one"""
+        events = []
+        leaving = np.flatnonzero(self.position >= self.lane_length[self.lane])
+
+        for v in leaving.tolist():
+            while self.position[v] >= self.lane_length[self.lane[v]]:
+                lane_length = self.lane_length[self.lane[v]]
+                self.position[v] = lane_length
+                events.append(self._get_car_event(v))
+
+                if not self._enter_next_lane(v):
+                    events.append(self._spawn_vehicle(v))
+                    break
+
+                self.position[v] -= lane_length
+                events.append(self._get_car_event(v))
+
+        return events
+
+    def _enter_next_lane(self, v: int) -> bool:
+        """Moves the vehicle to the next lane, returns False if it should despawn"""
+        lane = self.lane[v]
+        next_lane = self.next_lane[v]
+
+        # missed the lane to switch to, take any path from this lane
+        if self.lane_is_crossroad[max(next_lane, 0)] and self.lane_from[next_lane] != lane:
+            self._choose_path(v, own_only=True)
+            next_lane = self.next_lane[v]
+
+        if next_lane < 0 or self.ways_to_cross[v] <= 0:
+            return False
+
+        self.lane[v] = next_lane
+        self.ways_to_cross[v] -= 1
+        self.committed[v] = False
+
+        if self.lane_is_crossroad[next_lane]:
+            self.next_lane[v] = self.next_next_lane[v]
+            self.next_next_lane[v] = -1
+        else:
+            self._choose_path(v)
+
+        return True
+
+    def step(self):
+        """Advances the simulation by one time step"""
+        for idx, lane in self._signal_lanes:
+            self.lane_disabled[idx] = lane.disabled
+
+        self._change_lanes()
+        self._move()
+        self.env.run(until=self.env.now + self.time_step)
+
+        events = self._leave_lanes()
+        events.extend(self._get_diverged_car_events())
+        self.calendar.add_car_events(events)
+
+    def run(self, until: float):
+        while self.env.now + self.time_step <= until:
+            recording = self.calendar.is_recording
+            self.step()
+
+            if not recording and self.calendar.is_recording:
+                self.record_snapshot()
+
+        if self.env.now < until:
+            self.env.run(until=until)
+
+    def finish(self):
+        """Records the final state of all vehicles"""
+        self.record_snapshot()
+
+    def record_snapshot(self):
+        """Records the current state of all vehicles"""
+        self.calendar.add_car_events(
+            [self._get_car_event(v) for v in range(self.vehicle_count)]
+        )
+
+    """
+    ################################################
+                    RECORDING
+    ################################################
+    """
+
+    def _get_diverged_car_events(self) -> list[CarEvent]:
+        """Returns the events of the vehicles that left their recorded trajectory"""
+        elapsed = self.env.now - self.recorded_time
+        expected_position = self.recorded_position + self.recorded_speed * elapsed
+        diverged = (
+            np.abs(expected_position - self.position) > POSITION_TOLERANCE
+        ) | (np.abs(self.recorded_speed - self.speed) > SPEED_TOLERANCE)
+
+        return [self._get_car_event(v) for v in np.flatnonzero(diverged).tolist()]
+
+    def _get_car_event(self, v: int) -> CarEvent:
+        lane = self.lane[v]
+        self.recorded_time[v] = self.env.now
+        self.recorded_position[v] = self.position[v]
+        self.recorded_speed[v] = self.speed[v]
+
+        return CarEvent(
+            int(self.car_id[v]),
+            int(self.lane_way_id[lane]),
+            int(self.lane_crossroad_id[lane]),
+            int(self.lane_entity_id[lane]),
+            abs(round(self.position[v] / self.lane_length[lane] * 100, 4)),
+            float(self.speed[v] * 3.6),
+        )
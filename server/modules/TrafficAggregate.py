@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import struct
+import numpy as np
+from entities import Calendar, Way
+from utils.globals import AGGREGATE_BUCKET
+
+# payload header: start of the first bucket (s), bucket length (s), bucket count, way count
+AGGREGATE_HEADER = struct.Struct("!ffII")
+
+
+class TrafficAggregate:
+    """
+    Traffic of every way by time bucket, for the views zoomed out too far to show the cars.
+
+        vehicle count: mean number of cars on the way during the bucket
+        mean speed: time weighted speed of the cars on the way (km/h)
+        density: vehicle count per km of the way (vehicles/km)
+
+    The state of a car recorded by an event holds until its next event,
+    the last event of a car ends its presence on the roadnet.
+    """
+
+    def __init__(
+        self,
+        start: float,
+        bucket: float,
+        way_ids: np.ndarray,
+        vehicle_counts: np.ndarray,
+        mean_speeds: np.ndarray,
+        densities: np.ndarray,
+    ):
+        self.start = start
+        self.bucket = bucket
+        self.way_ids = way_ids
+        # the arrays are indexed by [way, bucket]
+        self.vehicle_counts = vehicle_counts
+        self.mean_speeds = mean_speeds
+        self.densities = densities
+
+    @classmethod
+    def from_calendar(
+        cls,
+        calendar: Calendar,
+        ways: list[Way],
+        end: float,
+        bucket: float = AGGREGATE_BUCKET,
+    ) -> TrafficAggregate:
+        """
+        Aggregates the given ways only. The calendar must hold all the events of the cars,
+        the intervals of a car end at its next event, on any way.
+        """
+        events = calendar.car_events
+        times = calendar.car_event_times
+
+        start = np.floor(calendar.record_from / bucket) * bucket
+        bucket_count = max(int(np.ceil((end - start) / bucket)), 1)
+
+        way_ids = np.array([way.id for way in ways], np.int64)
+        way_order = np.argsort(way_ids)
+
+        # stable sort keeps the events of each car in the time order
+        order = np.argsort(events["car_id"], kind="stable")
+        car_ids = events["car_id"][order]
+        interval_starts = times[order]
+        interval_ends = np.append(interval_starts[1:], end)
+        is_last = np.append(car_ids[1:] != car_ids[:-1], True)
+        interval_ends[is_last] = interval_starts[is_last]
+
+        # the sentinel matches no way, the cars on the crossroads have the way id -1
+        sorted_way_ids = np.append(way_ids[way_order], -2)
+        event_way_ids = events["way_id"][order].astype(np.int64)
+        way_positions = np.searchsorted(sorted_way_ids[:-1], event_way_ids)
+        is_on_way = (sorted_way_ids[way_positions] == event_way_ids) & (
+            interval_ends > interval_starts
+        )
+
+        interval_starts = interval_starts[is_on_way] - start
+        interval_ends = interval_ends[is_on_way] - start
+        interval_ways = way_order[way_positions[is_on_way]]
+        speeds = events["speed"][order][is_on_way].astype(np.float64)
+
+        # every interval is split at the bucket boundaries it crosses
+        first_buckets = (interval_starts // bucket).astype(np.int64)
+        last_buckets = np.maximum(
+            np.ceil(interval_ends / bucket).astype(np.int64) - 1, first_buckets
+        )
+        piece_counts = last_buckets - first_buckets + 1
+
+        intervals = np.repeat(np.arange(len(first_buckets)), piece_counts)
+        first_pieces = np.repeat(np.cumsum(piece_counts) - piece_counts, piece_counts)
+        piece_offsets = np.arange(len(intervals)) - first_pieces
+        piece_buckets = first_buckets[intervals] + piece_offsets
+        durations = np.minimum(
+            interval_ends[intervals], (piece_buckets + 1) * bucket
+        ) - np.maximum(interval_starts[intervals], piece_buckets * bucket)
+
+        is_inside = (piece_buckets >= 0) & (piece_buckets < bucket_count)
+        cells = (interval_ways[intervals] * bucket_count + piece_buckets)[is_inside]
+        durations = durations[is_inside]
+
+        cell_count = len(ways) * bucket_count
+        occupancy = np.bincount(cells, durations, cell_count).reshape(len(ways), -1)
+        speed_sums = np.bincount(
+            cells, durations * speeds[intervals][is_inside], cell_count
+        ).reshape(len(ways), -1)
+
+        vehicle_counts = occupancy / bucket
+        mean_speeds = np.divide(
+            speed_sums, occupancy, out=np.zeros_like(speed_sums), where=occupancy > 0
+        )
+        way_lengths = np.array([way.length for way in ways], np.float64)
+        densities = vehicle_counts / np.maximum(way_lengths, 1e-9)[:, np.newaxis]
+
+        return cls(start, bucket, way_ids, vehicle_counts, mean_speeds, densities)
+
+    def pack(self) -> bytes:
+        """
+        Packs the header, the way ids and the vehicle counts, mean speeds and densities,
+        each as a float32 array ordered by way and bucket
+        """
+        way_count, bucket_count = self.vehicle_counts.shape
+
+        return b"".join(
+            [
+                AGGREGATE_HEADER.pack(self.start, self.bucket, bucket_count, way_count),
+                self.way_ids.astype(">u4").tobytes(),
+                self.vehicle_counts.astype(">f4").tobytes(),
+                self.mean_speeds.astype(">f4").tobytes(),
+                self.densities.astype(">f4").tobytes(),
+            ]
+        )
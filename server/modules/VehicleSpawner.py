@@ -1,5 +1,6 @@
-import random
 from entities.Car import Car
+from entities.SimulationContext import SimulationContext
+from entities.Notifier import NotificationStats
 from utils.globals import MIN_TRAVEL_DISTANCE, MAX_TRAVEL_DISTANCE
 
 
@@ -8,7 +9,9 @@ class VehicleSpawner:
         self.env = env
         self.calendar = calendar
         self.ways = ways
+        self.random = SimulationContext.current().random
         self.vehicles: list[Car] = []
+        self.notification_stats = NotificationStats()
 
     def spawn_multiple(self, amount):
         for _ in range(amount):
@@ -20,13 +23,20 @@ class VehicleSpawner:
 
         self.spawn_vehicle()
 
+    def owns_lane(self, lane):
+        """
+        Returns True if the vehicles on the lane are simulated by this spawner.
+        A spawner owning only some lanes implements transfer(vehicle) as well,
+        it is called for the vehicles entering the other lanes.
+        """
+        return True
+
     def spawn_vehicle(self):
-        speed = random.randint(70, 100)
-        way = self.ways[random.randint(0, len(self.ways) - 1)]
-        lane = way.lanes[random.randint(0, len(way.lanes) - 1)]
-        position = random.uniform(lane.length * 0.2, lane.length * 0.8)
-        car_length = random.uniform(0.002, 0.004)
-        ways_to_cross_count = random.randint(MIN_TRAVEL_DISTANCE, MAX_TRAVEL_DISTANCE)
+        speed = self.random.randint(70, 100)
+        way, lane = self._get_spawn_lane()
+        position = self.random.uniform(lane.length * 0.2, lane.length * 0.8)
+        car_length = self.random.uniform(0.002, 0.004)
+        ways_to_cross_count = self.random.randint(MIN_TRAVEL_DISTANCE, MAX_TRAVEL_DISTANCE)
 
         vehicle = Car(
             self.env,
@@ -41,3 +51,8 @@ class VehicleSpawner:
         )
         self.vehicles.append(vehicle)
         return vehicle
+
+    def _get_spawn_lane(self):
+        way = self.ways[self.random.randint(0, len(self.ways) - 1)]
+        lane = way.lanes[self.random.randint(0, len(way.lanes) - 1)]
+        return way, lane
@@ -1,2 +1,19 @@
 from .Parser import *
 from .VehicleSpawner import *
+from .TimeSteppedEngine import *
+from .MapPartition import *
+from .RegionSpawner import *
+from .ParallelSimulation import *
+from .Checkpoint import *
+from .Session import *
+from .SessionStore import *
+from .EventFormatV2 import *
+from .RoadnetFormatV2 import *
+from .EventLog import *
+from .TileIndex import *
+from .TrafficAggregate import *
+from .PackedRoadnet import *
+from .JobQueue import *
+from .ResultCache import *
+from .MapRegistry import *
+from .LiveSimulation import *
@@ -0,0 +1,152 @@
+"""
+Runs a grid of simulations on one roadnet and writes their calendars and summary stats.
+
+    python sweep.py --vehicles 100 500 --time-spans 100 --seeds 0 1 2 --output sweep
+
+The roadnet is parsed once, every simulation runs in a process forked from the parser,
+so the workers share the parsed roadnet copy-on-write and always start from a clean state.
+"""
+
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import struct
+import time
+
+import simpy
+
+from entities import Calendar
+from modules import Parser, VehicleSpawner, TimeSteppedEngine
+from utils.globals import ENGINES
+
+SUMMARY_FIELDS = [
+    "engine",
+    "vehicle_count",
+    "time_span",
+    "seed",
+    "car_events",
+    "crossroad_events",
+    "mean_speed",
+    "run_time",
+    "file",
+]
+
+# roadnet parsed by the main process, inherited by the forked workers
+_parser: Parser = None
+
+
+def run_simulation(
+    engine: str, vehicle_count: int, time_span: int, seed: int, output: str
+) -> dict:
+    """Runs one simulation on the inherited roadnet and writes its calendar"""
+    start = time.perf_counter()
+
+    # the forked copy of the context the roadnet was parsed in
+    _parser.context.reseed(seed)
+    env = _parser.env
+    calendar = _parser.calendar
+
+    if engine == "timestep":
+        simulation = TimeSteppedEngine(env, calendar, _parser.ways, _parser.crossroads)
+        simulation.spawn_multiple(vehicle_count)
+        simulation.run(until=time_span)
+        simulation.finish()
+    else:
+        spawner = VehicleSpawner(env, calendar, _parser.ways)
+        spawner.spawn_multiple(vehicle_count)
+        env.run(until=time_span)
+        for vehicle in spawner.vehicles:
+            vehicle.calendar_car_update()
+
+    event_bytes, (car_event_count, crossroad_event_count) = calendar.pack()
+
+    file_name = f"{engine}_v{vehicle_count}_t{time_span}_s{seed}.bin"
+    with open(os.path.join(output, file_name), "wb") as f:
+        f.write(struct.pack("!II", car_event_count, crossroad_event_count))
+        f.write(event_bytes)
+
+    speeds = calendar.car_events["speed"]
+
+    return {
+        "engine": engine,
+        "vehicle_count": vehicle_count,
+        "time_span": time_span,
+        "seed": seed,
+        "car_events": car_event_count,
+        "crossroad_events": crossroad_event_count,
+        "mean_speed": float(speeds.mean()) if len(speeds) > 0 else 0,
+        "run_time": time.perf_counter() - start,
+        "file": file_name,
+    }
+
+
+def _run_simulation(args: tuple) -> dict:
+    return run_simulation(*args)
+
+
+def main():
+    global _parser
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--map", default="data/brno.osm")
+    parser.add_argument("--vehicles", type=int, nargs="+", default=[100])
+    parser.add_argument("--time-spans", type=int, nargs="+", default=[100])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--engine", default="event", choices=ENGINES)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="sweep")
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+
+    start = time.perf_counter()
+
+    env = simpy.Environment()
+    _parser = Parser(env, Calendar(env))
+    _parser.parse(args.map)
+
+    roadnet_bytes, (node_count, way_count, crossroad_count) = _parser.pack()
+    with open(os.path.join(args.output, "roadnet.bin"), "wb") as f:
+        f.write(struct.pack("!III", node_count, way_count, crossroad_count))
+        f.write(roadnet_bytes)
+
+    parse_time = time.perf_counter() - start
+    print(f"Roadnet parsed in {parse_time:.2f} s.")
+
+    jobs = [
+        (args.engine, vehicle_count, time_span, seed, args.output)
+        for vehicle_count, time_span, seed in itertools.product(
+            args.vehicles, args.time_spans, args.seeds
+        )
+    ]
+
+    # every job gets a fresh fork of the parsed roadnet
+    context = multiprocessing.get_context("fork")
+    with context.Pool(args.workers, maxtasksperchild=1) as pool, open(
+        os.path.join(args.output, "summary.csv"), "w", newline=""
+    ) as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+
+        for result in pool.imap_unordered(_run_simulation, jobs):
+            writer.writerow(result)
+            print(
+                f"vehicles={result['vehicle_count']} time_span={result['time_span']} "
+                f"seed={result['seed']}: {result['car_events']} events "
+                f"in {result['run_time']:.2f} s"
+            )
+
+    wall_time = time.perf_counter() - start - parse_time
+    throughput = len(jobs) / wall_time * 3600
+
+    print(
+        f"{len(jobs)} simulations in {wall_time:.2f} s on {args.workers} workers: "
+        f"{throughput:.0f} simulations / hour, "
+        f"{throughput / args.workers:.0f} simulations / hour / core"
+    )
+
+
+if __name__ == "__main__":
+    main()
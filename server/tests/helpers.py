@@ -0,0 +1,69 @@
+import random
+import simpy
+from types import SimpleNamespace
+from entities import Calendar, CarEvent, CrossroadEvent
+
+
+def record_random_events(
+    calendar: Calendar, seed: int = 0, steps: int = 200
+) -> tuple[list[CarEvent], list[CrossroadEvent]]:
+    """
+    Records random events of a few cars and crossroads into the calendar,
+    returns the same events as the legacy event objects
+    """
+    rng = random.Random(seed)
+    env = calendar.env
+    car_events = []
+    crossroad_events = []
+
+    for _ in range(steps):
+        env.run(until=env.now + 0.1 + rng.random() * 0.3)
+
+        for _ in range(rng.randint(0, 6)):
+            is_on_way = rng.random() < 0.8
+            event = CarEvent(
+                rng.randint(1, 40),
+                rng.randint(1, 500) if is_on_way else None,
+                None if is_on_way else rng.randint(1, 50),
+                rng.randint(1, 3000),
+                rng.uniform(0, 100),
+                rng.uniform(0, 130),
+            )
+            event.time = env.now
+            calendar.add_car_event(event)
+            car_events.append(event)
+
+        if rng.random() < 0.2:
+            crossroad = get_crossroads()[rng.randint(0, 4)]
+            green_lanes = [lane for lane in crossroad.lanes if rng.random() < 0.5]
+            event = CrossroadEvent(crossroad.id, green_lanes)
+            event.time = env.now
+            calendar.add_crossroad_event(event)
+            crossroad_events.append(event)
+
+    return car_events, crossroad_events
+
+
+def pack_legacy(car_events, crossroad_events) -> bytes:
+    """Packs the events one by one, as the calendar did before it stored arrays"""
+    return b"".join(event.pack() for event in car_events) + b"".join(
+        event.pack() for event in crossroad_events
+    )
+
+
+def get_crossroads() -> list[SimpleNamespace]:
+    """Crossroads with the ids and lanes the event formats read"""
+    return [
+        SimpleNamespace(
+            id=crossroad_id,
+            lanes=[
+                SimpleNamespace(id=1000 * crossroad_id + i)
+                for i in range(12 * crossroad_id - 5)
+            ],
+        )
+        for crossroad_id in range(1, 6)
+    ]
+
+
+def create_calendar(**kwargs) -> Calendar:
+    return Calendar(simpy.Environment(), **kwargs)
@@ -0,0 +1,87 @@
+import unittest
+import numpy as np
+from entities import Calendar
+from tests.helpers import create_calendar, pack_legacy, record_random_events
+
+
+class CalendarTest(unittest.TestCase):
+    def test_pack_matches_legacy_events(self):
+        # the small capacity makes the arrays grow while recording
+        calendar = create_calendar(capacity=4)
+        car_events, crossroad_events = record_random_events(calendar)
+
+        data, counts = calendar.pack()
+
+        self.assertEqual(data, pack_legacy(car_events, crossroad_events))
+        self.assertEqual(counts, (len(car_events), len(crossroad_events)))
+
+    def test_pack_chunks_match_pack(self):
+        calendar = create_calendar()
+        record_random_events(calendar)
+
+        chunks, counts = calendar.pack_chunks()
+
+        self.assertEqual(b"".join(chunks), calendar.pack()[0])
+        self.assertEqual(counts, calendar.pack()[1])
+
+    def test_record_from_skips_earlier_events(self):
+        calendar = create_calendar(record_from=30)
+        car_events, crossroad_events = record_random_events(calendar)
+
+        car_events = [event for event in car_events if event.time >= 30]
+        crossroad_events = [event for event in crossroad_events if event.time >= 30]
+
+        self.assertEqual(calendar.pack()[0], pack_legacy(car_events, crossroad_events))
+
+    def test_clear_reuses_the_arrays(self):
+        calendar = create_calendar()
+        record_random_events(calendar, seed=1)
+        calendar.clear()
+        car_events, crossroad_events = record_random_events(calendar, seed=2)
+
+        self.assertEqual(calendar.pack()[0], pack_legacy(car_events, crossroad_events))
+
+    def test_extend_keeps_events_and_links(self):
+        calendar = create_calendar()
+        record_random_events(calendar)
+
+        extended = create_calendar()
+        extended.extend(calendar.get_arrays())
+
+        self.assertEqual(extended.pack()[0], calendar.pack()[0])
+        np.testing.assert_array_equal(
+            extended.car_previous_events, calendar.car_previous_events
+        )
+        self.assertEqual(extended.car_last_events, calendar.car_last_events)
+
+    def test_links_follow_each_car(self):
+        calendar = create_calendar()
+        car_events, _ = record_random_events(calendar)
+
+        for car_id, last in calendar.car_last_events.items():
+            indices = Calendar.follow_car_events(calendar.car_previous_events, last)
+            expected = [
+                i for i, event in enumerate(car_events) if event.car_id == car_id
+            ]
+            self.assertEqual(indices.tolist(), expected)
+
+    def test_filter_keeps_the_event_leaving_the_lanes(self):
+        calendar = create_calendar()
+        car_events, _ = record_random_events(calendar)
+        lane_ids = set(range(1, 1500))
+
+        filtered = calendar.filter(set(), lane_ids)
+
+        expected = []
+        previous_lanes = {}
+        for event in car_events:
+            previous_lane = previous_lanes.get(event.car_id)
+            if event.lane_id in lane_ids or previous_lane in lane_ids:
+                expected.append(event)
+            previous_lanes[event.car_id] = event.lane_id
+
+        self.assertEqual(filtered.pack()[0], pack_legacy(expected, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import simpy
+from entities import DiskCalendar
+from tests.helpers import create_calendar, pack_legacy, record_random_events
+
+
+class DiskCalendarTest(unittest.TestCase):
+    def test_closed_file_matches_calendar(self):
+        with tempfile.TemporaryDirectory() as directory:
+            env = simpy.Environment()
+            path = os.path.join(directory, "events.bin")
+            # the small segments make the events span several of them
+            calendar = DiskCalendar(env, path, segment_size=64)
+            calendar.write_preamble(b"preamble")
+            car_events, crossroad_events = record_random_events(calendar)
+
+            previous_events = np.array(calendar.car_previous_events)
+            self.assertEqual(
+                calendar.close(), (len(car_events), len(crossroad_events))
+            )
+
+            with open(path, "rb") as f:
+                self.assertEqual(
+                    f.read(), b"preamble" + pack_legacy(car_events, crossroad_events)
+                )
+
+            reference = create_calendar()
+            record_random_events(reference)
+            np.testing.assert_array_equal(
+                previous_events, reference.car_previous_events
+            )
+
+    def test_extend_matches_calendar(self):
+        with tempfile.TemporaryDirectory() as directory:
+            calendar = create_calendar()
+            record_random_events(calendar)
+            arrays = calendar.get_arrays()
+
+            path = os.path.join(directory, "events.bin")
+            disk_calendar = DiskCalendar(simpy.Environment(), path, segment_size=64)
+            disk_calendar.extend(arrays)
+
+            self.assertEqual(
+                disk_calendar.car_events.tobytes(), calendar.car_events.tobytes()
+            )
+            np.testing.assert_array_equal(
+                disk_calendar.car_previous_events, calendar.car_previous_events
+            )
+            disk_calendar.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
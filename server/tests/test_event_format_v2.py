@@ -0,0 +1,66 @@
+import unittest
+from modules import EventFormatV2
+from utils.globals import (
+    EVENT_TIME_RESOLUTION,
+    EVENT_POSITION_RESOLUTION,
+    EVENT_SPEED_RESOLUTION,
+)
+from tests.helpers import create_calendar, get_crossroads, record_random_events
+
+
+class EventFormatV2Test(unittest.TestCase):
+    def setUp(self):
+        self.calendar = create_calendar()
+        self.car_events, self.crossroad_events = record_random_events(self.calendar)
+        self.crossroads = get_crossroads()
+
+        self.unpacked = EventFormatV2.unpack(
+            EventFormatV2.pack(self.calendar, self.crossroads)
+        )
+
+    def test_car_events_round_trip(self):
+        # the events are decoded by car, each car in the time order
+        expected = sorted(self.car_events, key=lambda event: event.car_id)
+        unpacked = self.unpacked["car_events"]
+
+        self.assertEqual(len(unpacked), len(expected))
+        for event, decoded in zip(expected, unpacked):
+            self.assertEqual(decoded["car_id"], event.car_id)
+            self.assertEqual(decoded["lane_id"], event.lane_id)
+            self.assertAlmostEqual(
+                decoded["time"], event.time, delta=EVENT_TIME_RESOLUTION
+            )
+            self.assertAlmostEqual(
+                decoded["position"], event.position, delta=EVENT_POSITION_RESOLUTION
+            )
+            self.assertAlmostEqual(
+                decoded["speed"], event.speed, delta=EVENT_SPEED_RESOLUTION
+            )
+
+    def test_crossroad_events_round_trip(self):
+        lanes = {crossroad.id: crossroad.lanes for crossroad in self.crossroads}
+        expected = sorted(self.crossroad_events, key=lambda event: event.crossroad_id)
+        unpacked = self.unpacked["crossroad_events"]
+
+        self.assertEqual(len(unpacked), len(expected))
+        for event, decoded in zip(expected, unpacked):
+            self.assertEqual(decoded["crossroad_id"], event.crossroad_id)
+            self.assertAlmostEqual(
+                decoded["time"], event.time, delta=EVENT_TIME_RESOLUTION
+            )
+            # the green lanes are decoded as the indices of the lanes of the crossroad
+            self.assertEqual(
+                [lanes[event.crossroad_id][i].id for i in decoded["green_lanes"]],
+                [lane.id for lane in event.green_lanes],
+            )
+
+    def test_empty_calendar_round_trip(self):
+        data = EventFormatV2.pack(create_calendar(), self.crossroads)
+
+        self.assertEqual(
+            EventFormatV2.unpack(data), {"car_events": [], "crossroad_events": []}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
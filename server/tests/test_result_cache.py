@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+from modules import ResultCache, CachedResult
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = self._directory.name
+        self.cache = ResultCache(self.directory, "test")
+        self.key = self.cache.get_key({"vehicle_count": 100, "seed": 1})
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def test_key_depends_on_params_and_version(self):
+        self.assertEqual(
+            self.key, self.cache.get_key({"seed": 1, "vehicle_count": 100})
+        )
+        self.assertNotEqual(self.key, self.cache.get_key({"vehicle_count": 100}))
+        self.assertNotEqual(
+            self.key,
+            ResultCache(self.directory, "other").get_key(
+                {"vehicle_count": 100, "seed": 1}
+            ),
+        )
+
+    def test_identical_requests_are_collapsed(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(threading.current_thread().name)
+            started.set()
+            release.wait(10)
+            return CachedResult(b"events", {"X-Roadnet-Version": "1"})
+
+        returned = []
+
+        def request():
+            returned.append(self.cache.get_or_compute(self.key, compute))
+
+        threads = [threading.Thread(target=request) for _ in range(4)]
+        threads[0].start()
+        started.wait(10)
+        for thread in threads[1:]:
+            thread.start()
+
+        # the other requests wait for the running computation
+        deadline = time.monotonic() + 10
+        while self.cache.stats["collapsed"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        release.set()
+        for thread in threads:
+            thread.join(10)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.cache.stats["misses"], 1)
+        self.assertEqual(self.cache.stats["collapsed"], 3)
+        self.assertEqual(sorted(hit for _, hit in returned), [False, True, True, True])
+        self.assertTrue(all(result.body == b"events" for result, _ in returned))
+
+    def test_failed_computation_is_not_cached(self):
+        result, hit = self.cache.get_or_compute(self.key, lambda: None)
+        self.assertIsNone(result)
+        self.assertFalse(hit)
+
+        result, hit = self.cache.get_or_compute(
+            self.key, lambda: CachedResult(b"events", {})
+        )
+        self.assertEqual(result.body, b"events")
+        self.assertFalse(hit)
+
+    def test_results_are_read_from_the_disk(self):
+        self.cache.put(self.key, CachedResult(b"events", {"Vary": "Accept"}))
+
+        cache = ResultCache(self.directory, "test")
+        result, hit = cache.get_or_compute(self.key, lambda: None)
+
+        self.assertTrue(hit)
+        self.assertEqual(result.body, b"events")
+        self.assertEqual(result.headers, {"Vary": "Accept"})
+        self.assertEqual(cache.stats["disk_hits"], 1)
+
+    def test_memory_evicts_least_recently_used(self):
+        cache = ResultCache(self.directory, "test", memory_size=10)
+        cache.put("a", CachedResult(b"12345", {}))
+        cache.put("b", CachedResult(b"12345", {}))
+        cache.get_or_compute("a", lambda: None)
+        cache.put("c", CachedResult(b"12345", {}))
+
+        self.assertEqual(cache.stats["memory_evictions"], 1)
+        self.assertEqual(list(cache._memory), ["a", "c"])
+
+    @unittest.skipUnless(hasattr(os, "fork"), "the job workers are forked")
+    def test_forked_worker_does_not_wait_for_the_parent(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute():
+            started.set()
+            release.wait(10)
+            return CachedResult(b"parent", {})
+
+        thread = threading.Thread(
+            target=self.cache.get_or_compute, args=(self.key, compute)
+        )
+        thread.start()
+        started.wait(10)
+
+        context = multiprocessing.get_context("fork")
+        receiver, sender = context.Pipe(duplex=False)
+
+        def work():
+            result, _ = self.cache.get_or_compute(
+                self.key, lambda: CachedResult(b"child", {})
+            )
+            sender.send(result.body)
+
+        worker = context.Process(target=work, daemon=True)
+        worker.start()
+        is_received = receiver.poll(10)
+
+        release.set()
+        thread.join(10)
+        worker.join(10)
+
+        self.assertTrue(is_received)
+        self.assertEqual(receiver.recv(), b"child")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,3 +5,4 @@ from .math import *
 from .types import *
 from .plot import *
 from .map_geometry import *
+from .varint import *
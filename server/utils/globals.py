@@ -15,3 +15,99 @@ MIN_TRAVEL_DISTANCE = 50
 
 # maximum number of ways to cross before despawn
 MAX_TRAVEL_DISTANCE = 50
+
+# simulation engines, the per-car event processes and the vectorized time steps
+ENGINES = ["event", "timestep"]
+
+# time step of the time-stepped engine (s)
+TIME_STEP = 0.5
+
+# capacity of a lane simulated by the mesoscopic queue model (vehicles/h)
+MESOSCOPIC_LANE_CAPACITY = 1800
+
+# how long an idle simulation session is kept on the server (s)
+SESSION_IDLE_TIMEOUT = 600
+
+# maximum number of simulation sessions kept on the server at once
+SESSION_MAX_COUNT = 16
+
+# initial number of event slots of the calendar, doubled when full
+CALENDAR_INITIAL_CAPACITY = 4096
+
+# simulated time covered by one frame of a streamed simulation (s)
+STREAM_SLICE = 10
+
+# maximum number of simulations streamed at once
+STREAM_MAX_COUNT = 8
+
+# resolution of the event times in the compact event format (s)
+EVENT_TIME_RESOLUTION = 0.001
+
+# resolution of the car positions in the compact event format (% of the lane)
+EVENT_POSITION_RESOLUTION = 0.01
+
+# resolution of the car speeds in the compact event format (km/h)
+EVENT_SPEED_RESOLUTION = 0.1
+
+# number of car events in one mapped segment of the disk calendar (~1.8 MB)
+EVENT_LOG_SEGMENT_SIZE = 65536
+
+# how long a spilled event log is kept (s)
+EVENT_LOG_RETENTION = 24 * 3600
+
+# size of the spilled event logs kept on the disk (bytes)
+EVENT_LOG_DISK = 8 * 2**30
+
+# length of the time buckets of the event log index (s)
+EVENT_INDEX_BUCKET = 10
+
+# zoom of the map tiles the lanes are indexed by
+TILE_ZOOM = 16
+
+# length of the time buckets of the aggregated traffic (s)
+AGGREGATE_BUCKET = 10
+
+# number of simulation jobs running at once
+JOB_WORKERS = 2
+
+# maximum number of simulation jobs waiting for a worker
+JOB_QUEUE_SIZE = 32
+
+# how long a finished job and its result are kept (s)
+JOB_RETENTION = 3600
+
+# simulated time between two progress reports of a job (s)
+JOB_PROGRESS_SLICE = 10
+
+# size of the simulation results kept in the memory (bytes)
+RESULT_CACHE_MEMORY = 256 * 2**20
+
+# size of the simulation results kept on the disk (bytes)
+RESULT_CACHE_DISK = 4 * 2**30
+
+# directory of the served maps, every *.osm file is a map named by its file name
+MAP_DIR = "data"
+
+# map simulated when the request names none
+DEFAULT_MAP = "brno"
+
+# memory of the loaded maps, the least recently used are dropped over it (bytes)
+MAP_MEMORY_BUDGET = 2**30
+
+# memory of a parsed roadnet relative to its packed size (measured with tracemalloc)
+PARSED_ROADNET_FACTOR = 100
+
+# simulated time advanced by one slice of a live simulation (s)
+LIVE_SLICE = 1
+
+# simulated time of the latest slices kept for the late clients of a live simulation (s)
+LIVE_WINDOW = 60
+
+# maximum number of live simulations running at once
+LIVE_MAX_SIMULATIONS = 4
+
+# how long a finished live simulation is kept (s)
+LIVE_RETENTION = 600
+
+# wall time after which an idle live connection gets a keep-alive comment (s)
+LIVE_KEEPALIVE = 15
@@ -30,3 +30,24 @@ def get_point_from_angle_and_distance(
     lng = point.lng + math.cos(angle_rad) * distance
 
     return LatLng(lat, lng)
+
+
+def latlng_to_tile(lat: float, lng: float, zoom: int) -> tuple[int, int]:
+    """Returns the x and y of the web mercator tile containing the point"""
+    n = 2**zoom
+    lat_rad = math.radians(max(min(lat, 85.0511), -85.0511))
+
+    x = int((lng + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(lat_rad)) / math.pi) / 2 * n)
+
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_to_bounds(zoom: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """Returns the south, west, north and east bounds of the web mercator tile"""
+    n = 2**zoom
+
+    def tile_lat(tile_y: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * tile_y / n))))
+
+    return tile_lat(y + 1), x / n * 360 - 180, tile_lat(y), (x + 1) / n * 360 - 180
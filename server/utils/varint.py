@@ -0,0 +1,54 @@
+import numpy as np
+
+
+def zigzag_encode(values: np.ndarray) -> np.ndarray:
+    """Maps signed integers to unsigned ones, small magnitudes stay small"""
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def zigzag_decode(values: np.ndarray) -> np.ndarray:
+    values = values.astype(np.uint64)
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(
+        np.int64
+    )
+
+
+def encode_varints(values: np.ndarray) -> bytes:
+    """Encodes unsigned integers as LEB128 varints (7 bits per byte, low bits first)"""
+    values = np.asarray(values, dtype=np.uint64)
+
+    byte_counts = np.ones(len(values), np.int64)
+    for shift in range(7, 64, 7):
+        byte_counts += values >= np.uint64(1 << shift)
+
+    offsets = np.cumsum(byte_counts) - byte_counts
+    encoded = np.empty(int(byte_counts.sum()), np.uint8)
+
+    for i in range(int(byte_counts.max()) if len(values) > 0 else 0):
+        mask = byte_counts > i
+        groups = (values[mask] >> np.uint64(7 * i)) & np.uint64(0x7F)
+        has_next = (byte_counts[mask] > i + 1).astype(np.uint64) << np.uint64(7)
+        encoded[offsets[mask] + i] = groups | has_next
+
+    return encoded.tobytes()
+
+
+def decode_varints(data: bytes, offset: int = 0, count: int = None) -> tuple[list[int], int]:
+    """Decodes the varints from the offset, returns them with the offset after the last one"""
+    values = []
+    value = 0
+    shift = 0
+
+    while offset < len(data) and (count is None or len(values) < count):
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+
+        if byte < 0x80:
+            values.append(value)
+            value = 0
+            shift = 0
+
+    return values, offset